@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+价格提醒
+规则（物品、数据源、高于/低于某价格、窗口内涨跌幅）保存在 alerts 表中，启动时按物品加载到内存。
+每次写入价格时只检查该物品的规则，不扫描全部规则。触发的提醒交给可插拔的通知方式
+（日志、Webhook、内存中的最近记录），Webhook 在后台线程发送，不阻塞写入。
+
+规则触发后进入已触发状态，条件不再满足时才重新生效，避免价格在阈值附近反复提醒；
+另外同一规则两次提醒至少间隔 cooldown 秒。
+
+使用方法：
+    python3 alerts.py add "AK-47 | Redline (Field-Tested)" below 30
+    python3 alerts.py add "AWP | Asiimov (Field-Tested)" change 10 --window 24h --source steam
+    python3 alerts.py list
+    python3 alerts.py remove 3
+    python3 alerts.py listen --port 9100     # 本地 Webhook 接收端，打印收到的提醒
+"""
+
+import argparse
+import bisect
+import collections
+import http.server
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+from arbitrage import MAX_PRICE_AGE
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('above', 'below', 'change')
+
+# 不指定数据源的规则按各数据源最新价格中的最低价判断（超过 max_age 没有更新的数据源不参与，与搬砖扫描一致）
+ANY_SOURCE = '*'
+
+DEFAULT_COOLDOWN = 3600
+
+# 启动时用最近这段时间的价格初始化各物品的最新价格
+SEED_SECONDS = 86400
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_window(value):
+    """窗口长度：秒数，或带单位的字符串（30m、24h、7d）"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str) and value[-1:] in _UNITS:
+        return int(float(value[:-1]) * _UNITS[value[-1]])
+    return int(value)
+
+
+class AlertRule:
+    """一条提醒规则"""
+    __slots__ = ('id', 'item_name', 'source', 'kind', 'threshold', 'window', 'cooldown',
+                 'triggered', 'last_fired')
+
+    def __init__(self, id, item_name, source, kind, threshold, window=None, cooldown=DEFAULT_COOLDOWN,
+                 triggered=False, last_fired=None):
+        self.id = id
+        self.item_name = item_name
+        self.source = source
+        self.kind = kind
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.triggered = bool(triggered)
+        self.last_fired = last_fired
+
+    def series(self):
+        return self.source or ANY_SOURCE
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'item_name': self.item_name,
+            'source': self.source,
+            'kind': self.kind,
+            'threshold': self.threshold,
+            'window': self.window,
+            'cooldown': self.cooldown,
+            'triggered': self.triggered,
+            'last_fired': self.last_fired
+        }
+
+
+class LogSink:
+    """把提醒写入日志"""
+
+    def __call__(self, event):
+        logger.warning(f"价格提醒 #{event['rule_id']}: {event['item_name']} ({event['source']}) "
+                       f"{event['kind']} {event['threshold']}，当前 {event['price']}")
+
+
+class MemorySink:
+    """在内存中保留最近的提醒，供接口查询"""
+
+    def __init__(self, size=200):
+        self.events = collections.deque(maxlen=size)
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def recent(self, limit=50):
+        return list(self.events)[-limit:][::-1]
+
+
+class WebhookSink:
+    """在后台线程把提醒以 JSON POST 到指定地址，失败时重试几次"""
+
+    def __init__(self, url, timeout=5, retries=3, queue_size=1000):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'delivered': 0, 'failed': 0, 'dropped': 0}
+
+    def _ensure_thread(self):
+        """第一次发送时才启动后台线程；预派生的子进程不继承父进程的线程，在子进程中重新启动"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='alert-webhook', daemon=True)
+                self._thread.start()
+
+    def __call__(self, event):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            body = json.dumps(event, ensure_ascii=False).encode('utf-8')
+            for attempt in range(self.retries):
+                try:
+                    request = urllib.request.Request(self.url, data=body, method='POST',
+                                                     headers={'Content-Type': 'application/json'})
+                    with urllib.request.urlopen(request, timeout=self.timeout):
+                        pass
+                    self.stats['delivered'] += 1
+                    break
+                except Exception as e:
+                    if attempt == self.retries - 1:
+                        self.stats['failed'] += 1
+                        logger.error(f"提醒发送到 {self.url} 失败: {e}")
+                    else:
+                        time.sleep(2 ** attempt)
+
+
+class AlertEngine:
+    """价格提醒引擎
+
+    规则按物品索引；每个物品在内存中保存各数据源的最新价格，有涨跌幅规则时再保存窗口内的
+    价格序列。evaluate() 作为写入管道的回调，开销只与本批物品的规则数量有关。
+    """
+    def __init__(self, db, sinks=None, reload_interval=10, max_age=MAX_PRICE_AGE):
+        self.db = db
+        self.sinks = list(sinks) if sinks is not None else [LogSink()]
+        self.reload_interval = reload_interval
+        self.max_age = max_age
+        self._rules = {}       # 物品 -> [规则]
+        self._latest = {}      # 物品 -> {数据源: (价格, 时间)}
+        self._series = {}      # (物品, 数据源或 ANY_SOURCE) -> [(时间, 价格)]
+        self._windows = {}     # (物品, 数据源或 ANY_SOURCE) -> 最长窗口
+        self._lock = threading.Lock()
+        self._signature = None
+        self._last_reload_check = time.monotonic()
+        self.stats = {'evaluated': 0, 'fired': 0, 'sink_errors': 0}
+
+    def add_sink(self, sink):
+        """添加通知方式，sink(event) 接收提醒"""
+        self.sinks.append(sink)
+
+    # ---- 规则 ----
+
+    def _rules_signature(self, conn):
+        return tuple(conn.execute('SELECT count(*), total(id) FROM alerts').fetchone())
+
+    def load(self):
+        """从数据库加载全部规则"""
+        with self.db.connection() as conn:
+            rows = conn.execute('''
+                SELECT id, item_name, source, kind, threshold, window_seconds, cooldown, triggered, last_fired
+                FROM alerts
+            ''').fetchall()
+            self._signature = self._rules_signature(conn)
+        with self._lock:
+            self._rules.clear()
+            for row in rows:
+                rule = AlertRule(*row)
+                self._rules.setdefault(rule.item_name, []).append(rule)
+            items = list(self._rules)
+        for name in items:
+            self._index_item(name)
+        logger.info(f"价格提醒规则加载完成: {len(rows)} 条")
+
+    def add_rule(self, item_name, kind, threshold, source=None, window=None, cooldown=DEFAULT_COOLDOWN):
+        """添加规则，参数不合法时抛出 ValueError"""
+        item_name = (item_name or '').strip()
+        if not item_name:
+            raise ValueError("item is required")
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        try:
+            threshold = float(threshold)
+            window = parse_window(window)
+            cooldown = int(cooldown)
+        except (TypeError, ValueError):
+            raise ValueError("threshold, window and cooldown must be numbers")
+        if threshold <= 0:
+            raise ValueError("threshold must be positive")
+        if window is not None and window <= 0:
+            raise ValueError("window must be positive")
+        if kind == 'change' and not window:
+            raise ValueError("window is required for change alerts")
+        if kind != 'change':
+            window = None
+
+        with self.db.transaction() as conn:
+            stale = self._rules_signature(conn) != self._signature
+            cursor = conn.execute('''
+                INSERT INTO alerts (item_name, source, kind, threshold, window_seconds, cooldown)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (item_name, source or None, kind, threshold, window, cooldown))
+            rule = AlertRule(cursor.lastrowid, item_name, source or None, kind, threshold, window, cooldown)
+            # 自己的修改不算作其他进程的变化，否则之后其他进程删除规则时签名可能又回到旧值而检测不到
+            self._signature = self._rules_signature(conn)
+        if stale:
+            # 其他进程也修改过规则，整体重新加载
+            self.load()
+            return rule.to_dict()
+        with self._lock:
+            self._rules.setdefault(item_name, []).append(rule)
+        self._index_item(item_name)
+        return rule.to_dict()
+
+    def remove_rule(self, rule_id):
+        with self.db.transaction() as conn:
+            row = conn.execute('SELECT item_name FROM alerts WHERE id = ?', (rule_id,)).fetchone()
+            if row is None:
+                return False
+            stale = self._rules_signature(conn) != self._signature
+            conn.execute('DELETE FROM alerts WHERE id = ?', (rule_id,))
+            self._signature = self._rules_signature(conn)
+        if stale:
+            self.load()
+            return True
+        with self._lock:
+            rules = [rule for rule in self._rules.get(row[0], []) if rule.id != rule_id]
+            if rules:
+                self._rules[row[0]] = rules
+            else:
+                self._rules.pop(row[0], None)
+        self._index_item(row[0])
+        return True
+
+    def reload_if_changed(self):
+        """多进程部署时规则可能由其他进程增删，每隔 reload_interval 秒检查一次，有变化时重新加载"""
+        now = time.monotonic()
+        if now - self._last_reload_check < self.reload_interval:
+            return
+        self._last_reload_check = now
+        with self.db.connection() as conn:
+            changed = self._rules_signature(conn) != self._signature
+        if changed:
+            self.load()
+
+    def rules(self, item_name=None):
+        self.reload_if_changed()
+        with self._lock:
+            if item_name is not None:
+                rules = self._rules.get(item_name, [])
+            else:
+                rules = [rule for rules in self._rules.values() for rule in rules]
+            return [rule.to_dict() for rule in rules]
+
+    def _index_item(self, name):
+        """重建物品的价格序列窗口；新出现的物品用数据库中最近的价格初始化"""
+        with self._lock:
+            rules = self._rules.get(name)
+            if not rules:
+                self._latest.pop(name, None)
+                for key in [key for key in self._windows if key[0] == name]:
+                    del self._windows[key]
+                    self._series.pop(key, None)
+                return
+            windows = {}
+            for rule in rules:
+                if rule.kind == 'change':
+                    windows[rule.series()] = max(windows.get(rule.series(), 0), rule.window)
+            for key in [key for key in self._windows if key[0] == name]:
+                if key[1] not in windows:
+                    del self._windows[key]
+                    self._series.pop(key, None)
+            new_series = [source for source in windows if (name, source) not in self._series]
+            for source, window in windows.items():
+                self._windows[(name, source)] = window
+                self._series.setdefault((name, source), [])
+            seed = name not in self._latest or new_series
+            longest = max(windows.values(), default=0)
+
+        if seed:
+            since = int(time.time()) - max(SEED_SECONDS, longest)
+            with self.db.connection() as conn:
+                rows = conn.execute('''
+                    SELECT ts, source, price FROM prices
+                    WHERE item_id = (SELECT id FROM items WHERE name = ?) AND ts >= ?
+                    ORDER BY ts
+                ''', (name, since)).fetchall()
+            with self._lock:
+                self._latest[name] = {}
+                for source in windows:
+                    self._series[(name, source)] = []
+                # 只补齐价格状态，不触发提醒
+                for ts, source, price in rows:
+                    self._observe(name, [(ts, source, price)])
+
+    # ---- 计算 ----
+
+    def _observe(self, name, prices):
+        """记录一个物品的新价格，返回 {数据源或 ANY_SOURCE: (时间, 价格, 实际数据源)}
+
+        最低价只在 max_age 内有更新的数据源中选取，停止报价的数据源不会一直以旧的低价触发提醒
+        """
+        latest = self._latest.setdefault(name, {})
+        observations = {}
+        for ts, source, price in prices:
+            latest[source] = (price, ts)
+            observations[source] = (ts, price, source)
+        now = max(ts for ts, _, _ in prices)
+        for source in [source for source, (_, ts) in latest.items() if now - ts > self.max_age]:
+            del latest[source]
+        if latest:
+            best_source = min(latest, key=lambda source: latest[source][0])
+            observations[ANY_SOURCE] = (now, latest[best_source][0], best_source)
+
+        for source, (ts, price, _) in observations.items():
+            window = self._windows.get((name, source))
+            if window is None:
+                continue
+            series = self._series[(name, source)]
+            series.append((ts, price))
+            # 超出最长窗口的价格成批删除
+            if series[0][0] < ts - 2 * window:
+                del series[:bisect.bisect_left(series, (ts - window,))]
+        return observations
+
+    def _reference_price(self, name, source, ts, window):
+        """窗口起点的价格（窗口内最早的一条）"""
+        series = self._series.get((name, source))
+        if not series:
+            return None
+        index = bisect.bisect_left(series, (ts - window,))
+        return series[index][1] if index < len(series) else None
+
+    def _check(self, rule, ts, price, source):
+        """判断规则是否满足，返回 (是否满足, 提醒内容)"""
+        event = {
+            'rule_id': rule.id,
+            'item_name': rule.item_name,
+            'source': source,
+            'kind': rule.kind,
+            'threshold': rule.threshold,
+            'window': rule.window,
+            'price': price,
+            'ts': ts
+        }
+        if rule.kind == 'above':
+            return price > rule.threshold, event
+        if rule.kind == 'below':
+            return price < rule.threshold, event
+        reference = self._reference_price(rule.item_name, rule.series(), ts, rule.window)
+        if not reference:
+            return False, event
+        change_pct = (price - reference) / reference * 100
+        event.update({'reference_price': reference, 'change_pct': round(change_pct, 2)})
+        return abs(change_pct) >= rule.threshold, event
+
+    def evaluate(self, rows):
+        """写入管道的回调：rows 为 (物品, 物品ID, 时间, 数据源, 价格, 成交量)"""
+        self.reload_if_changed()
+        by_item = {}
+        for name, _, ts, source, price, _ in rows:
+            by_item.setdefault(name, []).append((ts, source, price))
+
+        events, changed = [], []
+        with self._lock:
+            for name, prices in by_item.items():
+                rules = self._rules.get(name)
+                if not rules:
+                    continue
+                observations = self._observe(name, prices)
+                for rule in rules:
+                    observation = observations.get(rule.series())
+                    if observation is None:
+                        continue
+                    ts, price, source = observation
+                    self.stats['evaluated'] += 1
+                    matched, event = self._check(rule, ts, price, source)
+                    if matched and not rule.triggered:
+                        rule.triggered = True
+                        changed.append(rule)
+                        if rule.last_fired is None or ts - rule.last_fired >= rule.cooldown:
+                            rule.last_fired = ts
+                            events.append(event)
+                    elif not matched and rule.triggered:
+                        # 条件不再满足，重新生效
+                        rule.triggered = False
+                        changed.append(rule)
+
+        if changed:
+            with self.db.transaction() as conn:
+                conn.executemany('UPDATE alerts SET triggered = ?, last_fired = ? WHERE id = ?',
+                                 [(int(rule.triggered), rule.last_fired, rule.id) for rule in changed])
+        for event in events:
+            self.stats['fired'] += 1
+            for sink in self.sinks:
+                try:
+                    sink(event)
+                except Exception as e:
+                    self.stats['sink_errors'] += 1
+                    logger.error(f"价格提醒通知失败: {e}")
+        return events
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, rules=sum(len(rules) for rules in self._rules.values()),
+                        items=len(self._rules))
+
+
+def default_sinks():
+    """写入日志；设置了 CSGO_ALERT_WEBHOOK 时再发送到该地址"""
+    sinks = [LogSink()]
+    if os.environ.get('CSGO_ALERT_WEBHOOK'):
+        sinks.append(WebhookSink(os.environ['CSGO_ALERT_WEBHOOK']))
+    return sinks
+
+
+class _WebhookHandler(http.server.BaseHTTPRequestHandler):
+    """本地 Webhook 接收端，打印收到的提醒"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        print(json.dumps(json.loads(body), ensure_ascii=False), flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='管理价格提醒')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add = subparsers.add_parser('add', help='添加规则')
+    add.add_argument('item')
+    add.add_argument('kind', choices=KINDS)
+    add.add_argument('threshold', type=float, help='价格（美元），change 时为涨跌幅百分比')
+    add.add_argument('--source', help='只看某个数据源，默认取各数据源的最低价')
+    add.add_argument('--window', help='change 的窗口，如 1h、24h、7d')
+    add.add_argument('--cooldown', type=int, default=DEFAULT_COOLDOWN)
+    subparsers.add_parser('list', help='列出规则')
+    remove = subparsers.add_parser('remove', help='删除规则')
+    remove.add_argument('id', type=int)
+    listen = subparsers.add_parser('listen', help='启动本地 Webhook 接收端')
+    listen.add_argument('--port', type=int, default=9100)
+    args = parser.parse_args()
+
+    if args.command == 'listen':
+        print(f"在 http://127.0.0.1:{args.port}/ 接收提醒（设置 CSGO_ALERT_WEBHOOK 为该地址）")
+        http.server.ThreadingHTTPServer(('127.0.0.1', args.port), _WebhookHandler).serve_forever()
+        return
+
+    from db import db_pool
+    db_pool.migrate()
+    engine = AlertEngine(db_pool, sinks=[])
+    if args.command == 'add':
+        try:
+            rule = engine.add_rule(args.item, args.kind, args.threshold, args.source, args.window, args.cooldown)
+        except ValueError as e:
+            parser.error(str(e))
+        print(json.dumps(rule, ensure_ascii=False))
+    elif args.command == 'list':
+        engine.load()
+        for rule in engine.rules():
+            print(json.dumps(rule, ensure_ascii=False))
+    else:
+        print('已删除' if engine.remove_rule(args.id) else '规则不存在')
+
+
+if __name__ == '__main__':
+    main()
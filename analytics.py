@@ -0,0 +1,165 @@
+# 价格分析（pandas 向量化计算）
+# pandas 和 numpy 在第一次分析时才导入，不使用分析接口的进程不需要加载
+import math
+import threading
+import time
+
+import rollups
+from arbitrage import SELL_FEES
+
+# 移动平均窗口（按小时桶计算）
+MA_WINDOWS = ['24h', '7d']
+
+# 数据源价格向前填充的最大小时数，超过视为该数据源缺失
+FILL_LIMIT = 6
+
+
+class PriceAnalytics:
+    """移动平均、波动率、跨平台价差和搬砖利润
+
+    所有物品的历史一次读出，按 (物品, 小时) 透视成 物品×数据源 的宽表后整体计算，
+    不逐行遍历。结果按 (物品, 窗口) 缓存 ttl 秒，物品有新价格写入时失效。
+    """
+    def __init__(self, storage, archive=None, ttl=300):
+        self.storage = storage
+        self.archive = archive
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def invalidate(self, rows):
+        """写入管道的回调：有新价格的物品清除缓存"""
+        names = {row[0] for row in rows}
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in names]:
+                del self._cache[key]
+
+    def analyze(self, item_names, window='7d'):
+        """返回 {物品: 分析结果}，窗口取 rollups.RANGES 中的一个"""
+        if window not in rollups.RANGES:
+            raise ValueError(f"window must be one of {', '.join(rollups.RANGES)}")
+
+        now = time.time()
+        results, missing = {}, []
+        with self._lock:
+            for name in item_names:
+                cached = self._cache.get((name, window))
+                if cached and now - cached[0] < self.ttl:
+                    results[name] = cached[1]
+                else:
+                    missing.append(name)
+        self.stats['hits'] += len(results)
+        self.stats['misses'] += len(missing)
+
+        if missing:
+            computed = compute(self._load(missing, int(now) - rollups.RANGES[window]))
+            with self._lock:
+                for name in missing:
+                    result = computed.get(name)
+                    self._cache[(name, window)] = (now, result)
+                    results[name] = result
+        return results
+
+    def _load(self, item_names, since):
+        import pandas as pd
+        df = self.storage.scan(item_names, since=since)
+        if self.archive is not None:
+            # 主存储中已删除的早期原始价格从归档补齐
+            oldest = df['ts'].min() if len(df) else None
+            archived = self.archive.scan(item_names, since=since, until=oldest)
+            if len(archived):
+                df = pd.concat([archived, df], ignore_index=True)
+        return df
+
+
+def compute(df):
+    """对 COLUMNS 格式的原始价格计算各物品的分析指标"""
+    import numpy as np
+    import pandas as pd
+    if df.empty:
+        return {}
+
+    df = df.assign(bucket=df['ts'] - df['ts'] % 3600)
+    # 物品×小时 为行、数据源为列；缺失的数据源价格在短时间内沿用上一个值
+    wide = df.sort_values('ts').pivot_table(index=['item_name', 'bucket'], columns='source',
+                                            values='price', aggfunc='last')
+    wide = wide.groupby(level='item_name').ffill(limit=FILL_LIMIT)
+
+    combined = wide.mean(axis=1).rename('price')
+    spread = wide.max(axis=1) - wide.min(axis=1)
+    spread_pct = spread / wide.min(axis=1)
+    returns = np.log(combined).groupby(level='item_name').diff()
+
+    frame = combined.reset_index()
+    frame['time'] = pd.to_datetime(frame['bucket'], unit='s')
+    # frame 已按 (物品, 时间) 排序，分组滚动的结果与之逐行对应
+    rolling = frame.groupby('item_name').rolling
+    for ma in MA_WINDOWS:
+        frame[f'ma_{ma}'] = rolling(ma, on='time')['price'].mean().to_numpy()
+    frame = frame.set_index(['item_name', 'bucket'])
+
+    by_item = returns.groupby(level='item_name')
+    summary = pd.DataFrame({
+        'last_price': combined.groupby(level='item_name').last(),
+        'points': combined.groupby(level='item_name').size(),
+        'volatility_hourly': by_item.std(),
+        'spread_mean': spread.groupby(level='item_name').mean(),
+        'spread_pct_mean': spread_pct.groupby(level='item_name').mean(),
+        'spread_last': spread.groupby(level='item_name').last(),
+        'spread_pct_last': spread_pct.groupby(level='item_name').last(),
+        'change_pct': combined.groupby(level='item_name').last() / combined.groupby(level='item_name').first() - 1,
+    })
+    last_rows = frame.groupby(level='item_name').last()
+    for ma in MA_WINDOWS:
+        summary[f'ma_{ma}'] = last_rows[f'ma_{ma}']
+    # 按一天24小时折算的日波动率
+    summary['volatility_daily'] = summary['volatility_hourly'] * math.sqrt(24)
+
+    arbitrage = _arbitrage(wide.groupby(level='item_name').last())
+
+    results = {}
+    for name, row in summary.iterrows():
+        result = {key: _clean(value) for key, value in row.items()}
+        result['points'] = int(row['points'])
+        result['arbitrage'] = arbitrage.get(name)
+        results[name] = result
+    return results
+
+
+def _arbitrage(latest):
+    """最新价格中，在最便宜的平台买入、扣除手续费后在其他平台中到手最多的平台卖出的利润"""
+    import pandas as pd
+    # 至少两个平台有价格才有价差
+    latest = latest[latest.notna().sum(axis=1) >= 2]
+    fees = pd.Series(SELL_FEES).reindex(latest.columns).fillna(0.0)
+    buy_source = latest.idxmin(axis=1)
+    buy_price = latest.min(axis=1)
+    # 卖出平台不能是买入平台（与 ArbitrageScanner 一致），否则手续费高的平台会出现在自己买卖的负价差
+    is_buy = pd.DataFrame(latest.columns.to_numpy()[None, :] == buy_source.to_numpy()[:, None],
+                          index=latest.index, columns=latest.columns)
+    net = (latest * (1 - fees)).mask(is_buy)
+    sell_source = net.idxmax(axis=1)
+    sell_net = net.max(axis=1)
+    gap = sell_net - buy_price
+
+    results = {}
+    for name in latest.index:
+        results[name] = {
+            'buy_source': buy_source[name],
+            'buy_price': _clean(buy_price[name]),
+            'sell_source': sell_source[name],
+            'sell_price': _clean(latest.at[name, sell_source[name]]),
+            'sell_net': _clean(sell_net[name]),
+            'gap': _clean(gap[name]),
+            'gap_pct': _clean(gap[name] / buy_price[name]),
+        }
+    return results
+
+
+def _clean(value):
+    """转换为可 JSON 序列化的值，NaN 变为 None"""
+    import pandas as pd
+    if value is None or (isinstance(value, float) and math.isnan(value)) or pd.isna(value):
+        return None
+    return round(float(value), 4)
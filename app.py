@@ -1,49 +1,59 @@
-from flask import Flask, render_template, jsonify, request
-from flask_cors import CORS
-import requests
-import json
-import sqlite3
-import pandas as pd
-from datetime import datetime, timedelta
-from fuzzywuzzy import fuzz, process
-import threading
+# 最先导入，从这里开始统计启动耗时
+from startup import startup_timer
+
+from flask import Blueprint, Flask, Response, render_template, jsonify, request, stream_with_context
+import atexit
+import os
 import time
-import schedule
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from db import db_pool
+from storage import SQLiteStorage, ArchiveStorage, history_response
+from write_pipeline import PriceWriter
+from retention import RetentionPolicy
+from analytics import PriceAnalytics
+from search_index import SearchIndex
+from catalog_sync import CatalogueSync
+from pubsub import PriceBroker, RETRY_MS, sse_frame
+from alerts import AlertEngine, MemorySink, default_sinks
+from arbitrage import ArbitrageScanner
+from shared_state import SharedState
+import rollups
+import http_cache
+import metrics
+import middleware
+
+# 价格服务的路由：单独运行时挂在本模块的 app 上，合并部署时由 unified_app 挂载
+price_api = Blueprint('price', __name__)
 
-app = Flask(__name__)
-CORS(app)
+# 价格存储（SQLite 主存储）
+storage = SQLiteStorage(db_pool)
 
-# 初始化数据库
+# 物品搜索索引
+search_index = SearchIndex()
+
+# 初始化数据库（建表和结构升级都由 migrations 负责），并加载搜索索引和价格提醒规则
 def init_db():
-    conn = sqlite3.connect('csgo_prices.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            display_name TEXT NOT NULL,
-            icon_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            item_id INTEGER,
-            price REAL NOT NULL,
-            source TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (item_id) REFERENCES items (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with startup_timer.phase('migrate'):
+        storage.init()
+    with startup_timer.phase('search index'):
+        load_search_index()
+    with startup_timer.phase('alerts'):
+        alert_engine.load()
+    with startup_timer.phase('arbitrage'):
+        arbitrage_scanner.load()
+
+def load_search_index():
+    """从 items 表、常见物品和目录文件（CSGO_ITEM_CATALOGUE，每行一个名称）加载搜索索引"""
+    search_index.add(CSGO_ITEMS)
+    search_index.add(storage.item_names())
+    catalogue = os.environ.get('CSGO_ITEM_CATALOGUE')
+    if catalogue and os.path.exists(catalogue):
+        search_index.load_file(catalogue)
 
 # 导入多源爬虫系统
-from crawlers import multi_crawler, search_all_markets
+from crawlers import background_requests, multi_crawler, search_all_markets
+from scheduler import RefreshScheduler
 
 # CS:GO常见物品数据库（用于模糊搜索）
 CSGO_ITEMS = [
@@ -55,160 +65,498 @@ CSGO_ITEMS = [
     "USP-S | Kill Confirmed", "USP-S | Neo-Noir", "USP-S | Orion"
 ]
 
-def get_db_connection():
-    conn = sqlite3.connect('csgo_prices.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+# 批量价格写入管道，写入时同步维护 OHLC 聚合
+price_writer = PriceWriter(storage)
 
-def save_item_price(item_name, price_data, source="steam"):
-    """保存物品价格到数据库"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 插入或获取物品
-    cursor.execute('INSERT OR IGNORE INTO items (name, display_name) VALUES (?, ?)', 
-                   (item_name, item_name))
-    
-    cursor.execute('SELECT id FROM items WHERE name = ?', (item_name,))
-    item_id = cursor.fetchone()['id']
-    
-    # 保存价格数据
-    if price_data and price_data.get('median_price'):
-        price_str = price_data['median_price'].replace('$', '').replace(',', '')
-        try:
-            price = float(price_str)
-            cursor.execute('INSERT INTO prices (item_id, price, source) VALUES (?, ?, ?)',
-                          (item_id, price, source))
-        except ValueError:
-            pass
-    
-    conn.commit()
-    conn.close()
+# 历史价格保留策略（保留天数由 CSGO_RAW_RETENTION_DAYS / CSGO_HOURLY_RETENTION_DAYS 配置）
+# 设置了 CSGO_ARCHIVE_PATH 时，过期的原始价格删除前先导出到列式归档
+archive = ArchiveStorage(os.environ['CSGO_ARCHIVE_PATH']) if os.environ.get('CSGO_ARCHIVE_PATH') else None
+retention = RetentionPolicy(db_pool, archive=archive)
+
+# 价格分析，结果按 (物品, 窗口) 缓存，物品有新价格写入时失效
+analytics = PriceAnalytics(storage, archive=archive)
+price_writer.add_listener(analytics.invalidate)
+
+# 新出现的物品写入后加入搜索索引
+price_writer.add_listener(lambda rows: search_index.add(row[0] for row in rows))
+
+# 实时价格推送：写入的新价格推送给订阅了该物品的客户端，多个客户端共享同一次抓取
+price_broker = PriceBroker()
+price_writer.add_listener(price_broker.publish)
+
+# 价格提醒：每批写入的价格只检查对应物品的规则，最近的提醒保留在内存中供查询
+# 多进程部署时只在运行后台任务的进程中检查，避免同一条提醒被每个进程各触发一次
+alert_events = MemorySink()
+alert_engine = AlertEngine(db_pool, default_sinks() + [alert_events])
+evaluate_alerts = True
+
+def check_alerts(rows):
+    if evaluate_alerts:
+        alert_engine.evaluate(rows)
+
+price_writer.add_listener(check_alerts)
+
+# 跨平台搬砖机会：内存中的最新价格簿，写入新价格时增量更新
+arbitrage_scanner = ArbitrageScanner(storage)
+price_writer.add_listener(arbitrage_scanner.update)
 
 # API路由
-@app.route('/')
+@price_api.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/search')
+@price_api.route('/api/search')
 def search_items():
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify({'error': 'Query parameter is required'}), 400
     
-    # 模糊搜索本地数据库
-    matches = process.extract(query, CSGO_ITEMS, limit=10, scorer=fuzz.partial_ratio)
-    suggestions = [match[0] for match in matches if match[1] > 60]
+    # 在本地索引中模糊搜索（支持前缀和拼写纠错）
+    suggestions = search_index.suggest(query, limit=10)
     
-    # 搜索所有市场
-    steam_results = search_all_markets(query)
+    # 只有明确要求时才实时搜索市场（live=1），输入联想只查本地；
+    # 物品目录第一轮同步完成前本地可能缺少物品，本地没有结果时也实时搜索一次
+    fallback = not suggestions and not catalogue_sync.completed()
+    steam_results = search_all_markets(query) if request.args.get('live') == '1' or fallback else []
+    if fallback and steam_results:
+        # 搜到的物品写入目录和索引，之后同样的输入直接命中本地
+        found = [item for item in steam_results if item.get('name')]
+        storage.upsert_items(found)
+        search_index.add(item['name'] for item in found)
+        suggestions = [item['name'] for item in found[:10]]
     
     return jsonify({
         'suggestions': suggestions,
+        'items': storage.get_items(suggestions),
         'steam_results': steam_results
     })
 
-@app.route('/api/price/<path:item_name>')
+# 读取数据库中的价格时，超过这个时长视为过期（也是批量接口和实时推送的默认值）
+PRICE_MAX_AGE = 30 * 60
+# /api/price 的默认模式：live 每次实时抓取所有数据源；cached 只读数据库，过期的物品交给后台抓取
+PRICE_MODE = os.environ.get('CSGO_PRICE_MODE', 'live')
+
+@price_api.route('/api/price/<path:item_name>')
 def get_item_price(item_name):
+    """获取物品价格和历史
+
+    参数 mode: live 或 cached（默认由 CSGO_PRICE_MODE 决定）；max_age: cached 模式下价格的有效秒数
+    """
+    mode = request.args.get('mode', PRICE_MODE)
+    if mode == 'cached':
+        try:
+            max_age = int(request.args.get('max_age', PRICE_MAX_AGE))
+        except ValueError:
+            return jsonify({'error': 'max_age must be an integer'}), 400
+        if max_age < 0:
+            return jsonify({'error': 'max_age must not be negative'}), 400
+        return get_stored_price(item_name, max_age)
+    if mode != 'live':
+        return jsonify({'error': 'mode must be live or cached'}), 400
+
     # 从多个数据源获取价格
     market_data = multi_crawler.get_best_price(item_name)
     
     if market_data and market_data.get('all_sources'):
-        # 保存所有数据源的价格到数据库
-        for source_name, price_data in market_data['all_sources'].items():
-            save_item_price(item_name, price_data, source_name)
-        
-        # 获取历史价格数据
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT p.price, p.timestamp, p.source
-            FROM prices p
-            JOIN items i ON p.item_id = i.id
-            WHERE i.name = ?
-            ORDER BY p.timestamp DESC
-            LIMIT 100
-        ''', (item_name,))
+        # 保存所有数据源的价格到数据库（立即写入，下面要读取历史）
+        price_writer.write(item_name, market_data['all_sources'])
         
-        history = []
-        for row in cursor.fetchall():
-            history.append({
-                'price': row['price'],
-                'timestamp': row['timestamp'],
-                'source': row['source']
-            })
+        # 记录需求，热门物品会被更频繁地后台刷新
+        refresh_scheduler.record_request(item_name)
         
-        conn.close()
+        # 获取历史价格数据
+        history = history_response(storage.get_history(item_name, limit=100))
         
         # 使用最佳价格作为当前价格，如果没有则使用第一个可用的价格
-        current_price = market_data.get('best_price', {})
+        current_price = market_data.get('best_price')
         if not current_price:
             # 使用第一个可用的价格源
-            first_source = next(iter(market_data['all_sources'].values()))
-            current_price = first_source
+            current_price = next(iter(market_data['all_sources'].values()))
         
         return jsonify({
-            'current_price': current_price,
-            'all_sources': market_data['all_sources'],
+            'current_price': current_price.to_dict(),
+            'all_sources': {name: record.to_dict() for name, record in market_data['all_sources'].items()},
             'history': history,
             'item_name': item_name
         })
     
     return jsonify({'error': 'Item not found'}), 404
 
-@app.route('/api/chart/<path:item_name>')
+def get_stored_price(item_name, max_age):
+    """只从数据库读取最新价格和历史，响应时间与上游市场无关
+
+    没有价格或价格已过期的物品放进后台调度器的优先抓取队列，抓到后通过 /api/stream 推送；
+    还没有任何价格时返回 202。
+    """
+    history = history_response(storage.get_history(item_name, limit=100))
+    if not history and item_name not in search_index:
+        return jsonify({'error': 'Item not found'}), 404
+
+    now = int(time.time())
+    all_sources = {}
+    for record in history:
+        # 历史按时间倒序，每个数据源第一次出现的就是最新价格
+        all_sources.setdefault(record['source'], {'price': record['price'], 'ts': record['ts']})
+    updated_at = history[0]['ts'] if history else None
+    stale = updated_at is None or now - updated_at > max_age
+
+    refresh_scheduler.record_request(item_name)
+    refresh_pending = refresh_scheduler.request_refresh(item_name) if stale else False
+
+    best_source = min(all_sources, key=lambda source: all_sources[source]['price']) if all_sources else None
+    return jsonify({
+        'item_name': item_name,
+        'mode': 'cached',
+        'current_price': dict(all_sources[best_source], source=best_source) if best_source else None,
+        'all_sources': all_sources,
+        'history': history,
+        'updated_at': history[0]['timestamp'] if history else None,
+        'age': now - updated_at if updated_at else None,
+        'stale': stale,
+        'refresh_pending': refresh_pending
+    }), 200 if history else 202
+
+# 批量价格接口：单次请求的物品数上限和并发抓取的线程数
+MAX_BULK_ITEMS = 500
+bulk_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='bulk-price')
+
+def bulk_price_result(item_name, sources, now, cached):
+    """批量接口的单个物品结果，最优价格按入库的参考价比较（缓存和新抓取的结果一致）"""
+    best_source = min(sources, key=lambda source: sources[source]['price'])
+    return {
+        'item_name': item_name,
+        'status': 'ok',
+        'cached': cached,
+        'age': now - max(price['ts'] for price in sources.values()),
+        'best_price': {'source': best_source, 'price': sources[best_source]['price']},
+        'sources': sources
+    }
+
+def fetch_item_prices(item_name):
+    """从各数据源抓取一个物品的价格（受各数据源限流约束），写入缓冲区并返回批量接口的结果"""
+    try:
+        market_data = multi_crawler.get_all_prices(item_name)
+    except Exception as e:
+        return {'item_name': item_name, 'status': 'error', 'error': str(e)}
+
+    now = int(time.time())
+    sources = {}
+    for name, record in market_data.items():
+        price = record.reference_base()
+        if price is not None:
+            sources[name] = {'price': price / 100, 'ts': now, 'volume': record.volume}
+    if not sources:
+        return {'item_name': item_name, 'status': 'not_found'}
+
+    try:
+        price_writer.submit(item_name, market_data, ts=now)
+        refresh_scheduler.record_request(item_name)
+    except Exception as e:
+        return {'item_name': item_name, 'status': 'error', 'error': str(e)}
+    return bulk_price_result(item_name, sources, now, cached=False)
+
+@price_api.route('/api/prices', methods=['POST'])
+def get_item_prices():
+    """批量获取价格，按 NDJSON 逐行返回（每个物品一行）
+
+    请求体: {"items": [...], "max_age": 1800}。存储中 max_age 秒内有价格的物品直接返回，
+    其余的并发抓取，哪个先完成先返回，因此结果顺序与请求顺序不同。
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {'items': data}
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return jsonify({'error': 'items must be a list'}), 400
+    item_names = list(dict.fromkeys(str(name).strip() for name in items if str(name).strip()))
+    if not item_names:
+        return jsonify({'error': 'items is empty'}), 400
+    if len(item_names) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'at most {MAX_BULK_ITEMS} items per request'}), 400
+    try:
+        max_age = int(data.get('max_age', PRICE_MAX_AGE))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_age must be an integer'}), 400
+
+    now = int(time.time())
+    cached = storage.latest_prices(item_names, now - max_age) if max_age > 0 else {}
+    misses = [name for name in item_names if name not in cached]
+
+    def generate():
+        for name in item_names:
+            if name in cached:
+                yield http_cache.dumps(bulk_price_result(name, cached[name], now, cached=True)) + b'\n'
+
+        futures = {bulk_executor.submit(fetch_item_prices, name): name for name in misses}
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 单个物品出错时输出错误行，不中断整个响应
+                    result = {'item_name': futures[future], 'status': 'error', 'error': str(e)}
+                yield http_cache.dumps(result) + b'\n'
+        finally:
+            # 客户端提前断开时取消还没开始的抓取
+            for future in futures:
+                future.cancel()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-store', 'X-Cache-Hits': str(len(cached)),
+                             'X-Cache-Misses': str(len(misses))})
+
+@price_api.route('/api/stream')
+def stream_prices():
+    """订阅物品的实时价格（Server-Sent Events）
+
+    参数 item: 物品名称，可重复传入多个（最多50个）。连接后先发送各物品最近的价格，之后每次
+    写入新价格推送一条 price 消息；断线重连时按 Last-Event-ID 只补发之后的价格。
+    """
+    item_names = list(dict.fromkeys(request.args.getlist('item')))
+    if not item_names:
+        return jsonify({'error': 'item is required'}), 400
+    if len(item_names) > 50:
+        return jsonify({'error': 'at most 50 items per stream'}), 400
+
+    # 先订阅再读取最近的价格，两者之间写入的价格不会丢失
+    subscription = price_broker.subscribe(item_names)
+    if subscription is None:
+        return jsonify({'error': 'too many subscribers'}), 503
+
+    # 订阅的物品交给后台调度器刷新，新价格写入后推送过来
+    for name in item_names:
+        refresh_scheduler.record_request(name)
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    since = last_event_id + 1 if last_event_id else int(time.time()) - PRICE_MAX_AGE
+    latest = storage.latest_prices(item_names, since)
+
+    def generate():
+        yield f'retry: {RETRY_MS}\n\n'.encode('utf-8')
+        for name, sources in latest.items():
+            ts = max(price['ts'] for price in sources.values())
+            yield sse_frame('price', {'item_name': name, 'ts': ts, 'sources': sources}, ts)
+        yield from subscription.events()
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # 客户端断开后取消订阅
+    response.call_on_close(lambda: price_broker.unsubscribe(subscription))
+    return response
+
+@price_api.route('/api/chart/<path:item_name>')
 def get_price_chart(item_name):
-    """获取价格图表数据"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 获取最近30天的价格数据
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    cursor.execute('''
-        SELECT p.price, p.timestamp
-        FROM prices p
-        JOIN items i ON p.item_id = i.id
-        WHERE i.name = ? AND p.timestamp >= ?
-        ORDER BY p.timestamp ASC
-    ''', (item_name, thirty_days_ago))
-    
-    data = cursor.fetchall()
-    conn.close()
+    """获取价格图表数据
+
+    参数 range: 24h/7d/30d/90d/1y（默认30d）；resolution: auto/raw/hour/day（默认auto，
+    自动选择能覆盖整个范围的聚合表）；source: 只返回某个数据源
+    """
+    range_name = request.args.get('range', '30d')
+    if range_name not in rollups.RANGES:
+        return jsonify({'error': f"range must be one of {', '.join(rollups.RANGES)}"}), 400
+    range_seconds = rollups.RANGES[range_name]
+    try:
+        resolution = rollups.pick_resolution(range_seconds, request.args.get('resolution', 'auto'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    chart_data = {
-        'labels': [row['timestamp'] for row in data],
-        'prices': [row['price'] for row in data]
-    }
+    since = int(time.time()) - range_seconds
+    chart_data = storage.get_chart(item_name, resolution, since, request.args.get('source'))
     
+    chart_data.update({'range': range_name, 'resolution': resolution})
     return jsonify(chart_data)
 
+@price_api.route('/api/analytics')
+def get_price_analytics():
+    """价格分析：移动平均、波动率、跨平台价差和搬砖利润
+
+    参数 item: 物品名称，可重复传入多个（最多100个）；window: 24h/7d/30d/90d/1y（默认7d）
+    """
+    item_names = list(dict.fromkeys(request.args.getlist('item')))
+    if not item_names:
+        return jsonify({'error': 'item is required'}), 400
+    if len(item_names) > 100:
+        return jsonify({'error': 'at most 100 items per request'}), 400
+    window = request.args.get('window', '7d')
+    try:
+        results = analytics.analyze(item_names, window)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'window': window, 'items': results})
+
+@price_api.route('/api/arbitrage')
+def get_arbitrage():
+    """全目录中扣除卖出手续费后利润率最高的搬砖机会（只读内存中的价格簿，不抓取）
+
+    参数 limit: 返回数量（默认20，最多200）；min_price: 买入价下限（美元）；min_gap_pct: 利润率下限；
+    item: 只查看某个物品的各平台价格
+    """
+    item_name = request.args.get('item')
+    if item_name:
+        result = arbitrage_scanner.get(item_name)
+        if result is None:
+            return jsonify({'error': 'Item not found'}), 404
+        return jsonify(result)
+
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    opportunities = arbitrage_scanner.top(limit,
+                                          min_price=request.args.get('min_price', 0.0, type=float),
+                                          min_gap_pct=request.args.get('min_gap_pct', 0.0, type=float))
+    return jsonify({'opportunities': opportunities, 'items': arbitrage_scanner.status()['items']})
+
+@price_api.route('/api/sources/health')
+def get_sources_health():
+    """获取各数据源的熔断器状态"""
+    return jsonify(multi_crawler.get_source_health())
+
 # 后台价格更新任务
-def update_prices():
-    """定期更新热门物品价格"""
-    popular_items = CSGO_ITEMS[:5]  # 更新前5个热门物品（减少请求量）
+def refresh_item(item_name):
+    """刷新单个物品的价格并保存，返回用于计算波动率的最优价格"""
+    with background_requests():
+        market_data = multi_crawler.get_best_price(item_name)
+    if not market_data or not market_data.get('all_sources'):
+        return None
     
-    for item in popular_items:
-        try:
-            market_data = multi_crawler.get_best_price(item)
-            if market_data and market_data.get('all_sources'):
-                # 保存所有数据源的价格
-                for source_name, price_data in market_data['all_sources'].items():
-                    save_item_price(item, price_data, source_name)
-                time.sleep(3)  # 避免请求过快
-        except Exception as e:
-            print(f"Error updating price for {item}: {e}")
-
-def run_scheduler():
-    schedule.every(30).minutes.do(update_prices)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    # 放入写入缓冲区，按批量或时间阈值统一写入
+    price_writer.submit(item_name, market_data['all_sources'])
+    
+    comparison = market_data.get('comparison')
+    return comparison[0][0] / 100 if comparison else None
+
+refresh_scheduler = RefreshScheduler(
+    refresh_item,
+    db_pool,
+    base_interval=30 * 60,
+    max_refresh_rate=multi_crawler.max_refresh_rate(),
+    # 只有目录、items 表或常见物品中存在的名称才会因查询自动加入关注列表
+    known=lambda name: name in search_index
+)
+
+# 物品目录同步（与价格刷新共用 Steam 的请求预算）
+catalogue_sync = CatalogueSync(multi_crawler.crawlers['steam'], storage, search_index)
+
+# 多进程部署时进程之间通过数据库共享新价格、新物品和调度请求
+shared_state = SharedState(db_pool)
+
+# /metrics 中输出的后台任务状态
+metrics.registry.gauge('csgo_writer_pending_rows', '写入管道中尚未写入的价格行数', price_writer.pending)
+metrics.registry.gauge('csgo_refresh_backlog_items', '已到期但尚未刷新的关注物品数',
+                       lambda: refresh_scheduler.status()['backlog'])
+metrics.registry.gauge('csgo_stream_subscribers', '实时推送的订阅连接数', lambda: price_broker.status()['subscribers'])
+
+@price_api.route('/api/scheduler/status')
+def get_scheduler_status():
+    """后台刷新调度器的积压和延迟，以及写入管道、保留策略、目录同步、实时推送、价格提醒、搬砖扫描和启动耗时"""
+    status = refresh_scheduler.status()
+    status['writer'] = price_writer.status()
+    status['retention'] = retention.status()
+    status['catalogue'] = catalogue_sync.status()
+    status['stream'] = price_broker.status()
+    status['alerts'] = alert_engine.status()
+    status['arbitrage'] = arbitrage_scanner.status()
+    status['shared'] = shared_state.status()
+    status['startup'] = startup_timer.report()
+    return jsonify(status)
+
+@price_api.route('/api/watchlist', methods=['GET', 'POST', 'DELETE'])
+def manage_watchlist():
+    """查看、添加或移除关注列表中的物品"""
+    if request.method == 'GET':
+        limit = request.args.get('limit', 100, type=int)
+        return jsonify({'items': refresh_scheduler.watchlist(limit)})
+    
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not all(isinstance(name, str) for name in items):
+        return jsonify({'error': 'items must be a list of strings'}), 400
+    
+    if request.method == 'POST':
+        return jsonify({'added': refresh_scheduler.add_items(items)})
+    return jsonify({'removed': refresh_scheduler.remove_items(items)})
+
+@price_api.route('/api/alerts', methods=['GET', 'POST'])
+def manage_alerts():
+    """查看或添加价格提醒规则
+
+    POST 请求体: {"item", "kind": above/below/change, "threshold", "source", "window", "cooldown"}。
+    above/below 的 threshold 为美元价格，change 为 window（秒或 30m/24h/7d）内的涨跌幅百分比
+    """
+    if request.method == 'GET':
+        return jsonify({'rules': alert_engine.rules(request.args.get('item'))})
+
+    data = request.get_json(silent=True) or {}
+    try:
+        rule = alert_engine.add_rule(data.get('item'), data.get('kind'), data.get('threshold'),
+                                     source=data.get('source'), window=data.get('window'),
+                                     cooldown=data.get('cooldown', 3600))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(rule), 201
+
+@price_api.route('/api/alerts/<int:rule_id>', methods=['DELETE'])
+def delete_alert(rule_id):
+    if not alert_engine.remove_rule(rule_id):
+        return jsonify({'error': 'Alert not found'}), 404
+    return jsonify({'removed': rule_id})
+
+@price_api.route('/api/alerts/events')
+def get_alert_events():
+    """最近触发的提醒，按时间倒序"""
+    return jsonify({'events': alert_events.recent(request.args.get('limit', 50, type=int))})
+
+def start_writer():
+    """只启动写入管道（多进程部署时不运行后台任务的进程使用）"""
+    price_writer.start()
+    atexit.register(price_writer.stop)
+
+def start_shared(background):
+    """多进程部署时每个进程调用一次（在启动写入管道之前）
+
+    本进程写入的价格同时追加到共享表，其他进程写入的价格交给实时推送、搬砖价格簿、分析缓存和搜索索引。
+    background 为真的进程执行其他进程转交的调度请求并检查所有价格的提醒；其他进程不检查提醒，
+    调度请求转交出去
+    """
+    global evaluate_alerts
+    evaluate_alerts = background
+    price_writer.add_transaction_hook(shared_state.publish)
+    shared_state.add_listener(analytics.invalidate)
+    shared_state.add_listener(price_broker.publish)
+    shared_state.add_listener(arbitrage_scanner.update)
+    shared_state.add_listener(check_alerts)
+    shared_state.add_item_listener(search_index.add)
+    if not background:
+        refresh_scheduler.forward_to(shared_state)
+    shared_state.start(refresh_scheduler if background else None)
+    atexit.register(shared_state.stop)
+
+def start_scheduler():
+    """加载关注列表并启动后台刷新、写入管道、保留策略和目录同步"""
+    refresh_scheduler.load()
+    if not refresh_scheduler.status()['watchlist_size']:
+        # 首次启动时用热门物品初始化关注列表
+        refresh_scheduler.add_items(CSGO_ITEMS)
+    refresh_scheduler.start()
+    # 退出时写出缓冲区中剩余的价格
+    start_writer()
+    retention.start()
+    catalogue_sync.start()
+
+def create_app():
+    """单独运行价格服务的 Flask 应用"""
+    app = Flask(__name__)
+    middleware.init_app(app)
+    app.register_blueprint(price_api)
+    return app
+
+app = create_app()
+startup_timer.mark('import')
 
 if __name__ == '__main__':
     init_db()
     
-    # 启动后台价格更新线程
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
+    # 启动后台价格刷新调度器
+    start_scheduler()
+    startup_timer.finish()
+    startup_timer.print_report()
     
     app.run(debug=True, host='0.0.0.0', port=5000)
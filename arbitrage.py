@@ -0,0 +1,195 @@
+# 跨平台搬砖机会扫描（只依赖标准库）
+import heapq
+import threading
+import time
+
+# 各平台卖出手续费（近似值），用于计算扣费后的搬砖利润
+SELL_FEES = {
+    'steam': 0.15,
+    'buff': 0.025,
+    'csmoney': 0.07,
+    'bitskins': 0.05,
+}
+
+# 超过这个时长的价格不参与比较
+MAX_PRICE_AGE = 6 * 3600
+
+# 堆中作废的条目超过这个数量（且多于有效条目）时重建堆
+COMPACT_THRESHOLD = 1024
+
+
+class Opportunity:
+    """一个物品当前的搬砖机会：在最便宜的平台买入，扣除手续费后在净价最高的平台卖出"""
+    __slots__ = ('item_name', 'buy_source', 'buy_price', 'sell_source', 'sell_price', 'sell_net',
+                 'gap', 'gap_pct', 'ts', 'version')
+
+    def __init__(self, item_name, buy_source, buy_price, sell_source, sell_price, sell_net, ts, version):
+        self.item_name = item_name
+        self.buy_source = buy_source
+        self.buy_price = buy_price
+        self.sell_source = sell_source
+        self.sell_price = sell_price
+        self.sell_net = sell_net
+        self.gap = sell_net - buy_price
+        self.gap_pct = self.gap / buy_price
+        self.ts = ts    # 两个价格中较早的时间
+        self.version = version
+
+    def to_dict(self, now):
+        return {
+            'item_name': self.item_name,
+            'buy_source': self.buy_source,
+            'buy_price': round(self.buy_price, 4),
+            'sell_source': self.sell_source,
+            'sell_price': round(self.sell_price, 4),
+            'sell_net': round(self.sell_net, 4),
+            'gap': round(self.gap, 4),
+            'gap_pct': round(self.gap_pct, 4),
+            'age': int(now - self.ts)
+        }
+
+
+class ArbitrageScanner:
+    """在内存中维护每个 (物品, 数据源) 的最新价格，写入新价格时只重新计算对应物品
+
+    所有物品的搬砖机会按利润率放在一个堆里，物品更新时旧条目按版本号作废，查询时跳过，
+    因此查询全目录的前 K 个机会不需要重新抓取或扫描价格表。
+
+    超过 max_age 的数据源价格在重新计算时丢弃；查询时遇到含过期价格的机会，用剩下的价格重新计算。
+    作废的条目数量超过 compact_threshold 且多于有效条目时重建堆。
+    """
+    def __init__(self, storage, sell_fees=SELL_FEES, max_age=MAX_PRICE_AGE, compact_threshold=COMPACT_THRESHOLD):
+        self.storage = storage
+        self.sell_fees = sell_fees
+        self.max_age = max_age
+        self.compact_threshold = compact_threshold
+        self._book = {}          # 物品 -> {数据源: (价格, 时间)}
+        self._opportunities = {} # 物品 -> 当前的 Opportunity
+        self._heap = []          # (-利润率, 版本, 物品)
+        self._stale = 0          # 堆中已作废的条目数
+        self._version = 0
+        self._lock = threading.Lock()
+        self.stats = {'updates': 0, 'queries': 0, 'expired_quotes': 0, 'compactions': 0}
+
+    def load(self):
+        """用数据库中 max_age 内的价格初始化价格簿"""
+        since = int(time.time()) - self.max_age
+        rows = [(name, None, ts, source, price, volume)
+                for name, ts, source, price, volume in self.storage.iter_rows(since=since)]
+        self.update(rows)
+        return len(self._book)
+
+    def update(self, rows, now=None):
+        """写入管道的回调：rows 为 (物品, 物品ID, 时间, 数据源, 价格, 成交量)"""
+        now = now or time.time()
+        changed = set()
+        with self._lock:
+            for name, _, ts, source, price, _ in rows:
+                if not price or price <= 0:
+                    continue
+                book = self._book.setdefault(name, {})
+                current = book.get(source)
+                if current is None or ts >= current[1]:
+                    book[source] = (price, ts)
+                    changed.add(name)
+            for name in changed:
+                self._reprice(name, now)
+            self.stats['updates'] += len(changed)
+            self._maybe_compact()
+
+    def _reprice(self, name, now):
+        """丢弃过期的价格后重新计算一个物品的搬砖机会，旧的堆条目随之作废"""
+        if self._opportunities.pop(name, None) is not None:
+            self._stale += 1
+        prices = self._book[name]
+        for source in [source for source, (_, ts) in prices.items() if now - ts > self.max_age]:
+            del prices[source]
+            self.stats['expired_quotes'] += 1
+        if not prices:
+            del self._book[name]
+            return
+        if len(prices) < 2:
+            return
+        buy_source = min(prices, key=lambda source: prices[source][0])
+        buy_price, buy_ts = prices[buy_source]
+        best = None
+        for source, (price, ts) in prices.items():
+            if source == buy_source:
+                continue
+            net = price * (1 - self.sell_fees.get(source, 0.0))
+            if best is None or net > best[0]:
+                best = (net, source, price, ts)
+        sell_net, sell_source, sell_price, sell_ts = best
+        if sell_net <= buy_price:
+            return
+
+        self._version += 1
+        opportunity = Opportunity(name, buy_source, buy_price, sell_source, sell_price, sell_net,
+                                  min(buy_ts, sell_ts), self._version)
+        self._opportunities[name] = opportunity
+        heapq.heappush(self._heap, (-opportunity.gap_pct, opportunity.version, name))
+
+    def _maybe_compact(self):
+        if self._stale > self.compact_threshold and self._stale > len(self._opportunities):
+            self._compact()
+
+    def _compact(self):
+        """丢弃已作废的条目，重建堆"""
+        self._heap = [(-o.gap_pct, o.version, name) for name, o in self._opportunities.items()]
+        heapq.heapify(self._heap)
+        self._stale = 0
+        self.stats['compactions'] += 1
+
+    def top(self, limit=20, min_price=0.0, min_gap_pct=0.0, now=None):
+        """利润率最高的 limit 个搬砖机会，跳过低于 min_price 的物品；含过期价格的机会先重新计算"""
+        now = now or time.time()
+        results, kept = [], []
+        with self._lock:
+            self.stats['queries'] += 1
+            while self._heap and len(results) < limit:
+                entry = heapq.heappop(self._heap)
+                neg_pct, version, name = entry
+                opportunity = self._opportunities.get(name)
+                if opportunity is None or opportunity.version != version:
+                    self._stale -= 1
+                    continue    # 已作废
+                if now - opportunity.ts > self.max_age:
+                    # 用未过期的价格重新计算，新的条目（如果还有机会）按新的利润率放回堆中
+                    self._reprice(name, now)
+                    self._stale -= 1
+                    continue
+                kept.append(entry)
+                if -neg_pct < min_gap_pct:
+                    break       # 后面的利润率更低
+                if opportunity.buy_price >= min_price:
+                    results.append(opportunity.to_dict(now))
+            # 仍然有效的条目放回堆中
+            for entry in kept:
+                heapq.heappush(self._heap, entry)
+            self._maybe_compact()
+        # 重新计算的机会可能排在已取出的条目之前
+        results.sort(key=lambda result: -result['gap_pct'])
+        return results
+
+    def get(self, name, now=None):
+        """一个物品在价格簿中未过期的各数据源价格和当前的搬砖机会"""
+        now = now or time.time()
+        with self._lock:
+            if name not in self._book:
+                return None
+            if any(now - ts > self.max_age for _, ts in self._book[name].values()):
+                self._reprice(name, now)
+            prices = self._book.get(name)
+            if prices is None:
+                return None
+            opportunity = self._opportunities.get(name)
+            return {
+                'item_name': name,
+                'sources': {source: {'price': price, 'ts': ts} for source, (price, ts) in prices.items()},
+                'opportunity': opportunity.to_dict(now) if opportunity else None
+            }
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, items=len(self._book), opportunities=len(self._opportunities),
+                        heap_size=len(self._heap), stale_entries=self._stale)
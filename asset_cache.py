@@ -0,0 +1,195 @@
+# 静态资源内存缓存（只依赖标准库，brotli 可选）
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+
+import http_cache
+
+# 超过这个大小的文件不放进内存，直接用 sendfile 零拷贝发送
+SENDFILE_THRESHOLD = 256 * 1024
+
+# 压缩后至少要小这么多才保留压缩版本
+MIN_COMPRESSION_RATIO = 0.9
+
+_STATIC_URL = re.compile(rb"\{\{\s*url_for\('static',\s*filename='([^']+)'\)\s*\}\}")
+
+
+class Asset:
+    """一个静态资源：原始内容、预压缩版本和缓存相关的元数据"""
+
+    def __init__(self, name, path, content_type, mtime, size, body=None, variants=None):
+        self.name = name
+        self.path = path
+        self.content_type = content_type
+        self.mtime = mtime
+        self.size = size
+        self.file_key = (mtime, size)     # 加载时源文件的 (修改时间, 大小)，用于判断文件是否变化
+        self.body = body                  # None 表示大文件，发送时从磁盘 sendfile
+        self.variants = variants or {}    # 编码 -> 压缩后的内容
+        self.etag = None
+        self.version = None
+
+    def select(self, accept_encoding):
+        """按 Accept-Encoding 选择要发送的版本，返回 (编码, 内容, ETag)"""
+        if self.variants:
+            encoding = http_cache.choose_encoding(accept_encoding)
+            if encoding in self.variants:
+                return encoding, self.variants[encoding], http_cache.encoded_etag(self.etag, encoding)
+        return None, self.body, self.etag
+
+
+def _content_type(path):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+class AssetCache:
+    """启动时把静态资源读进内存并预先压缩
+
+    每隔 check_interval 秒最多检查一次文件修改时间和大小，有变化时重新加载；任何资源变化后，
+    带 transform 的资源（例如把静态地址换成带哈希版本号的首页）也会重新生成。
+    大文件发送前用 open() 确认打开的文件与缓存的 ETag 一致。
+    """
+
+    def __init__(self, check_interval=1.0, sendfile_threshold=SENDFILE_THRESHOLD):
+        self.check_interval = check_interval
+        self.sendfile_threshold = sendfile_threshold
+        self._sources = {}    # 名称 -> (路径, transform)
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def add_directory(self, root, prefix=''):
+        """加载目录下的所有文件，名称为 prefix + 相对路径"""
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = prefix + os.path.relpath(path, root).replace(os.sep, '/')
+                self.add_file(name, path)
+
+    def add_file(self, name, path, transform=None):
+        """加载单个文件；transform(bytes) -> bytes 在缓存前处理内容"""
+        self._sources[name] = (path, transform)
+        self._assets[name] = self._load(name, path, transform)
+
+    def _load(self, name, path, transform):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        asset = Asset(name, path, _content_type(path), stat.st_mtime_ns, stat.st_size)
+
+        if stat.st_size > self.sendfile_threshold and transform is None:
+            # 大文件只算哈希，不常驻内存
+            digest = hashlib.blake2b(digest_size=12)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        else:
+            with open(path, 'rb') as f:
+                body = f.read()
+            if transform:
+                body = transform(body)
+            asset.body = body
+            asset.size = len(body)
+            digest = hashlib.blake2b(body, digest_size=12)
+            if http_cache.is_compressible(asset.content_type) and len(body) >= http_cache.MIN_COMPRESS_SIZE:
+                asset.variants = self._compress(body)
+
+        asset.etag = '"' + digest.hexdigest() + '"'
+        asset.version = digest.hexdigest()[:12]
+        return asset
+
+    def _compress(self, body):
+        variants = {'gzip': gzip.compress(body, compresslevel=9)}
+        if http_cache.brotli is not None:
+            variants['br'] = http_cache.brotli.compress(body, quality=11)
+        return {encoding: data for encoding, data in variants.items()
+                if len(data) < len(body) * MIN_COMPRESSION_RATIO}
+
+    def refresh(self, force=False):
+        """检查文件修改时间，重新加载变化的资源"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if not force and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            changed = False
+            for name, (path, transform) in self._sources.items():
+                asset = self._assets.get(name)
+                if transform is None and (asset.file_key if asset else None) != self._file_key(path):
+                    self._assets[name] = self._load(name, path, None)
+                    changed = True
+            # 其他资源的版本号变化后，依赖它们的资源也要重新生成
+            for name, (path, transform) in self._sources.items():
+                asset = self._assets.get(name)
+                if transform is not None and (changed or (asset.file_key if asset else None) != self._file_key(path)):
+                    self._assets[name] = self._load(name, path, transform)
+
+    def _file_key(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def open(self, asset, attempts=3):
+        """打开要 sendfile 的大文件，返回 (资源, 文件)
+
+        文件在缓存之后被修改时先重新加载，保证发送的内容和返回的 ETag 一致；
+        重新加载后变成小文件时返回 (资源, None)，改用内存中的内容，文件被删除时返回 (None, None)。
+        用 os.replace 原子替换的文件，已经打开的文件描述符仍指向旧内容，与 ETag 一致。
+        """
+        for _ in range(attempts):
+            if asset is None or asset.body is not None:
+                return asset, None
+            try:
+                f = open(asset.path, 'rb')
+            except OSError:
+                f = None
+            if f is not None:
+                stat = os.fstat(f.fileno())
+                if (stat.st_mtime_ns, stat.st_size) == asset.file_key:
+                    return asset, f
+                f.close()
+            self.refresh(force=True)
+            asset = self._assets.get(asset.name)
+        raise OSError(f"文件在发送前一直在变化: {asset.path if asset else ''}")
+
+    def get(self, name):
+        self.refresh()
+        return self._assets.get(name)
+
+    def version(self, name):
+        asset = self.get(name)
+        return asset.version if asset else None
+
+    def url(self, name):
+        version = self.version(name)
+        return f"/{name}?v={version}" if version else f"/{name}"
+
+    def render_static_urls(self, html):
+        """把模板里的 url_for('static', filename=...) 替换成带版本号的地址（用作首页的 transform）"""
+        def replace(match):
+            name = 'static/' + match.group(1).decode('utf-8')
+            # 在 refresh 内部调用，直接读取已加载的资源，不能再触发 refresh
+            asset = self._assets.get(name)
+            url = f"/{name}?v={asset.version}" if asset else f"/{name}"
+            return url.encode('utf-8')
+        return _STATIC_URL.sub(replace, html)
+
+    def stats(self):
+        assets = [asset for asset in self._assets.values() if asset]
+        return {
+            'assets': len(assets),
+            'memory_bytes': sum(len(asset.body or b'') + sum(map(len, asset.variants.values())) for asset in assets),
+            'sendfile_assets': sum(1 for asset in assets if asset.body is None)
+        }
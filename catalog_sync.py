@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+物品目录同步
+按名称顺序分页拉取 Steam 市场的全部 CS:GO 物品，写入 items 表（名称、显示名称、图标），
+并加入搜索索引。搜索接口因此只查本地索引，不再每次输入都请求 Steam。
+
+请求走 Steam 爬虫的限流和熔断，与后台价格刷新共用请求预算。每页写入后把进度保存到
+sync_state 表，中途失败或服务重启后都从断点继续。第一轮同步完成前目录不完整，
+搜索接口在本地没有结果时会临时实时搜索 Steam。
+
+使用方法：
+    python3 catalog_sync.py                  # 同步完整目录
+    python3 catalog_sync.py --max-pages 5    # 只同步前5页
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogueSync:
+    """分页同步物品目录到存储和搜索索引"""
+    STATE_NAME = 'steam_catalogue'
+
+    def __init__(self, crawler, storage, search_index=None, page_size=100):
+        self.crawler = crawler
+        self.storage = storage
+        self.search_index = search_index
+        self.page_size = page_size
+
+        self._cursor = None           # 第一次使用时从 sync_state 表读取
+        self._completed_at = None     # 上一次完整同步的结束时间
+        self._next_check = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def _load_state(self):
+        if self._cursor is None:
+            state = self.storage.get_sync_state(self.STATE_NAME) or {}
+            self._cursor = state.get('cursor') or 0
+            self._completed_at = state.get('completed_at')
+
+    def completed(self):
+        """目录是否已经完整同步过至少一轮（包括其他进程完成的同步，未完成时最多每分钟重新读取一次）"""
+        if self._completed_at is None and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + 60
+            state = self.storage.get_sync_state(self.STATE_NAME)
+            if state and state['completed_at']:
+                self._completed_at = state['completed_at']
+        return self._completed_at is not None
+
+    def run(self, max_pages=None):
+        """从上次的进度开始同步，返回本次的统计信息"""
+        with self._lock:
+            self._load_state()
+            start_time = time.perf_counter()
+            result = {'pages': 0, 'items': 0, 'new_items': 0, 'complete': False, 'error': None}
+            while not self._stop.is_set() and (max_pages is None or result['pages'] < max_pages):
+                page = self.crawler.search_page('', self._cursor, self.page_size,
+                                                sort_column='name', sort_dir='asc')
+                if page is None:
+                    result['error'] = f"获取第 {self._cursor} 条开始的目录失败"
+                    break
+
+                items, total = page
+                if items:
+                    self.storage.upsert_items(items)
+                    if self.search_index is not None:
+                        result['new_items'] += self.search_index.add(item['name'] for item in items)
+                result['pages'] += 1
+                result['items'] += len(items)
+                self._cursor += len(items)
+
+                if not items or self._cursor >= total:
+                    # 一轮同步完成，下一轮从头开始
+                    result['complete'] = True
+                    self._cursor = 0
+                    self._completed_at = time.time()
+                    self.storage.save_sync_state(self.STATE_NAME, self._cursor, self._completed_at)
+                    break
+                self.storage.save_sync_state(self.STATE_NAME, self._cursor)
+
+            result.update({
+                'cursor': self._cursor,
+                'seconds': round(time.perf_counter() - start_time, 2),
+                'finished_at': time.time()
+            })
+            self.last_run = result
+
+        logger.info(f"物品目录同步: {result['pages']} 页, {result['items']} 个物品 "
+                    f"(新增 {result['new_items']}), {'完成' if result['complete'] else '未完成'}")
+        return result
+
+    def status(self):
+        return {'cursor': self._cursor, 'completed': self.completed(), 'completed_at': self._completed_at,
+                'last_run': self.last_run}
+
+    def start(self, interval=24 * 3600, retry_interval=600):
+        """启动后台线程：启动时同步一次，之后每隔 interval 秒一次；未完成时 retry_interval 秒后继续"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval, retry_interval),
+                                        name='catalogue-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self, interval, retry_interval):
+        from crawlers import background_requests
+        while not self._stop.is_set():
+            try:
+                with background_requests():
+                    complete = self.run()['complete']
+            except Exception as e:
+                logger.error(f"物品目录同步失败: {e}")
+                complete = False
+            self._stop.wait(interval if complete else retry_interval)
+
+
+def main():
+    from crawlers import multi_crawler
+    from db import db_pool
+    from storage import SQLiteStorage
+
+    parser = argparse.ArgumentParser(description='同步 Steam 市场物品目录')
+    parser.add_argument('--max-pages', type=int, help='最多同步的页数')
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    storage = SQLiteStorage(db_pool)
+    storage.init()
+    sync = CatalogueSync(multi_crawler.crawlers['steam'], storage, page_size=args.page_size)
+    print(sync.run(args.max_pages))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# 数据源熔断器
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+    pass
+
+
+class CircuitBreaker:
+    """单个数据源的熔断器
+
+    在滚动时间窗口内统计请求的错误率和慢请求比例：
+    - closed: 正常放行，超过阈值后转为 open
+    - open: 直接拒绝请求，冷却时间过后转为 half_open
+    - half_open: 只放行一个探测请求，成功则恢复 closed，失败则重新 open
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, window_seconds=60, min_requests=4, error_threshold=0.5,
+                 slow_call_seconds=5.0, slow_call_threshold=0.8, open_seconds=30):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (时间戳, 是否成功, 耗时)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._last_error = None
+        self._open_count = 0
+
+    def _prune(self, now):
+        """移除窗口之外的请求记录"""
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def is_available(self):
+        """是否值得发起请求（不占用半开状态的探测名额）"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.OPEN:
+                return False
+            if state == self.HALF_OPEN:
+                return not self._probe_in_flight
+            return True
+
+    def allow_request(self):
+        """申请发起一次请求，半开状态下只允许一个探测请求"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self, latency):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                # 探测成功，恢复正常并清空历史
+                self._state = self.CLOSED
+                self._probe_in_flight = False
+                self._calls.clear()
+            self._calls.append((now, True, latency))
+            self._prune(now)
+            self._evaluate(now)
+
+    def record_failure(self, latency, error=None):
+        with self._lock:
+            now = time.monotonic()
+            self._last_error = str(error) if error else None
+            if self._state == self.HALF_OPEN:
+                # 探测失败，重新打开
+                self._trip(now)
+                return
+            self._calls.append((now, False, latency))
+            self._prune(now)
+            self._evaluate(now)
+
+    def _evaluate(self, now):
+        if self._state != self.CLOSED or len(self._calls) < self.min_requests:
+            return
+        total = len(self._calls)
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow = sum(1 for _, _, latency in self._calls if latency >= self.slow_call_seconds)
+        if failures / total >= self.error_threshold or slow / total >= self.slow_call_threshold:
+            self._trip(now)
+
+    def _trip(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        self._open_count += 1
+
+    def snapshot(self):
+        """返回当前健康状况"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            state = self._current_state(now)
+            total = len(self._calls)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            latencies = sorted(latency for _, _, latency in self._calls)
+
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+
+            return {
+                'source': self.name,
+                'state': state,
+                'window_seconds': self.window_seconds,
+                'requests': total,
+                'failures': failures,
+                'error_rate': round(failures / total, 3) if total else 0.0,
+                'avg_latency_ms': round(sum(latencies) / total * 1000, 1) if total else None,
+                'p95_latency_ms': round(latencies[int(0.95 * (total - 1))] * 1000, 1) if total else None,
+                'retry_in_seconds': retry_in,
+                'times_opened': self._open_count,
+                'last_error': self._last_error
+            }
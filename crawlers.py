@@ -1,29 +1,126 @@
 # CS:GO 皮肤价格爬虫系统
 import requests
+import contextlib
+import contextvars
 import json
+import os
+import random
 import time
-from datetime import datetime
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
+import metrics
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from rate_limiter import TokenBucket, RateLimitedError
+from pricing import PriceRecord
+from snapshot import archive_from_env
+
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 上游市场地址，压测时可以指向本地的 fake_market.py
+STEAM_URL = os.environ.get('CSGO_STEAM_URL', 'https://steamcommunity.com')
+CSMONEY_URL = os.environ.get('CSGO_CSMONEY_URL', 'https://cs.money')
+
+# 各数据源的请求预算：(每秒请求数, 突发请求数)，实时查询和后台刷新共用
+SOURCE_RATE_LIMITS = {
+    'steam': (0.3, 5),
+    'buff': (2.0, 10),
+    'csmoney': (1.0, 5),
+    'bitskins': (2.0, 10)
+}
+# 压测时放大请求预算
+RATE_LIMIT_SCALE = float(os.environ.get('CSGO_RATE_LIMIT_SCALE', '1'))
+
+# 实时查询最多等待请求额度和上游响应的秒数，拿不到额度时跳过该数据源
+FOREGROUND_ACQUIRE_TIMEOUT = 1.0
+FOREGROUND_TIMEOUT = 5
+# 每个数据源的突发额度中预留给实时查询的比例，后台刷新和目录同步不会用掉这部分
+FOREGROUND_RESERVE = 0.4
+
+# 当前请求是否来自后台任务（后台刷新、目录同步），随 get_all_prices 传到抓取线程
+_background = contextvars.ContextVar('background_requests', default=False)
+
+
+@contextlib.contextmanager
+def background_requests():
+    """在这个范围内发起的上游请求按后台任务限流：可以等待更久，但不占用预留给实时查询的额度"""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
 class PriceCrawler:
     """价格爬虫基类"""
+    timeout = 15
+
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # 由 MultiSourceCrawler 注入，单独使用爬虫时不做熔断和限流
+        self.breaker = None
+        self.rate_limiter = None
+        # 响应快照归档（record/replay 模式），默认关闭
+        self.archive = None
+
+    def _get(self, url, params):
+        """发起上游请求，并把结果计入熔断器"""
+        if self.archive and self.archive.mode == 'replay':
+            # 回放模式不访问网络，也不受限流和熔断影响
+            return self.archive.replay(url, params)
+
+        # 先拿请求额度，避免半开状态的探测名额被限流等待占住
+        background = _background.get()
+        if self.rate_limiter:
+            if background:
+                acquired = self.rate_limiter.acquire(timeout=self.timeout,
+                                                     reserve=self.rate_limiter.capacity * FOREGROUND_RESERVE)
+            else:
+                acquired = self.rate_limiter.acquire(timeout=FOREGROUND_ACQUIRE_TIMEOUT)
+            if not acquired:
+                raise RateLimitedError("请求额度不足，跳过请求")
+
+        if self.breaker and not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.breaker.name} 熔断中，跳过请求")
+
+        start = time.monotonic()
+        try:
+            timeout = self.timeout if background else min(self.timeout, FOREGROUND_TIMEOUT)
+            response = self.session.get(url, params=params, timeout=timeout)
+        except Exception as e:
+            if self.breaker:
+                self.breaker.record_failure(time.monotonic() - start, e)
+            raise
+
+        if self.breaker:
+            latency = time.monotonic() - start
+            # 限流和服务端错误视为数据源故障，404等视为正常响应
+            if response.status_code == 429 or response.status_code >= 500:
+                self.breaker.record_failure(latency, f"HTTP {response.status_code}")
+            else:
+                self.breaker.record_success(latency)
+
+        if self.archive:
+            self.archive.record(url, params, response, time.monotonic() - start)
+        return response
+
+    def _demo_random(self, item_name):
+        """演示数据源使用的随机数；录制和回放时按 (数据源, 物品, 第几次请求) 播种，回放结果与录制时一致"""
+        if self.archive is None:
+            return random
+        seq = self.archive.next_demo_seq(type(self).__name__, item_name)
+        return random.Random(f'{type(self).__name__}:{item_name}:{seq}')
 
 class SteamMarketCrawler(PriceCrawler):
     """Steam市场价格爬虫"""
     def __init__(self):
         super().__init__()
-        self.base_url = "https://steamcommunity.com/market/priceoverview/"
-        self.search_url = "https://steamcommunity.com/market/search/render/"
+        self.base_url = f"{STEAM_URL}/market/priceoverview/"
+        self.search_url = f"{STEAM_URL}/market/search/render/"
     
     def get_item_price(self, market_hash_name):
         """获取Steam市场价格"""
@@ -34,36 +131,35 @@ class SteamMarketCrawler(PriceCrawler):
         }
         
         try:
-            response = self.session.get(self.base_url, params=params, timeout=15)
+            response = self._get(self.base_url, params)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
-                    return {
-                        'source': 'Steam',
-                        'lowest_price': data.get('lowest_price'),
-                        'median_price': data.get('median_price'),
-                        'volume': data.get('volume'),
-                        'timestamp': datetime.now().isoformat()
-                    }
+                    # currency=1 请求的是美元价格
+                    return PriceRecord.from_strings('Steam', data.get('lowest_price'),
+                                                    data.get('median_price'), data.get('volume'),
+                                                    default_currency='USD')
         except Exception as e:
             logger.error(f"Steam价格获取失败 {market_hash_name}: {e}")
         
         return None
     
-    def search_items(self, query, limit=20):
-        """搜索Steam市场物品"""
+    def search_page(self, query='', start=0, count=100, sort_column='popular', sort_dir=None):
+        """获取一页搜索结果，返回 (物品列表, 结果总数)，失败时返回 None"""
         params = {
             'appid': 730,
             'query': query,
-            'start': 0,
-            'count': limit,
+            'start': start,
+            'count': count,
             'search_descriptions': 0,
-            'sort_column': 'popular',
+            'sort_column': sort_column,
             'norender': 1
         }
+        if sort_dir:
+            params['sort_dir'] = sort_dir
         
         try:
-            response = self.session.get(self.search_url, params=params, timeout=15)
+            response = self._get(self.search_url, params)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
@@ -76,11 +172,16 @@ class SteamMarketCrawler(PriceCrawler):
                             'price': item.get('sell_price_text'),
                             'source': 'Steam'
                         })
-                    return items
+                    return items, data.get('total_count', len(items))
         except Exception as e:
             logger.error(f"Steam搜索失败: {e}")
         
-        return []
+        return None
+    
+    def search_items(self, query, limit=20):
+        """搜索Steam市场物品"""
+        page = self.search_page(query, 0, limit)
+        return page[0] if page else []
 
 class BuffMarketCrawler(PriceCrawler):
     """Buff市场价格爬虫（模拟，因为需要特殊认证）"""
@@ -93,17 +194,14 @@ class BuffMarketCrawler(PriceCrawler):
         # 注意：实际使用需要Buff API认证
         try:
             # 这里是模拟数据，实际应用需要真实API
-            import random
+            rng = self._demo_random(item_name)
             
-            # 模拟价格数据
-            base_price = random.uniform(10, 500)
-            return {
-                'source': 'Buff163',
-                'lowest_price': f"¥{base_price:.2f}",
-                'median_price': f"¥{base_price * 1.1:.2f}",
-                'volume': str(random.randint(50, 500)),
-                'timestamp': datetime.now().isoformat()
-            }
+            # 模拟价格数据（人民币，单位：分）
+            base_price = rng.randint(1000, 50000)
+            return PriceRecord('Buff163', 'CNY',
+                               lowest=base_price,
+                               median=int(base_price * 1.1),
+                               volume=rng.randint(50, 500))
         except Exception as e:
             logger.error(f"Buff价格获取失败: {e}")
         
@@ -113,7 +211,7 @@ class CSMoneyAPI(PriceCrawler):
     """CS.Money API 爬虫"""
     def __init__(self):
         super().__init__()
-        self.base_url = "https://cs.money/1.0/market/sell-orders"
+        self.base_url = f"{CSMONEY_URL}/1.0/market/sell-orders"
     
     def get_item_price(self, item_name):
         """获取CS.Money价格"""
@@ -123,20 +221,17 @@ class CSMoneyAPI(PriceCrawler):
                 'name': item_name
             }
             
-            response = self.session.get(self.base_url, params=params, timeout=15)
+            response = self._get(self.base_url, params)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('items'):
                     item = data['items'][0]
-                    price = item.get('price', 0) / 100  # 价格通常以分为单位
+                    price = int(round(item.get('price', 0)))  # 价格以美分为单位
                     
-                    return {
-                        'source': 'CS.Money',
-                        'lowest_price': f"${price:.2f}",
-                        'median_price': f"${price * 1.05:.2f}",
-                        'volume': '1',
-                        'timestamp': datetime.now().isoformat()
-                    }
+                    return PriceRecord('CS.Money', 'USD',
+                                       lowest=price,
+                                       median=int(round(price * 1.05)),
+                                       volume=1)
         except Exception as e:
             logger.error(f"CS.Money价格获取失败: {e}")
         
@@ -152,16 +247,13 @@ class BitSkinsAPI(PriceCrawler):
         """获取BitSkins价格（演示版本）"""
         try:
             # 演示数据，实际需要API密钥
-            import random
+            rng = self._demo_random(item_name)
             
-            price = random.uniform(5, 200)
-            return {
-                'source': 'BitSkins',
-                'lowest_price': f"${price:.2f}",
-                'median_price': f"${price * 1.08:.2f}",
-                'volume': str(random.randint(20, 100)),
-                'timestamp': datetime.now().isoformat()
-            }
+            price = rng.randint(500, 20000)
+            return PriceRecord('BitSkins', 'USD',
+                               lowest=price,
+                               median=int(round(price * 1.08)),
+                               volume=rng.randint(20, 100))
         except Exception as e:
             logger.error(f"BitSkins价格获取失败: {e}")
         
@@ -169,49 +261,85 @@ class BitSkinsAPI(PriceCrawler):
 
 class MultiSourceCrawler:
     """多数据源价格聚合器"""
-    def __init__(self):
+    def __init__(self, max_workers=16):
         self.crawlers = {
             'steam': SteamMarketCrawler(),
             'buff': BuffMarketCrawler(),
             'csmoney': CSMoneyAPI(),
             'bitskins': BitSkinsAPI()
         }
+        
+        # 每个数据源一个熔断器和一个令牌桶
+        self.breakers = {}
+        self.rate_limiters = {}
+        for source_name, crawler in self.crawlers.items():
+            crawler.breaker = CircuitBreaker(source_name)
+            self.breakers[source_name] = crawler.breaker
+            rate, burst = SOURCE_RATE_LIMITS[source_name]
+            crawler.rate_limiter = TokenBucket(rate * RATE_LIMIT_SCALE, burst * RATE_LIMIT_SCALE)
+            self.rate_limiters[source_name] = crawler.rate_limiter
+        
+        # 各数据源并发查询，总耗时取决于最慢的可用数据源
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crawler')
+        
+        self.set_archive(archive_from_env())
+    
+    def set_archive(self, archive):
+        """开启或关闭响应录制/回放"""
+        self.archive = archive
+        for crawler in self.crawlers.values():
+            crawler.archive = archive
     
     def get_all_prices(self, item_name):
-        """从所有数据源获取价格"""
-        results = {}
-        
+        """从所有数据源并发获取价格，熔断中的数据源直接跳过"""
+        with metrics.span(metrics.CRAWLER):
+            return self._get_all_prices(item_name)
+
+    def _get_all_prices(self, item_name):
+        futures = {}
         for source_name, crawler in self.crawlers.items():
+            if not self.breakers[source_name].is_available():
+                logger.info(f"{source_name} 处于熔断状态，跳过")
+                continue
+            # 每个任务复制一份上下文，抓取线程中仍能区分实时查询和后台任务
+            context = contextvars.copy_context()
+            futures[source_name] = self.executor.submit(context.run, crawler.get_item_price, item_name)
+        
+        results = {}
+        for source_name, future in futures.items():
             try:
-                price_data = crawler.get_item_price(item_name)
+                price_data = future.result()
                 if price_data:
                     results[source_name] = price_data
-                
-                # 避免请求过快
-                time.sleep(0.5)
-                
             except Exception as e:
                 logger.error(f"从{source_name}获取价格失败: {e}")
         
         return results
     
+    def get_source_health(self):
+        """获取所有数据源的健康状况"""
+        health = {}
+        for source_name, breaker in self.breakers.items():
+            health[source_name] = breaker.snapshot()
+            health[source_name]['rate_limit'] = self.rate_limiters[source_name].snapshot()
+        return health
+    
+    def max_refresh_rate(self):
+        """每次刷新要请求所有数据源，因此刷新速率受最紧的数据源预算限制"""
+        return min(limiter.rate for limiter in self.rate_limiters.values())
+    
     def get_best_price(self, item_name):
-        """获取最优价格"""
+        """获取最优价格（按换算成基准货币后的最低价比较）"""
         all_prices = self.get_all_prices(item_name)
         
         if not all_prices:
             return None
         
-        # 提取数值价格进行比较
         price_comparisons = []
-        for source, data in all_prices.items():
-            try:
-                if data.get('lowest_price'):
-                    price_str = data['lowest_price'].replace('$', '').replace('¥', '').replace(',', '')
-                    price_val = float(price_str)
-                    price_comparisons.append((price_val, source, data))
-            except:
-                continue
+        for source, record in all_prices.items():
+            lowest = record.lowest_base()
+            if lowest is not None:
+                price_comparisons.append((lowest, source, record))
         
         if price_comparisons:
             # 返回最低价格的数据源
@@ -235,9 +363,8 @@ def get_market_data(item_name):
 
 def search_all_markets(query):
     """在所有市场中搜索物品"""
-    # 主要使用Steam的搜索功能
-    steam_crawler = SteamMarketCrawler()
-    return steam_crawler.search_items(query)
+    # 主要使用Steam的搜索功能（复用带熔断器的实例）
+    return multi_crawler.crawlers['steam'].search_items(query)
 
 if __name__ == "__main__":
     # 测试爬虫功能
@@ -247,6 +374,7 @@ if __name__ == "__main__":
     results = get_market_data(test_item)
     
     if results:
-        print(json.dumps(results, indent=2, ensure_ascii=False))
+        sources = {name: record.to_dict() for name, record in results['all_sources'].items()}
+        print(json.dumps(sources, indent=2, ensure_ascii=False))
     else:
         print("未找到价格数据")
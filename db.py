@@ -0,0 +1,112 @@
+# SQLite 连接池
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import metrics
+from migrations import migrate
+
+DB_PATH = os.environ.get('CSGO_DB_PATH', 'csgo_prices.db')
+
+# 迁移时等待其他进程释放写锁的秒数，其他进程可能正在执行耗时的迁移
+MIGRATE_TIMEOUT = 600
+
+# 连接级别的调优参数
+PRAGMAS = [
+    'PRAGMA synchronous = NORMAL',     # WAL 模式下只在检查点时 fsync
+    'PRAGMA cache_size = -16000',      # 16MB 页缓存
+    'PRAGMA mmap_size = 268435456',    # 256MB 内存映射读取
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+]
+
+
+class ConnectionPool:
+    """SQLite 连接池
+
+    - 连接在请求之间复用，保留各自的预编译语句缓存（cached_statements）
+    - 使用 WAL 日志模式，后台写入不会阻塞读取
+    - 同一线程内嵌套获取连接时返回同一个连接
+    """
+    def __init__(self, path=DB_PATH, max_idle=8, cached_statements=256):
+        self.path = path
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._local = threading.local()
+        self._wal_ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        with self._lock:
+            if not self._wal_ready:
+                # journal_mode 会持久化到数据库文件，只需设置一次
+                conn.execute('PRAGMA journal_mode = WAL')
+                self._wal_ready = True
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self, phase=metrics.DB_READ):
+        """借出一个连接，用完自动归还（自动提交模式）；最外层借出的时长计入 phase 阶段的耗时"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        self._local.conn = conn
+        try:
+            with metrics.span(phase):
+                yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """在一个写事务中执行，正常结束提交，异常回滚"""
+        with self.connection(metrics.DB_WRITE) as conn:
+            if conn.in_transaction:
+                # 已经处于外层事务中
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def migrate(self):
+        """执行数据库结构迁移"""
+        conn = sqlite3.connect(self.path, timeout=MIGRATE_TIMEOUT)
+        try:
+            return migrate(conn)
+        finally:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# 全局连接池
+db_pool = ConnectionPool()
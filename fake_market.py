@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+本地模拟市场服务器
+模拟Steam priceoverview / search/render 和 CS.Money sell-orders 的响应格式，
+用于在不访问真实市场的情况下对爬虫和价格服务做压力测试
+"""
+
+import argparse
+import hashlib
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+from rate_limiter import TokenBucket
+
+WEAPONS = [
+    "AK-47", "M4A4", "M4A1-S", "AWP", "Glock-18", "USP-S", "Desert Eagle", "P250",
+    "Five-SeveN", "Tec-9", "CZ75-Auto", "MP9", "MAC-10", "UMP-45", "P90", "FAMAS",
+    "Galil AR", "SG 553", "AUG", "SSG 08", "Nova", "XM1014", "MAG-7", "Negev"
+]
+
+SKINS = [
+    "Redline", "Vulcan", "Asiimov", "Bloodsport", "Howl", "Dragon King", "Neo-Noir",
+    "Dragon Lore", "Hyper Beast", "Lightning Strike", "Water Elemental", "Fade",
+    "Wasteland Rebel", "Blaze", "Code Red", "Printstream", "Kill Confirmed", "Orion",
+    "Fire Serpent", "Case Hardened", "Slate", "Phantom Disruptor", "Neon Rider",
+    "Fuel Injector", "Cyrex", "Hot Rod", "Safari Mesh", "Boreal Forest"
+]
+
+WEARS = ["Factory New", "Minimal Wear", "Field-Tested", "Well-Worn", "Battle-Scarred"]
+
+
+def build_catalogue():
+    """生成模拟物品目录（约3000个 market_hash_name）"""
+    names = []
+    for weapon in WEAPONS:
+        for skin in SKINS:
+            for wear in WEARS:
+                names.append(f"{weapon} | {skin} ({wear})")
+    return names
+
+
+def base_price_cents(name):
+    """基于名称生成稳定的基础价格（美分）"""
+    seed = int(hashlib.md5(name.encode()).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    if 'Dragon Lore' in name or 'Howl' in name:
+        return rng.randint(150000, 500000)
+    return rng.randint(20, 30000)
+
+
+class MarketConfig:
+    """模拟市场的行为配置"""
+    def __init__(self, latency_ms=80, jitter_ms=40, error_rate=0.0, rate_limit=0, price_drift=0.02):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.price_drift = price_drift
+        # rate_limit 为每秒允许的请求数，超出返回429；0表示不限制
+        self.limiter = TokenBucket(rate_limit, capacity=rate_limit) if rate_limit else None
+        self.stats = {'requests': 0, 'errors': 0, 'throttled': 0}
+        self.lock = threading.Lock()
+
+
+class FakeMarketHandler(http.server.BaseHTTPRequestHandler):
+    """模拟市场请求处理器"""
+    protocol_version = 'HTTP/1.1'
+    config = MarketConfig()
+    catalogue = build_catalogue()
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+        config = self.config
+
+        if parsed.path == '/__stats':
+            # 统计接口不受延迟和错误注入影响
+            with config.lock:
+                self.send_json(dict(config.stats))
+            return
+
+        with config.lock:
+            config.stats['requests'] += 1
+
+        if config.limiter and not config.limiter.try_acquire():
+            with config.lock:
+                config.stats['throttled'] += 1
+            # Steam限流时返回空的429响应
+            self.send_json(None, 429, {'Retry-After': '10'})
+            return
+
+        delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        time.sleep(delay)
+
+        if random.random() < config.error_rate:
+            with config.lock:
+                config.stats['errors'] += 1
+            self.send_json({'success': False}, 500)
+            return
+
+        if parsed.path == '/market/priceoverview/':
+            self.send_json(self.price_overview(params.get('market_hash_name', '')))
+        elif parsed.path == '/market/search/render/':
+            self.send_json(self.search_render(params))
+        elif parsed.path == '/1.0/market/sell-orders':
+            self.send_json(self.sell_orders(params))
+        else:
+            self.send_json({'success': False}, 404)
+
+    def current_price(self, name):
+        """在基础价格上加入随机波动"""
+        drift = 1 + random.uniform(-self.config.price_drift, self.config.price_drift)
+        return max(3, int(base_price_cents(name) * drift))
+
+    def price_overview(self, name):
+        if not name:
+            return {'success': False}
+        lowest = self.current_price(name)
+        median = int(lowest * 1.05)
+        volume = random.randint(1, 5000)
+        return {
+            'success': True,
+            'lowest_price': f"${lowest / 100:,.2f}",
+            'volume': f"{volume:,}",
+            'median_price': f"${median / 100:,.2f}"
+        }
+
+    def search_render(self, params):
+        query = params.get('query', '').lower()
+        start = int(params.get('start', 0))
+        count = min(int(params.get('count', 10)), 100)
+        matches = [name for name in self.catalogue if query in name.lower()]
+
+        results = []
+        for name in matches[start:start + count]:
+            price = self.current_price(name)
+            icon = hashlib.sha1(name.encode()).hexdigest()
+            results.append({
+                'name': name,
+                'hash_name': name,
+                'sell_listings': random.randint(1, 2000),
+                'sell_price': price,
+                'sell_price_text': f"${price / 100:,.2f}",
+                'app_icon': '',
+                'app_name': 'Counter-Strike 2',
+                'asset_description': {
+                    'appid': 730,
+                    'classid': str(int(icon[:8], 16)),
+                    'icon_url': icon,
+                    'market_hash_name': name,
+                    'market_name': name,
+                    'name': name
+                },
+                'sale_price_text': f"${price * 0.95 / 100:,.2f}"
+            })
+
+        return {
+            'success': True,
+            'start': start,
+            'pagesize': count,
+            'total_count': len(matches),
+            'searchdata': {'query': query, 'search_descriptions': False},
+            'results': results
+        }
+
+    def sell_orders(self, params):
+        name = params.get('name', '')
+        limit = int(params.get('limit', 1))
+        if name not in self.catalogue:
+            return {'items': []}
+        items = []
+        for _ in range(limit):
+            items.append({
+                'id': random.randint(10 ** 8, 10 ** 9),
+                'price': self.current_price(name),
+                'asset': {'names': {'full': name}, 'quality': 'ft'}
+            })
+        return {'items': items}
+
+    def send_json(self, data, status_code=200, headers=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_server(port=9000, config=None):
+    """启动模拟市场，返回服务器对象（在后台线程中运行）"""
+    if config:
+        FakeMarketHandler.config = config
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), FakeMarketHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟市场服务器')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency-ms', type=float, default=80, help='平均响应延迟')
+    parser.add_argument('--jitter-ms', type=float, default=40, help='延迟抖动（标准差）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的概率')
+    parser.add_argument('--rate-limit', type=float, default=0, help='每秒允许的请求数，超出返回429')
+    args = parser.parse_args()
+
+    config = MarketConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit)
+    server = run_server(args.port, config)
+    print(f"🧪 模拟市场运行在 http://127.0.0.1:{args.port}")
+    print(f"   CSGO_STEAM_URL=http://127.0.0.1:{args.port} CSGO_CSMONEY_URL=http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n🛑 模拟市场已停止")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# HTTP 响应压缩、ETag 条件请求和静态文件缓存（只依赖标准库，brotli 可选）
+import gzip
+import hashlib
+import json
+import os
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小于这个大小的响应压缩收益不大
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/x-ndjson',
+                      'image/svg+xml')
+
+# 带内容哈希的静态文件地址可以永久缓存
+STATIC_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# API 响应每次都要向服务端验证（配合 ETag 返回 304）
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+def dumps(data):
+    """紧凑 JSON，中文不转义"""
+    with metrics.span(metrics.JSON_ENCODE):
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def make_etag(body):
+    """根据响应内容生成强 ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 是否命中（GET 请求按弱比较，忽略 W/ 前缀）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return etag.removeprefix('W/') in tags
+
+
+def choose_encoding(accept_encoding):
+    """按 Accept-Encoding 和 q 值选择压缩方式，优先 brotli"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    def allowed(name):
+        return accepted.get(name, accepted.get('*', 0)) > 0
+
+    if brotli is not None and allowed('br'):
+        return 'br'
+    if allowed('gzip'):
+        return 'gzip'
+    return None
+
+
+def is_compressible(content_type):
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def encoded_etag(etag, encoding):
+    """压缩后的表示使用不同的强 ETag"""
+    return etag[:-1] + '-' + encoding + '"' if encoding else etag
+
+
+def prepare(body, content_type, headers, cache_control=REVALIDATE_CACHE_CONTROL, etag=None):
+    """根据请求头处理条件请求和压缩
+
+    headers 为请求头（支持 .get）。返回 (状态码, 响应头列表, 响应体)，命中 If-None-Match 时返回 304。
+    响应头不含 Content-Type，由调用方设置。
+    """
+    encoding = None
+    if len(body) >= MIN_COMPRESS_SIZE and is_compressible(content_type):
+        encoding = choose_encoding(headers.get('Accept-Encoding'))
+
+    etag = encoded_etag(etag or make_etag(body), encoding)
+    response_headers = [('ETag', etag), ('Cache-Control', cache_control), ('Vary', 'Accept-Encoding')]
+    if etag_matches(headers.get('If-None-Match'), etag):
+        return 304, response_headers, b''
+
+    if encoding:
+        body = compress(body, encoding)
+        response_headers.append(('Content-Encoding', encoding))
+    return 200, response_headers, body
+
+
+class StaticVersions:
+    """静态文件的内容哈希（按修改时间缓存），用于生成 ?v=<哈希> 的缓存地址"""
+
+    def __init__(self, root):
+        self.root = root
+        self._versions = {}
+
+    def version(self, filename):
+        path = os.path.join(self.root, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._versions.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            version = hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+        self._versions[filename] = (mtime, version)
+        return version
+
+
+def init_app(app):
+    """给 Flask 应用加上紧凑 JSON、ETag/304、压缩和静态文件版本号"""
+    from flask import request
+
+    app.json.compact = True
+    app.json.ensure_ascii = False
+    versions = StaticVersions(app.static_folder)
+
+    @app.url_defaults
+    def add_static_version(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = versions.version(values['filename'])
+            if version:
+                values['v'] = version
+
+    @app.after_request
+    def cache_and_compress(response):
+        if request.method != 'GET' or response.status_code != 200:
+            return response
+
+        # 应用和蓝图（如合并部署时的 /xiangqi/static）的静态文件
+        is_static = request.endpoint == 'static' or (request.endpoint or '').endswith('.static')
+        if is_static:
+            response.headers['Cache-Control'] = STATIC_CACHE_CONTROL if request.args.get('v') else REVALIDATE_CACHE_CONTROL
+        elif response.is_streamed and not response.direct_passthrough:
+            # 生成器产生的流式响应（NDJSON、SSE）不缓存也不整体压缩
+            return response
+        elif not response.headers.get('Cache-Control'):
+            response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+        # send_file 的响应默认直接透传文件，读出来才能压缩
+        response.direct_passthrough = False
+
+        status, headers, body = prepare(response.get_data(), response.mimetype, request.headers,
+                                        cache_control=response.headers['Cache-Control'])
+        response.status_code = status
+        for name, value in headers:
+            if name == 'Vary':
+                # 保留 CORS 等已经设置的 Vary
+                response.vary.add(value)
+            else:
+                response.headers[name] = value
+        response.set_data(body)
+        if 'Content-Encoding' in response.headers:
+            # 压缩后的内容不再支持按字节范围请求
+            response.headers.pop('Accept-Ranges', None)
+        if status == 304:
+            for name in ('Content-Type', 'Content-Length', 'Last-Modified'):
+                response.headers.pop(name, None)
+        return response
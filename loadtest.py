@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+价格服务压力测试
+并发请求 /api/price 和 /api/search，统计吞吐量和延迟分位数
+
+使用方法：
+    python3 fake_market.py --latency-ms 80 --rate-limit 200
+    CSGO_STEAM_URL=http://127.0.0.1:9000 CSGO_CSMONEY_URL=http://127.0.0.1:9000 \\
+        CSGO_RATE_LIMIT_SCALE=1000 python3 app.py
+    python3 loadtest.py --base-url http://localhost:5000 --concurrency 16 --duration 30
+"""
+
+import argparse
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+from fake_market import build_catalogue
+
+
+def percentile(sorted_values, pct):
+    """已排序数据的分位数（最近秩法）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadTest:
+    """压测执行器"""
+    def __init__(self, base_url, concurrency=8, duration=30, search_ratio=0.3, items=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.duration = duration
+        self.search_ratio = search_ratio
+        self.items = items or build_catalogue()
+        self.timeout = timeout
+
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def next_request(self, rng):
+        """按比例随机生成搜索或价格请求"""
+        item = rng.choice(self.items)
+        if rng.random() < self.search_ratio:
+            # 模拟输入过程中的前缀查询
+            query = item[:rng.randint(3, max(3, len(item) // 2))]
+            return 'search', f"{self.base_url}/api/search?q={urllib.parse.quote(query)}"
+        return 'price', f"{self.base_url}/api/price/{urllib.parse.quote(item)}"
+
+    def worker(self, deadline, seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            endpoint, url = self.next_request(rng)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                    response.read()
+                    status = response.getcode()
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+
+            with self.lock:
+                self.latencies[endpoint].append(elapsed)
+                self.statuses[endpoint][status] += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        threads = [threading.Thread(target=self.worker, args=(deadline, n), daemon=True)
+                   for n in range(self.concurrency)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed):
+        """汇总每个端点的吞吐量和延迟分位数（毫秒）"""
+        result = {'elapsed_seconds': round(elapsed, 2), 'concurrency': self.concurrency, 'endpoints': {}}
+        total = 0
+        for endpoint, values in self.latencies.items():
+            values = sorted(values)
+            total += len(values)
+            result['endpoints'][endpoint] = {
+                'requests': len(values),
+                'throughput_rps': round(len(values) / elapsed, 2),
+                'p50_ms': round(percentile(values, 50) * 1000, 1),
+                'p90_ms': round(percentile(values, 90) * 1000, 1),
+                'p95_ms': round(percentile(values, 95) * 1000, 1),
+                'p99_ms': round(percentile(values, 99) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1),
+                'status': {str(k): v for k, v in self.statuses[endpoint].items()}
+            }
+        result['total_requests'] = total
+        result['throughput_rps'] = round(total / elapsed, 2) if elapsed else 0.0
+        return result
+
+
+def print_report(result):
+    print(f"⏱️  用时 {result['elapsed_seconds']}s, 并发 {result['concurrency']}, "
+          f"总请求 {result['total_requests']}, 吞吐量 {result['throughput_rps']} req/s")
+    print(f"{'端点':<8}{'请求数':>8}{'req/s':>10}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}  状态码")
+    for endpoint, stats in result['endpoints'].items():
+        print(f"{endpoint:<8}{stats['requests']:>8}{stats['throughput_rps']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p90_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}  {stats['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='价格服务压力测试')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='持续时间（秒）')
+    parser.add_argument('--search-ratio', type=float, default=0.3, help='搜索请求所占比例')
+    parser.add_argument('--items', type=int, default=0, help='只使用目录中的前N个物品，0表示全部')
+    args = parser.parse_args()
+
+    items = build_catalogue()
+    if args.items:
+        items = items[:args.items]
+
+    print(f"🚀 压测 {args.base_url} ...")
+    test = LoadTest(args.base_url, args.concurrency, args.duration, args.search_ratio, items)
+    print_report(test.run())
+
+
+if __name__ == '__main__':
+    main()
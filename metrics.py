@@ -0,0 +1,324 @@
+# 请求耗时指标和慢请求采样（只依赖标准库，Flask 应用和零依赖的 simple_server 共用）
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+
+# 直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prometheus 文本格式
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 常用的阶段名称
+CRAWLER = 'crawler'
+DB_READ = 'db_read'
+DB_WRITE = 'db_write'
+JSON_ENCODE = 'json_encode'
+
+
+class Histogram:
+    """累计分桶计数、总和与次数"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """(le, 累计次数)，最后一项为 +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield _format_value(bound), total
+        yield '+Inf', self.count
+
+
+class RequestContext:
+    """一个请求的计时信息：开始时间、各阶段累计耗时和采样到的调用栈"""
+    __slots__ = ('endpoint', 'method', 'started', 'thread_id', 'phases', 'samples', 'ended')
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.perf_counter()
+        self.thread_id = threading.get_ident()
+        self.phases = collections.defaultdict(float)
+        self.samples = collections.Counter()
+        self.ended = False
+
+
+class SlowRequestProfiler:
+    """慢请求采样分析器
+
+    后台线程每隔 interval 秒用 sys._current_frames() 采样正在处理请求的线程的调用栈，
+    请求结束时如果耗时超过 threshold，就把采样结果按火焰图的折叠格式（每行 "栈;帧 次数"）
+    连同各阶段耗时写到 directory 下，用 flamegraph.pl 或 speedscope 查看。
+    不影响请求线程本身，开销只和采样频率、并发请求数有关。
+    """
+    def __init__(self, threshold, interval=0.01, directory='profiles', keep=50, max_depth=64):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self.max_depth = max_depth
+        self.recent = collections.deque(maxlen=keep)
+        self._active = {}    # 线程ID -> RequestContext
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dumped = 0
+
+    @classmethod
+    def from_env(cls):
+        """CSGO_PROFILE_SLOW_MS 设置了慢请求阈值时启用"""
+        threshold_ms = os.environ.get('CSGO_PROFILE_SLOW_MS')
+        if not threshold_ms:
+            return None
+        return cls(float(threshold_ms) / 1000,
+                   interval=float(os.environ.get('CSGO_PROFILE_INTERVAL_MS', '10')) / 1000,
+                   directory=os.environ.get('CSGO_PROFILE_DIR', 'profiles'))
+
+    def begin(self, ctx):
+        self._ensure_thread()
+        with self._lock:
+            self._active[ctx.thread_id] = ctx
+
+    def end(self, ctx, status, elapsed):
+        with self._lock:
+            if self._active.get(ctx.thread_id) is ctx:
+                del self._active[ctx.thread_id]
+        if elapsed >= self.threshold:
+            self._dump(ctx, status, elapsed)
+
+    def _ensure_thread(self):
+        # 第一次请求时才启动；预派生的工作进程不继承父进程的线程，在子进程中重新启动
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ctx in active:
+                frame = frames.get(ctx.thread_id)
+                if frame is not None:
+                    ctx.samples[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _dump(self, ctx, status, elapsed):
+        summary = {
+            'endpoint': ctx.endpoint,
+            'method': ctx.method,
+            'status': status,
+            'seconds': round(elapsed, 4),
+            'phases': {phase: round(seconds, 4) for phase, seconds in ctx.phases.items()},
+            'samples': sum(ctx.samples.values()),
+            'time': int(time.time())
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.dumped += 1
+            path = os.path.join(self.directory, f"slow-{summary['time']}-{os.getpid()}-{self.dumped}.folded")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"# {ctx.method} {ctx.endpoint} {status} {elapsed * 1000:.1f}ms\n")
+                for phase, seconds in summary['phases'].items():
+                    f.write(f"# {phase} {seconds * 1000:.1f}ms\n")
+                for stack, count in ctx.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            summary['file'] = path
+        except OSError as e:
+            print(f"写入慢请求采样失败: {e}")
+        self.recent.append(summary)
+
+
+class MetricsRegistry:
+    """按路由统计请求耗时，按阶段统计爬虫、数据库和 JSON 编码耗时，输出 Prometheus 文本格式"""
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self._requests = {}    # (路由, 方法, 状态码) -> Histogram
+        self._phases = {}      # 阶段 -> Histogram
+        self._gauges = []      # (名称, 说明, 回调)
+        self._in_flight = 0
+        self._slow = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def begin_request(self, endpoint, method):
+        """开始计时一个请求，之后本线程的 span() 计入这个请求"""
+        ctx = RequestContext(endpoint, method)
+        self._local.ctx = ctx
+        with self._lock:
+            self._in_flight += 1
+        if self.profiler is not None:
+            self.profiler.begin(ctx)
+        return ctx
+
+    def end_request(self, ctx, status):
+        """结束计时，重复调用时忽略"""
+        if ctx.ended:
+            return
+        ctx.ended = True
+        elapsed = time.perf_counter() - ctx.started
+        if getattr(self._local, 'ctx', None) is ctx:
+            self._local.ctx = None
+        key = (ctx.endpoint, ctx.method, str(status))
+        with self._lock:
+            self._in_flight -= 1
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram()
+            histogram.observe(elapsed)
+            if self.profiler is not None and elapsed >= self.profiler.threshold:
+                self._slow += 1
+        if self.profiler is not None:
+            self.profiler.end(ctx, status, elapsed)
+
+    def observe_phase(self, phase, seconds):
+        with self._lock:
+            histogram = self._phases.get(phase)
+            if histogram is None:
+                histogram = self._phases[phase] = Histogram()
+            histogram.observe(seconds)
+        ctx = getattr(self._local, 'ctx', None)
+        if ctx is not None:
+            ctx.phases[phase] += seconds
+
+    @contextlib.contextmanager
+    def span(self, phase):
+        """统计一段代码的耗时；在请求线程中执行时同时计入该请求的阶段耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(phase, time.perf_counter() - started)
+
+    def gauge(self, name, help_text, callback):
+        """登记一个在输出时读取当前值的指标"""
+        self._gauges.append((name, help_text, callback))
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            requests = sorted(self._requests.items())
+            phases = sorted(self._phases.items())
+            in_flight, slow = self._in_flight, self._slow
+            lines += _histogram_lines('csgo_http_request_duration_seconds', '请求处理耗时（流式响应计到响应头发出）',
+                                      [({'endpoint': e, 'method': m, 'status': s}, h) for (e, m, s), h in requests])
+            lines += _histogram_lines('csgo_phase_duration_seconds', '爬虫、数据库读写和 JSON 编码各阶段耗时',
+                                      [({'phase': phase}, h) for phase, h in phases])
+
+        lines += ['# HELP csgo_http_requests_in_flight 正在处理的请求数',
+                  '# TYPE csgo_http_requests_in_flight gauge',
+                  f'csgo_http_requests_in_flight {in_flight}']
+        if self.profiler is not None:
+            lines += ['# HELP csgo_slow_requests_total 超过采样阈值的请求数',
+                      '# TYPE csgo_slow_requests_total counter',
+                      f'csgo_slow_requests_total {slow}']
+        for name, help_text, callback in self._gauges:
+            try:
+                value = callback()
+            except Exception:
+                continue
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {_format_value(value)}']
+        return '\n'.join(lines) + '\n'
+
+    def slow_requests(self, limit=20):
+        """最近的慢请求摘要，按时间倒序"""
+        if self.profiler is None:
+            return []
+        return list(self.profiler.recent)[-limit:][::-1]
+
+
+def _histogram_lines(name, help_text, series):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, histogram in series:
+        label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        for le, count in histogram.samples():
+            lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {count}')
+        lines.append(f'{name}_sum{{{label_text}}} {_format_value(histogram.sum)}')
+        lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+    return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def init_app(app):
+    """给 Flask 应用加上按路由的耗时统计、JSON 编码计时和 /metrics 接口"""
+    from flask import Response, g, jsonify, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with span(JSON_ENCODE):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def begin_request_timer():
+        # 用路由模板作为标签，物品名等路径参数不会产生新的时间序列
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_ctx = registry.begin_request(endpoint, request.method)
+
+    @app.after_request
+    def end_request_timer(response):
+        ctx = g.pop('metrics_ctx', None)
+        if ctx is not None:
+            registry.end_request(ctx, response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_failed_request_timer(exc):
+        # 视图抛出异常时不会执行 after_request
+        ctx = g.pop('metrics_ctx', None)
+        if ctx is not None:
+            registry.end_request(ctx, 500)
+
+    def metrics_view():
+        return Response(registry.render(), content_type=CONTENT_TYPE, headers={'Cache-Control': 'no-store'})
+
+    def slow_requests_view():
+        return jsonify({'enabled': registry.profiler is not None,
+                        'requests': registry.slow_requests(request.args.get('limit', 20, type=int))})
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    app.add_url_rule('/metrics/slow', 'slow_requests', slow_requests_view)
+
+
+# 进程级的指标注册表；设置 CSGO_PROFILE_SLOW_MS 时启用慢请求采样
+registry = MetricsRegistry(SlowRequestProfiler.from_env())
+span = registry.span
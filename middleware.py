@@ -0,0 +1,13 @@
+# Flask 应用的公共中间件（价格服务、象棋服务和合并部署的 unified_app 共用）
+from flask_cors import CORS
+
+import http_cache
+import metrics
+
+
+def init_app(app):
+    """请求耗时指标（/metrics），CORS，以及紧凑 JSON、ETag/304、gzip/brotli 压缩和静态文件缓存"""
+    # 最先注册，after_request 最后执行，耗时包含压缩
+    metrics.init_app(app)
+    CORS(app)
+    http_cache.init_app(app)
@@ -0,0 +1,195 @@
+# 数据库结构迁移
+# 当前版本号保存在 PRAGMA user_version 中，按顺序执行尚未应用的迁移
+import logging
+import time
+
+import rollups
+
+logger = logging.getLogger(__name__)
+
+
+def _initial_schema(cursor):
+    """初始表结构（与早期 init_db 创建的一致）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            display_name TEXT NOT NULL,
+            icon_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER,
+            price REAL NOT NULL,
+            source TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (item_id) REFERENCES items (id)
+        )
+    ''')
+
+
+def _watchlist(cursor):
+    """后台刷新的关注列表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS watchlist (
+            name TEXT PRIMARY KEY,
+            demand REAL DEFAULT 0,
+            volatility REAL DEFAULT 0,
+            last_price REAL,
+            last_refreshed REAL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _clustered_prices(cursor):
+    """prices 改为按 (item_id, ts) 聚簇的 WITHOUT ROWID 表，时间戳改为整数秒
+
+    同一物品的历史价格在B树中物理相邻，按物品查询历史只需一次定位加顺序扫描，
+    不再需要全表扫描和排序。同一秒内同一数据源的重复价格只保留最后一条。
+    """
+    cursor.execute('''
+        CREATE TABLE prices_clustered (
+            item_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            price REAL NOT NULL,
+            PRIMARY KEY (item_id, ts, source)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO prices_clustered (item_id, ts, source, price)
+        SELECT item_id, CAST(strftime('%s', timestamp) AS INTEGER), source, price
+        FROM prices
+        WHERE item_id IS NOT NULL AND timestamp IS NOT NULL
+        ORDER BY id
+    ''')
+    cursor.execute('DROP TABLE prices')
+    cursor.execute('ALTER TABLE prices_clustered RENAME TO prices')
+
+
+def _price_rollups(cursor):
+    """价格增加成交量列，并创建小时/天级 OHLC 聚合表，用已有数据回填"""
+    cursor.execute('ALTER TABLE prices ADD COLUMN volume INTEGER')
+    rollups.create_tables(cursor)
+    for resolution in rollups.RESOLUTIONS:
+        rollups.backfill(cursor, resolution)
+
+
+def _price_alerts(cursor):
+    """价格提醒规则，按物品建索引（启动时按物品加载到内存）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT NOT NULL,
+            source TEXT,
+            kind TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            window_seconds INTEGER,
+            cooldown INTEGER NOT NULL DEFAULT 3600,
+            triggered INTEGER NOT NULL DEFAULT 0,
+            last_fired INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_item ON alerts (item_name)')
+
+
+def _watchlist_pinned(cursor):
+    """关注列表区分手动加入（固定）和因查询自动加入的物品，已有的物品都视为手动加入"""
+    cursor.execute('ALTER TABLE watchlist ADD COLUMN pinned INTEGER NOT NULL DEFAULT 1')
+
+
+def _sync_state(cursor):
+    """后台同步任务的进度（物品目录同步的分页位置），重启后从断点继续"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            cursor INTEGER NOT NULL DEFAULT 0,
+            completed_at REAL,
+            updated_at REAL
+        )
+    ''')
+
+
+def _shared_state(cursor):
+    """多进程部署时进程之间交换数据的表：新写入的价格，以及转交给后台进程的调度请求"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_feed (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            pid INTEGER NOT NULL,
+            item_name TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            price REAL NOT NULL,
+            volume INTEGER,
+            written_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL,
+            name TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+
+# 按顺序排列，只能追加，不能修改已发布的迁移
+MIGRATIONS = [
+    _initial_schema,
+    _watchlist,
+    _clustered_prices,
+    _price_rollups,
+    _price_alerts,
+    _watchlist_pinned,
+    _sync_state,
+    _shared_state,
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """把数据库升级到最新版本，每个迁移在单独的事务中执行
+
+    每一步先拿到写锁（BEGIN IMMEDIATE）再读取版本号，多个进程同时启动时只有一个执行，
+    其他进程等待后看到已经升级的版本并跳过
+    """
+    # 手动管理事务，避免 sqlite3 模块隐式开启事务
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        if schema_version(conn) == 0 and not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table'").fetchone():
+            # 新数据库在建表前设为增量回收模式，保留策略删除数据后可以分批归还空闲页；
+            # 已有的数据库需要完整 VACUUM 才能转换，由 retention.py vacuum 手动执行
+            # （其他进程已经建表时这条语句不起作用）
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        while True:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                version = schema_version(conn)
+                if version >= len(MIGRATIONS):
+                    cursor.execute('COMMIT')
+                    break
+                number, migration = version + 1, MIGRATIONS[version]
+                start = time.perf_counter()
+                migration(cursor)
+                # PRAGMA 不支持参数绑定
+                cursor.execute(f'PRAGMA user_version = {number}')
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            logger.info(f"数据库迁移 {number} ({migration.__name__}) 完成，用时 {time.perf_counter() - start:.2f}s")
+    finally:
+        conn.isolation_level = isolation_level
+    return schema_version(conn)
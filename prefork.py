@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+预派生（pre-fork）多进程部署
+父进程只导入一次全部模块，迁移数据库并加载搜索索引、提醒规则和搬砖价格簿，然后 fork 出多个工作进程，
+共享同一个监听 socket。工作进程通过写时复制共享父进程已经加载的模块和数据，不需要各自重新导入和加载；
+fork 前调用 gc.freeze()，避免垃圾回收改写对象头导致共享的内存页被复制。
+
+父进程不处理请求，只负责重启意外退出的工作进程；收到 SIGTERM/SIGINT 时通知所有工作进程退出。
+后台刷新、保留策略、目录同步和价格提醒只在拿到文件锁的那个工作进程中运行，
+多于一个工作进程时通过数据库共享新价格和调度请求（见 unified_app）。
+
+使用方法：
+    python3 prefork.py --workers 4 --port 5000
+"""
+
+# 最先导入，从这里开始统计启动耗时
+from startup import startup_timer
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+import unified_app
+from db import db_pool
+
+# 工作进程在这个时间内退出视为启动失败，连续失败时放慢重启
+MIN_WORKER_LIFETIME = 5
+
+
+def serve_worker(app, sock, background, shared):
+    """工作进程：启动本进程的后台线程，在继承的 socket 上处理请求"""
+    from werkzeug.serving import make_server
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    import app as price_service
+    import xiangqi_server
+    unified_app.start_services(app, background, shared)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    except SystemExit:
+        pass
+    finally:
+        # 子进程用 os._exit 退出，不会执行 atexit，这里写出缓冲区中剩余的价格并关闭象棋 AI 进程池
+        price_service.price_writer.stop()
+        price_service.shared_state.stop()
+        if xiangqi_server.ai_executor is not None:
+            xiangqi_server.ai_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Arbiter:
+    """父进程：fork 工作进程并在它们意外退出时重启"""
+
+    def __init__(self, app, sock, workers, background=True):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.background = background
+        self.children = {}    # pid -> 启动时间
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        code = 0
+        try:
+            serve_worker(self.app, self.sock, self.background, self.workers > 1)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"⚠️ 工作进程 {pid} 退出（状态 {status}），重新启动")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(1)
+            self.spawn()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预先加载后 fork 多个工作进程运行价格服务和象棋服务')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--no-background', action='store_true', help='不运行后台刷新、保留策略和目录同步')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        sys.exit('当前平台不支持 fork，请使用 unified_app.py')
+
+    app = unified_app.build_app()
+    unified_app.init_services()
+    # 连接不能跨进程共享，工作进程各自重新建立
+    db_pool.close_all()
+    if threading.active_count() > 1:
+        print(f"⚠️ fork 前已有 {threading.active_count() - 1} 个后台线程，工作进程中不会运行它们")
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.set_inheritable(True)
+
+    # 已加载的对象移出垃圾回收的跟踪范围，工作进程中的回收不会触碰这些共享页
+    gc.collect()
+    gc.freeze()
+    startup_timer.finish()
+    startup_timer.print_report()
+
+    print(f"🌐 价格服务: http://localhost:{args.port}/ （{args.workers} 个工作进程）")
+    print(f"🎮 象棋服务: http://localhost:{args.port}/xiangqi/")
+    Arbiter(app, sock, args.workers, background=not args.no_background).run()
+
+
+if __name__ == '__main__':
+    main()
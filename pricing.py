@@ -0,0 +1,230 @@
+# 价格解析、标准化和汇率换算
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+logger = logging.getLogger(__name__)
+
+# 基准货币，比较和入库统一换算成该货币
+BASE_CURRENCY = 'USD'
+
+# 货币符号 -> ISO代码，长的符号放前面优先匹配
+CURRENCY_SYMBOLS = [
+    ('CDN$', 'CAD'), ('R$', 'BRL'), ('A$', 'AUD'), ('HK$', 'HKD'), ('NT$', 'TWD'),
+    ('pуб.', 'RUB'), ('руб.', 'RUB'), ('zł', 'PLN'), ('₩', 'KRW'), ('€', 'EUR'),
+    ('£', 'GBP'), ('¥', 'CNY'), ('￥', 'CNY'), ('₽', 'RUB'), ('$', 'USD')
+]
+
+CURRENCY_DISPLAY = {
+    'USD': '$', 'CNY': '¥', 'EUR': '€', 'GBP': '£', 'RUB': '₽', 'BRL': 'R$',
+    'CAD': 'CDN$', 'AUD': 'A$', 'HKD': 'HK$', 'TWD': 'NT$', 'KRW': '₩', 'PLN': 'zł', 'JPY': '¥'
+}
+
+# 没有辅币单位的货币
+ZERO_DECIMAL_CURRENCIES = {'JPY', 'KRW'}
+
+# 以逗号作为小数点的货币
+COMMA_DECIMAL_CURRENCIES = {'EUR', 'RUB', 'BRL', 'PLN'}
+
+# 默认汇率：1个基准货币可兑换的各货币数量
+DEFAULT_FX_RATES = {
+    'USD': 1.0, 'CNY': 7.1, 'EUR': 0.92, 'GBP': 0.79, 'RUB': 92.0, 'BRL': 5.0,
+    'CAD': 1.36, 'AUD': 1.52, 'HKD': 7.8, 'TWD': 32.0, 'KRW': 1330.0, 'PLN': 4.0, 'JPY': 150.0
+}
+
+_NUMBER_RE = re.compile(r'\d[\d\s.,  \']*')
+
+
+def minor_exponent(currency):
+    """货币的小数位数"""
+    return 0 if currency in ZERO_DECIMAL_CURRENCIES else 2
+
+
+def parse_price(text, default_currency=BASE_CURRENCY):
+    """解析价格字符串，返回 (最小货币单位的整数金额, ISO货币代码)，无法解析时返回 None
+
+    支持 "$1,234.56"、"¥12.34"、"1.234,56€"、"1 234,56 pуб." 等格式。
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return to_minor(Decimal(str(text)), default_currency), default_currency
+
+    text = str(text).strip()
+    currency = default_currency
+    for symbol, code in CURRENCY_SYMBOLS:
+        if symbol in text:
+            currency = code
+            break
+
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return None
+    number = re.sub(r'[\s  \']', '', match.group()).rstrip('.,')
+
+    if ',' in number and '.' in number:
+        # 两种分隔符都有时，靠后的是小数点
+        if number.rfind(',') > number.rfind('.'):
+            number = number.replace('.', '').replace(',', '.')
+        else:
+            number = number.replace(',', '')
+    elif ',' in number:
+        head, _, tail = number.rpartition(',')
+        if len(tail) == 3 and currency not in COMMA_DECIMAL_CURRENCIES:
+            number = number.replace(',', '')
+        else:
+            number = head.replace(',', '') + '.' + tail
+    elif number.count('.') > 1 or (currency in COMMA_DECIMAL_CURRENCIES and len(number.rpartition('.')[2]) == 3):
+        # "1.234.567" 或 "1.234€" 中的点是千位分隔符
+        number = number.replace('.', '')
+
+    try:
+        return to_minor(Decimal(number), currency), currency
+    except InvalidOperation:
+        return None
+
+
+def parse_volume(text):
+    """解析成交量（如 "1,234"），无法解析时返回 None"""
+    if text is None:
+        return None
+    if isinstance(text, int):
+        return text
+    digits = re.sub(r'\D', '', str(text))
+    return int(digits) if digits else None
+
+
+def to_minor(amount, currency):
+    """把金额转换为最小货币单位的整数"""
+    scale = Decimal(10) ** minor_exponent(currency)
+    return int((Decimal(amount) * scale).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_price(minor, currency):
+    """格式化为显示用的价格字符串"""
+    if minor is None:
+        return None
+    exponent = minor_exponent(currency)
+    symbol = CURRENCY_DISPLAY.get(currency, currency + ' ')
+    return f"{symbol}{minor / 10 ** exponent:,.{exponent}f}"
+
+
+class FxTable:
+    """带缓存的汇率表
+
+    汇率以“1个基准货币可兑换多少该货币”表示。设置了 CSGO_FX_URL 时，
+    会定期从该地址拉取 {"rates": {...}} 格式的汇率，失败时沿用旧值。
+    """
+    def __init__(self, rates=None, base=BASE_CURRENCY, url=None, ttl=3600):
+        self.base = base
+        self.url = url
+        self.ttl = ttl
+        self._rates = dict(rates or DEFAULT_FX_RATES)
+        self._loaded_at = time.time() if not url else 0.0
+        self._lock = threading.Lock()
+
+    def _refresh_if_stale(self):
+        if not self.url or time.time() - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            if time.time() - self._loaded_at < self.ttl:
+                return
+            self._loaded_at = time.time()
+            try:
+                with urllib.request.urlopen(self.url, timeout=5) as response:
+                    rates = json.loads(response.read().decode()).get('rates') or {}
+                self._rates.update({code.upper(): float(rate) for code, rate in rates.items() if rate})
+            except Exception as e:
+                logger.error(f"汇率更新失败，继续使用缓存汇率: {e}")
+
+    def rate(self, currency):
+        self._refresh_if_stale()
+        return self._rates.get(currency)
+
+    def convert(self, minor, currency, target=None):
+        """把最小单位金额从 currency 换算到 target（默认基准货币），无汇率时返回 None"""
+        target = target or self.base
+        if minor is None:
+            return None
+        if currency == target:
+            return minor
+        source_rate, target_rate = self.rate(currency), self.rate(target)
+        if not source_rate or not target_rate:
+            return None
+        amount = minor / 10 ** minor_exponent(currency) / source_rate * target_rate
+        return int(round(amount * 10 ** minor_exponent(target)))
+
+    def snapshot(self):
+        self._refresh_if_stale()
+        return {'base': self.base, 'rates': dict(self._rates), 'loaded_at': self._loaded_at}
+
+
+fx_table = FxTable(url=os.environ.get('CSGO_FX_URL'))
+
+
+class PriceRecord:
+    """某个数据源返回的一条价格记录
+
+    金额以最小货币单位的整数保存（如美分），成交量为整数。
+    """
+    __slots__ = ('source', 'currency', 'lowest', 'median', 'volume', 'timestamp')
+
+    def __init__(self, source, currency, lowest=None, median=None, volume=None, timestamp=None):
+        self.source = source
+        self.currency = currency
+        self.lowest = lowest
+        self.median = median
+        self.volume = volume
+        self.timestamp = timestamp or datetime.now().isoformat()
+
+    @classmethod
+    def from_strings(cls, source, lowest_text, median_text=None, volume_text=None, default_currency=BASE_CURRENCY):
+        """从市场返回的价格字符串构建记录，最低价无法解析时返回 None"""
+        lowest = parse_price(lowest_text, default_currency)
+        median = parse_price(median_text, default_currency)
+        if not lowest and not median:
+            return None
+        currency = (lowest or median)[1]
+        return cls(source, currency,
+                   lowest=lowest[0] if lowest else None,
+                   median=median[0] if median else None,
+                   volume=parse_volume(volume_text))
+
+    def lowest_base(self, fx=None):
+        """最低价换算成基准货币的最小单位"""
+        return (fx or fx_table).convert(self.lowest, self.currency)
+
+    def median_base(self, fx=None):
+        """中位价换算成基准货币的最小单位"""
+        return (fx or fx_table).convert(self.median, self.currency)
+
+    def reference_base(self, fx=None):
+        """入库使用的参考价：优先中位价，没有则用最低价"""
+        value = self.median_base(fx)
+        return value if value is not None else self.lowest_base(fx)
+
+    def to_dict(self, fx=None):
+        """转换为接口返回的格式（保留显示用的价格字符串）"""
+        fx = fx or fx_table
+        lowest_base = self.lowest_base(fx)
+        return {
+            'source': self.source,
+            'lowest_price': format_price(self.lowest, self.currency),
+            'median_price': format_price(self.median, self.currency),
+            'volume': self.volume,
+            'currency': self.currency,
+            'lowest_minor': self.lowest,
+            'median_minor': self.median,
+            'lowest_price_base': lowest_base / 10 ** minor_exponent(fx.base) if lowest_base is not None else None,
+            'base_currency': fx.base,
+            'timestamp': self.timestamp
+        }
+
+    def __repr__(self):
+        return f"PriceRecord({self.source!r}, {self.currency}, lowest={self.lowest}, median={self.median}, volume={self.volume})"
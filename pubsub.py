@@ -0,0 +1,132 @@
+# 价格实时推送（Server-Sent Events，只依赖标准库）
+import queue
+import threading
+
+import http_cache
+
+# 每个订阅者最多积压的消息数，超过说明客户端读得太慢，断开后由浏览器自动重连
+QUEUE_SIZE = 100
+
+# 没有消息时发送注释行的间隔，防止代理和浏览器因空闲断开连接
+KEEPALIVE_INTERVAL = 15
+
+# 浏览器断线后的重连等待时间（毫秒）
+RETRY_MS = 5000
+
+
+def sse_frame(event, data, event_id=None):
+    """按 text/event-stream 格式编码一条消息"""
+    frame = b''
+    if event_id is not None:
+        frame += f'id: {event_id}\n'.encode('utf-8')
+    return frame + f'event: {event}\n'.encode('utf-8') + b'data: ' + http_cache.dumps(data) + b'\n\n'
+
+
+def price_events(rows):
+    """把写入管道的行 (物品, 物品ID, 时间, 数据源, 价格, 成交量) 按物品合并成推送消息"""
+    events = {}
+    for name, _, ts, source, price, volume in rows:
+        event = events.setdefault(name, {'item_name': name, 'ts': ts, 'sources': {}})
+        event['ts'] = max(event['ts'], ts)
+        event['sources'][source] = {'price': price, 'ts': ts, 'volume': volume}
+    return events
+
+
+class Subscription:
+    """一个客户端连接订阅的物品和待发送的消息"""
+
+    def __init__(self, items, queue_size=QUEUE_SIZE):
+        self.items = frozenset(items)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def push(self, frame):
+        """放入一条消息，队列满时返回 False"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def wake(self):
+        """唤醒正在等待消息的 events()，用于取消订阅后结束连接"""
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def events(self, keepalive=KEEPALIVE_INTERVAL):
+        """生成要发送的消息，空闲时发送注释行保持连接"""
+        while not self.closed:
+            try:
+                frame = self.queue.get(timeout=keepalive)
+            except queue.Empty:
+                yield b': keepalive\n\n'
+                continue
+            if frame is None:
+                break
+            yield frame
+
+
+class PriceBroker:
+    """按物品分发新价格给订阅的客户端
+
+    作为写入管道的回调：后台刷新每写入一批价格，每个物品只编码一次消息，再放进所有订阅者的队列，
+    多个客户端共享同一次上游抓取。读得太慢的订阅者会被断开，不会拖慢写入。
+    """
+    def __init__(self, max_subscribers=1000, queue_size=QUEUE_SIZE):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._topics = {}    # 物品 -> 订阅集合
+        self._count = 0
+        self._lock = threading.Lock()
+        self.stats = {'published': 0, 'delivered': 0, 'dropped_subscribers': 0}
+
+    def subscribe(self, items):
+        """订阅物品，订阅者已满时返回 None"""
+        subscription = Subscription(items, self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._count += 1
+            for item in subscription.items:
+                self._topics.setdefault(item, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self._count -= 1
+            for item in subscription.items:
+                subscribers = self._topics.get(item)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[item]
+        subscription.wake()
+
+    def publish(self, rows):
+        """写入管道的回调：把新价格推送给订阅了对应物品的客户端"""
+        events = price_events(rows)
+        slow = []
+        with self._lock:
+            for name, event in events.items():
+                subscribers = self._topics.get(name)
+                if not subscribers:
+                    continue
+                frame = sse_frame('price', event, event['ts'])
+                self.stats['published'] += 1
+                for subscription in subscribers:
+                    if subscription.push(frame):
+                        self.stats['delivered'] += 1
+                    else:
+                        slow.append(subscription)
+        for subscription in set(slow):
+            self.stats['dropped_subscribers'] += 1
+            self.unsubscribe(subscription)
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, subscribers=self._count, items=len(self._topics))
@@ -0,0 +1,73 @@
+# 数据源请求频率限制
+import threading
+import time
+
+
+class RateLimitedError(Exception):
+    """在限定时间内没有拿到请求额度"""
+    pass
+
+
+class TokenBucket:
+    """令牌桶限流器（线程安全）
+
+    rate 为每秒补充的令牌数，capacity 为允许的突发请求数。
+    获取令牌时可以指定 reserve：桶里至少要留下这么多令牌才放行，用来给实时查询预留额度。
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def _needed(self, tokens, reserve):
+        # 预留量不能超过桶的容量，否则永远拿不到
+        return tokens + min(reserve, max(0.0, self.capacity - tokens))
+
+    def try_acquire(self, tokens=1, reserve=0):
+        """立即尝试获取令牌，不等待"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= self._needed(tokens, reserve):
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1, reserve=0):
+        """距离能拿到令牌还需要等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            needed = self._needed(tokens, reserve)
+            if self._tokens >= needed:
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None, reserve=0):
+        """阻塞获取令牌，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.try_acquire(tokens, reserve):
+                return True
+            wait = self.wait_time(tokens, reserve)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait > remaining:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(max(wait, 0.001))
+
+    def snapshot(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate_per_second': self.rate,
+                'capacity': self.capacity,
+                'available': round(self._tokens, 2)
+            }
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+价格历史保留策略
+原始价格只保留最近 N 天，更早的数据先精确回填进小时/天级聚合再删除；
+小时级聚合保留更长时间，天级聚合永久保留。删除后用增量 VACUUM 分批归还空闲页，
+长期运行时数据库大小和查询耗时保持稳定。配置了归档时，原始价格删除前先导出到
+列式归档（storage.ArchiveStorage）。
+
+新建的数据库在迁移时就设为 auto_vacuum=INCREMENTAL。之前创建的数据库需要停机后
+手动执行一次 `retention.py vacuum` 转换（完整 VACUUM 会在重写期间独占数据库），
+转换前保留策略照常删除数据，只是不归还空闲页。
+
+使用方法：
+    python3 retention.py run                  # 立即执行一次
+    python3 retention.py run --raw-days 7     # 自定义保留天数
+    python3 retention.py run --archive price_archive  # 删除前导出到归档
+    python3 retention.py stats                # 查看数据库大小
+    python3 retention.py vacuum               # 把已有数据库转换为增量回收模式（停机执行）
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+import rollups
+
+logger = logging.getLogger(__name__)
+
+RAW_RETENTION_DAYS = int(os.environ.get('CSGO_RAW_RETENTION_DAYS', '30'))
+HOURLY_RETENTION_DAYS = int(os.environ.get('CSGO_HOURLY_RETENTION_DAYS', '180'))
+
+DAY = 86400
+
+# 每条 incremental_vacuum 语句最多回收的页数，分批执行，每批只短暂持有写锁
+VACUUM_PAGES_PER_STEP = 1000
+
+
+class RetentionPolicy:
+    """按物品分批执行 回填聚合 -> 删除原始价格 -> 删除旧小时聚合 -> 增量回收空间
+
+    每批物品一个短事务，删除按 (item_id, ts) 主键范围进行，不会长时间阻塞写入。
+    """
+    def __init__(self, db, raw_days=RAW_RETENTION_DAYS, hourly_days=HOURLY_RETENTION_DAYS,
+                 items_per_batch=200, archive=None):
+        if hourly_days < raw_days:
+            raise ValueError("小时级聚合的保留时间不能短于原始价格")
+        self.db = db
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.items_per_batch = items_per_batch
+        self.archive = archive
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._warned_vacuum = False
+        self.last_run = None
+
+    def _cutoff(self, days, now):
+        # 对齐到 UTC 零点，保证被删除的数据所在的小时/天桶都是完整的
+        cutoff = int(now) - days * DAY
+        return cutoff - cutoff % DAY
+
+    def convert_to_incremental_vacuum(self):
+        """把已有数据库切换为 auto_vacuum=INCREMENTAL，返回用时秒数，已经是增量模式时返回 None
+
+        需要一次完整 VACUUM，重写期间其他连接无法写入，只通过命令行在停机时执行。
+        """
+        with self.db.connection(metrics.DB_WRITE) as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return None
+            start = time.perf_counter()
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            seconds = time.perf_counter() - start
+        logger.info(f"数据库已切换为增量回收模式，VACUUM 用时 {seconds:.2f}s")
+        return seconds
+
+    def _reclaim(self, conn):
+        """分批回收空闲页，返回回收的页数；不是增量回收模式时不回收"""
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            if not self._warned_vacuum:
+                logger.warning("数据库不是增量回收模式，删除的数据不会归还磁盘空间；停机后执行 retention.py vacuum 转换")
+                self._warned_vacuum = True
+            return 0
+        freed = 0
+        while not self._stop.is_set():
+            pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not pages:
+                break
+            step = min(pages, VACUUM_PAGES_PER_STEP)
+            # sqlite3 模块的 execute 每次只回收一页，用 executescript 一次执行完
+            conn.executescript(f'PRAGMA incremental_vacuum({step});')
+            freed += step
+        return freed
+
+    def run(self, now=None):
+        """执行一次保留策略，返回本次的统计信息"""
+        now = now or time.time()
+        raw_cutoff = self._cutoff(self.raw_days, now)
+        hourly_cutoff = self._cutoff(self.hourly_days, now)
+        hourly_table = rollups.RESOLUTIONS['hour'][0]
+        start = time.perf_counter()
+        result = {'raw_deleted': 0, 'hourly_deleted': 0, 'items': 0, 'archived': 0}
+
+        with self.db.connection(metrics.DB_WRITE) as conn:
+            size_before = self._size(conn)
+            items = conn.execute('SELECT id, name FROM items ORDER BY id').fetchall()
+        if self.archive:
+            self.archive.init()
+
+        for i in range(0, len(items), self.items_per_batch):
+            with self.db.transaction() as conn:
+                expired = []
+                for item_id, item_name in items[i:i + self.items_per_batch]:
+                    oldest = conn.execute('SELECT MIN(ts) FROM prices WHERE item_id = ?', (item_id,)).fetchone()[0]
+                    if oldest is not None and oldest < raw_cutoff:
+                        # 删除前用原始数据重新计算这些桶，聚合结果与原始数据完全一致
+                        for resolution in rollups.RESOLUTIONS:
+                            rollups.backfill(conn, resolution, oldest, raw_cutoff, item_id=item_id)
+                        if self.archive:
+                            expired.extend((item_name,) + tuple(row) for row in conn.execute(
+                                'SELECT ts, source, price, volume FROM prices WHERE item_id = ? AND ts < ?',
+                                (item_id, raw_cutoff)))
+                        result['raw_deleted'] += conn.execute(
+                            'DELETE FROM prices WHERE item_id = ? AND ts < ?', (item_id, raw_cutoff)).rowcount
+                        result['items'] += 1
+                    result['hourly_deleted'] += conn.execute(
+                        f'DELETE FROM {hourly_table} WHERE item_id = ? AND bucket < ?',
+                        (item_id, hourly_cutoff)).rowcount
+                # 归档写入失败时整批回滚，不会丢失数据
+                if expired:
+                    result['archived'] += len(self.archive.save_prices(expired))
+
+        with self.db.connection(metrics.DB_WRITE) as conn:
+            freed = self._reclaim(conn)
+            # 截断 WAL 文件，避免大批删除后 WAL 一直占用磁盘
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+            conn.execute('PRAGMA optimize')
+            size_after = self._size(conn)
+
+        result.update({
+            'raw_cutoff': raw_cutoff,
+            'hourly_cutoff': hourly_cutoff,
+            'pages_freed': freed,
+            'size_before': size_before,
+            'size_after': size_after,
+            'seconds': round(time.perf_counter() - start, 3),
+            'finished_at': time.time()
+        })
+        self.last_run = result
+        logger.info(f"保留策略完成: 删除原始价格 {result['raw_deleted']} 条, 小时聚合 {result['hourly_deleted']} 条, "
+                    f"回收 {freed} 页, 用时 {result['seconds']}s")
+        return result
+
+    def _size(self, conn):
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+
+    def stats(self):
+        with self.db.connection() as conn:
+            tables = {}
+            for table in ('prices', rollups.RESOLUTIONS['hour'][0], rollups.RESOLUTIONS['day'][0]):
+                tables[table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            return {
+                'size_bytes': self._size(conn),
+                'freelist_pages': conn.execute('PRAGMA freelist_count').fetchone()[0],
+                'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}[conn.execute('PRAGMA auto_vacuum').fetchone()[0]],
+                'rows': tables
+            }
+
+    def status(self):
+        return {
+            'raw_days': self.raw_days,
+            'hourly_days': self.hourly_days,
+            'last_run': self.last_run
+        }
+
+    def start(self, interval=6 * 3600):
+        """启动后台线程，启动时执行一次，之后每隔 interval 秒执行一次"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"执行保留策略失败: {e}")
+            self._stop.wait(interval)
+
+
+def main():
+    from db import db_pool
+
+    parser = argparse.ArgumentParser(description='价格历史保留策略')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help='立即执行一次')
+    run_parser.add_argument('--raw-days', type=int, default=RAW_RETENTION_DAYS)
+    run_parser.add_argument('--hourly-days', type=int, default=HOURLY_RETENTION_DAYS)
+    run_parser.add_argument('--archive', help='删除前把原始价格导出到该归档目录')
+    sub.add_parser('stats', help='查看数据库大小和各表行数')
+    sub.add_parser('vacuum', help='把已有数据库转换为增量回收模式（完整 VACUUM，停机执行）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db_pool.migrate()
+    if args.command == 'run':
+        archive = None
+        if args.archive:
+            from storage import ArchiveStorage
+            archive = ArchiveStorage(args.archive)
+        policy = RetentionPolicy(db_pool, args.raw_days, args.hourly_days, archive=archive)
+        print(json.dumps(policy.run(), indent=2, ensure_ascii=False))
+    elif args.command == 'stats':
+        print(json.dumps(RetentionPolicy(db_pool).stats(), indent=2, ensure_ascii=False))
+    elif args.command == 'vacuum':
+        seconds = RetentionPolicy(db_pool).convert_to_incremental_vacuum()
+        print("数据库已经是增量回收模式" if seconds is None else f"转换完成，用时 {seconds:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
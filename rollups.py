@@ -0,0 +1,170 @@
+# 价格 OHLC 预聚合（小时/天）
+import time
+
+# 分辨率 -> (表名, 桶宽度秒数)
+RESOLUTIONS = {
+    'hour': ('price_rollups_hourly', 3600),
+    'day': ('price_rollups_daily', 86400),
+}
+
+# 图表时间范围
+RANGES = {
+    '24h': 86400,
+    '7d': 7 * 86400,
+    '30d': 30 * 86400,
+    '90d': 90 * 86400,
+    '1y': 365 * 86400,
+}
+
+# 单条曲线允许的最大点数，超过时改用更粗的分辨率
+MAX_POINTS = 1000
+# 原始数据只在短时间范围内直接返回
+RAW_MAX_RANGE = 2 * 86400
+
+
+def create_tables(cursor):
+    for table, _ in RESOLUTIONS.values():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                item_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                open_ts INTEGER NOT NULL,
+                close_ts INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                count INTEGER NOT NULL,
+                volume INTEGER,
+                PRIMARY KEY (item_id, bucket, source)
+            ) WITHOUT ROWID
+        ''')
+
+
+def _upsert_sql(table):
+    # SET 中的表达式引用的都是更新前的旧值
+    return f'''
+        INSERT INTO {table} (item_id, bucket, source, open, high, low, close,
+                             open_ts, close_ts, sum, count, volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+        ON CONFLICT (item_id, bucket, source) DO UPDATE SET
+            open = CASE WHEN excluded.open_ts < open_ts THEN excluded.open ELSE open END,
+            close = CASE WHEN excluded.close_ts >= close_ts THEN excluded.close ELSE close END,
+            open_ts = MIN(open_ts, excluded.open_ts),
+            close_ts = MAX(close_ts, excluded.close_ts),
+            high = MAX(high, excluded.high),
+            low = MIN(low, excluded.low),
+            sum = sum + excluded.sum,
+            count = count + excluded.count,
+            volume = COALESCE(MAX(volume, excluded.volume), volume, excluded.volume)
+    '''
+
+
+def apply(conn, rows):
+    """把新写入的价格增量合并进各级聚合表
+
+    rows: [(item_name, item_id, ts, source, price, volume), ...]，
+    与价格写入在同一事务中执行。
+    """
+    for table, width in RESOLUTIONS.values():
+        conn.executemany(_upsert_sql(table), [
+            (item_id, ts - ts % width, source, price, price, price, price, ts, ts, price, volume)
+            for _, item_id, ts, source, price, volume in rows
+        ])
+
+
+def backfill(conn, resolution, start_ts=None, end_ts=None, item_id=None):
+    """从原始价格重新计算一段时间内的聚合（覆盖已有的桶），可只计算一个物品"""
+    table, width = RESOLUTIONS[resolution]
+    start_ts = start_ts or 0
+    end_ts = end_ts or 2 ** 62
+    item_filter = 'AND item_id = ?' if item_id is not None else ''
+    params = (start_ts - start_ts % width, end_ts) + ((item_id,) if item_id is not None else ())
+    conn.execute(f'''
+        INSERT OR REPLACE INTO {table} (item_id, bucket, source, open, high, low, close,
+                                        open_ts, close_ts, sum, count, volume)
+        SELECT g.item_id, g.bucket, g.source,
+               (SELECT price FROM prices p WHERE p.item_id = g.item_id AND p.ts = g.open_ts AND p.source = g.source),
+               g.high, g.low,
+               (SELECT price FROM prices p WHERE p.item_id = g.item_id AND p.ts = g.close_ts AND p.source = g.source),
+               g.open_ts, g.close_ts, g.sum, g.count, g.volume
+        FROM (
+            SELECT item_id, source, ts - ts % {width} AS bucket,
+                   MIN(ts) AS open_ts, MAX(ts) AS close_ts, MAX(price) AS high, MIN(price) AS low,
+                   SUM(price) AS sum, COUNT(*) AS count, MAX(volume) AS volume
+            FROM prices
+            WHERE ts >= ? AND ts < ? {item_filter}
+            GROUP BY item_id, source, bucket
+        ) g
+    ''', params)
+
+
+def pick_resolution(range_seconds, requested='auto'):
+    """选择能在 MAX_POINTS 个点以内覆盖整个时间范围的最细分辨率，不支持的 requested 抛出 ValueError"""
+    if requested in ('raw', 'hour', 'day'):
+        return requested
+    if requested != 'auto':
+        raise ValueError('resolution must be one of auto, raw, hour, day')
+    if range_seconds <= RAW_MAX_RANGE:
+        return 'raw'
+    for resolution in ('hour', 'day'):
+        if range_seconds / RESOLUTIONS[resolution][1] <= MAX_POINTS:
+            return resolution
+    return 'day'
+
+
+def query_chart(conn, item_name, resolution, since, source=None):
+    """查询图表数据：labels/prices 为各数据源合并后的曲线，series 为各数据源的 OHLC"""
+    source_filter = 'AND source = ?' if source else ''
+    params = [item_name, since] + ([source] if source else [])
+
+    if resolution == 'raw':
+        rows = conn.execute(f'''
+            SELECT ts, source, price, volume FROM prices
+            WHERE item_id = (SELECT id FROM items WHERE name = ?) AND ts >= ? {source_filter}
+            ORDER BY ts ASC
+        ''', params).fetchall()
+        return {
+            'labels': [_iso(row['ts']) for row in rows],
+            'prices': [row['price'] for row in rows],
+            'series': _group_series(({
+                'source': row['source'], 't': row['ts'], 'close': row['price'], 'volume': row['volume']
+            } for row in rows))
+        }
+
+    table, _ = RESOLUTIONS[resolution]
+    rows = conn.execute(f'''
+        SELECT bucket, source, open, high, low, close, sum, count, volume FROM {table}
+        WHERE item_id = (SELECT id FROM items WHERE name = ?) AND bucket >= ? {source_filter}
+        ORDER BY bucket ASC
+    ''', params).fetchall()
+
+    # 合并曲线：每个桶内所有数据源的平均价
+    combined = {}
+    for row in rows:
+        total = combined.setdefault(row['bucket'], [0.0, 0])
+        total[0] += row['sum']
+        total[1] += row['count']
+
+    return {
+        'labels': [_iso(bucket) for bucket in combined],
+        'prices': [round(total / count, 2) for total, count in combined.values()],
+        'series': _group_series(({
+            'source': row['source'], 't': row['bucket'],
+            'open': row['open'], 'high': row['high'], 'low': row['low'], 'close': row['close'],
+            'avg': round(row['sum'] / row['count'], 2), 'count': row['count'], 'volume': row['volume']
+        } for row in rows))
+    }
+
+
+def _group_series(points):
+    series = {}
+    for point in points:
+        series.setdefault(point.pop('source'), []).append(point)
+    return series
+
+
+def _iso(ts):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
@@ -0,0 +1,458 @@
+# 基于关注列表的增量价格刷新调度器
+import heapq
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import shared_state
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class WatchItem:
+    """关注列表中的一个物品"""
+    __slots__ = ('name', 'pinned', 'demand', 'volatility', 'last_price', 'last_refreshed', 'next_due', 'version')
+
+    def __init__(self, name, demand=0.0, volatility=0.0, last_price=None, last_refreshed=None, pinned=True):
+        self.name = name
+        self.pinned = pinned    # 手动加入的物品；因查询自动加入的物品需求衰减后会被移出
+        self.demand = demand
+        self.volatility = volatility
+        self.last_price = last_price
+        self.last_refreshed = last_refreshed
+        self.next_due = 0.0
+        self.version = 0
+
+
+class RefreshScheduler:
+    """价格刷新调度器
+
+    - 关注列表持久化在 watchlist 表中，可容纳数千个物品
+    - 按需求（请求次数，指数衰减）和波动率计算每个物品的刷新间隔
+    - 刷新时间在间隔内均匀分布，总刷新速率不超过数据源预算
+    - 刷新任务交给线程池执行，并统计积压和延迟
+    - 读接口发现缺少价格或价格过期的物品可以放进优先抓取队列，先于按计划刷新的物品派发
+    - 被查询的物品只有 known(name) 为真（目录或 items 表中存在）时才自动加入，关注列表最多 max_items 个；
+      自动加入的物品需求衰减到 expire_demand 以下后移出（只查询过一次的物品大约一天后移出）
+    - 多进程部署时不运行调度的进程调用 forward_to()，查询需求、优先抓取和关注列表的修改
+      转交给运行调度的进程执行，关注列表从数据库读取
+    """
+    def __init__(self, refresh_fn, db, base_interval=1800, min_interval=120,
+                 max_interval=6 * 3600, max_refresh_rate=1.0, budget_share=0.7,
+                 workers=4, demand_half_life=6 * 3600, max_queue=1000,
+                 known=None, max_items=5000, expire_demand=0.05):
+        self.refresh_fn = refresh_fn
+        self.db = db
+        self.known = known
+        self.max_items = max_items
+        self.expire_demand = expire_demand
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # 预留部分额度给实时查询
+        self.refresh_rate = max_refresh_rate * budget_share
+        self.workers = workers
+        self.demand_half_life = demand_half_life
+        self.max_queue = max_queue
+
+        self._items = {}
+        self._heap = []  # (next_due, version, name)
+        self._scale = 1.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._budget = TokenBucket(self.refresh_rate, capacity=1)
+        self._executor = None
+        self._thread = None
+        self._running = False
+        self._in_flight = set()
+        self._urgent = {}  # 优先抓取队列，按加入顺序派发
+        self._dirty = set()
+        self._expired = set()
+        self._last_decay = time.time()
+        self._shared = None
+
+        self.stats = {
+            'refreshed': 0,
+            'failed': 0,
+            'dispatch_lag_total': 0.0,
+            'dispatched': 0,
+            'max_dispatch_lag': 0.0,
+            'requested': 0
+        }
+
+    # ---- 关注列表 ----
+
+    def load(self):
+        """从数据库加载关注列表，并把初次刷新时间均匀铺开"""
+        with self.db.connection() as conn:
+            rows = conn.execute('''
+                SELECT name, demand, volatility, last_price, last_refreshed, pinned FROM watchlist
+            ''').fetchall()
+
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                item = WatchItem(row[0], row[1] or 0.0, row[2] or 0.0, row[3], row[4], bool(row[5]))
+                self._items[item.name] = item
+            self._rebalance(now)
+            overdue = []
+            for item in self._items.values():
+                due = item.last_refreshed + self._interval(item) if item.last_refreshed else 0
+                if due > now:
+                    self._push(item, due)
+                else:
+                    overdue.append(item)
+            # 从未刷新或已过期的物品按优先级依次排开，避免启动时一拥而上
+            overdue.sort(key=lambda i: -self._weight(i))
+            spacing = 1.0 / self.refresh_rate if self.refresh_rate else 0
+            for n, item in enumerate(overdue):
+                self._push(item, now + n * spacing)
+        logger.info(f"关注列表加载完成: {len(rows)} 个物品")
+
+    def forward_to(self, shared):
+        """本进程不运行调度，之后的请求通过 shared（SharedState）转交给运行调度的进程"""
+        self._shared = shared
+
+    def _stored_names(self, names):
+        with self.db.connection() as conn:
+            return {row[0] for name in set(names)
+                    for row in conn.execute('SELECT name FROM watchlist WHERE name = ?', (name,))}
+
+    def add_items(self, names, pinned=True):
+        """加入关注列表，返回新加入的物品；已存在的物品忽略（手动加入时改为固定关注），超出上限的部分不加入"""
+        if any(not isinstance(name, str) for name in names):
+            raise ValueError('item names must be strings')
+        if self._shared is not None:
+            # 转交后由运行调度的进程加入，这里按数据库中的关注列表返回将要加入的物品
+            names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+            self._shared.forward(shared_state.ADD, names)
+            stored = self._stored_names(names)
+            return [name for name in names if name not in stored]
+        added, changed = [], []
+        now = time.time()
+        with self._lock:
+            for name in names:
+                name = name.strip()
+                if not name:
+                    continue
+                item = self._items.get(name)
+                if item is not None:
+                    if pinned and not item.pinned:
+                        item.pinned = True
+                        self._expired.discard(name)
+                        changed.append(name)
+                    continue
+                if len(self._items) >= self.max_items:
+                    break
+                item = WatchItem(name, pinned=pinned)
+                self._items[name] = item
+                self._push(item, now)
+                added.append(name)
+            if added:
+                self._rebalance(now)
+                self._wakeup.notify()
+
+        if added or changed:
+            with self.db.transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO watchlist (name, pinned) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET pinned = MAX(pinned, excluded.pinned)
+                ''', [(name, int(pinned)) for name in added + changed])
+        return added
+
+    def remove_items(self, names):
+        if self._shared is not None:
+            self._shared.forward(shared_state.REMOVE, names)
+            stored = self._stored_names(names)
+            return [name for name in dict.fromkeys(names) if name in stored]
+        with self._lock:
+            removed = [name for name in names if self._items.pop(name, None)]
+            self._expired.difference_update(removed)
+            self._dirty.difference_update(removed)
+            for name in removed:
+                self._urgent.pop(name, None)
+        if removed:
+            with self.db.transaction() as conn:
+                conn.executemany('DELETE FROM watchlist WHERE name = ?', [(name,) for name in removed])
+        return removed
+
+    def _known(self, name):
+        return bool(name) and (self.known is None or self.known(name))
+
+    def _auto_add(self, name, verified=False):
+        """被查询的物品不在关注列表中时，只有已知的物品才自动加入（verified 表示转交前已经检查过）"""
+        if not name or not (verified or self._known(name)):
+            return False
+        return bool(self.add_items([name], pinned=False))
+
+    def record_request(self, name, verified=False):
+        """记录一次用户查询，作为需求信号；未关注的已知物品会自动加入"""
+        name = name.strip()
+        if self._shared is not None:
+            if self._known(name):
+                self._shared.forward(shared_state.DEMAND, [name])
+            return
+        if name not in self._items and not self._auto_add(name, verified):
+            return
+        with self._lock:
+            item = self._items.get(name)
+            if item:
+                item.demand += 1.0
+                self._dirty.add(name)
+
+    def request_refresh(self, name, verified=False):
+        """把物品放进优先抓取队列，由后台线程池尽快抓取
+
+        未关注的已知物品会自动加入。返回物品是否在等待抓取（已在队列中或正在抓取也算），
+        未知物品或队列已满时返回 False；转交给其他进程时已知物品总是返回 True
+        """
+        name = name.strip()
+        if self._shared is not None:
+            if not self._known(name):
+                return False
+            self._shared.forward(shared_state.REFRESH, [name])
+            return True
+        if name not in self._items:
+            self._auto_add(name, verified)
+        with self._lock:
+            item = self._items.get(name)
+            if name in self._urgent or name in self._in_flight:
+                return True
+            if item is None or len(self._urgent) >= self.max_queue:
+                return False
+            # 排期改为现在，派发延迟从加入队列时开始计算
+            self._push(item, time.time())
+            self._urgent[name] = item.version
+            self.stats['requested'] += 1
+            self._wakeup.notify()
+        return True
+
+    # ---- 优先级 ----
+
+    def _weight(self, item):
+        """需求越高、波动越大，刷新越频繁"""
+        return 1.0 + math.log1p(item.demand) + 20.0 * item.volatility
+
+    def _interval(self, item):
+        interval = self.base_interval / self._weight(item) * self._scale
+        return min(max(interval, self.min_interval), self.max_interval * self._scale)
+
+    def _rebalance(self, now):
+        """总刷新需求超出预算时，按比例拉长所有物品的间隔"""
+        self._scale = 1.0
+        if not self._items or not self.refresh_rate:
+            return
+        demand_rate = sum(1.0 / self._interval(item) for item in self._items.values())
+        if demand_rate > self.refresh_rate:
+            self._scale = demand_rate / self.refresh_rate
+
+    def _push(self, item, due):
+        item.next_due = due
+        item.version += 1
+        heapq.heappush(self._heap, (due, item.version, item.name))
+
+    def _decay_demand(self, now):
+        elapsed = now - self._last_decay
+        if elapsed < 60:
+            return
+        factor = 0.5 ** (elapsed / self.demand_half_life)
+        expired = []
+        for item in self._items.values():
+            if item.demand:
+                item.demand *= factor
+                self._dirty.add(item.name)
+            if (not item.pinned and item.demand < self.expire_demand
+                    and item.name not in self._in_flight and item.name not in self._urgent):
+                expired.append(item.name)
+        # 自动加入、已经没人查询的物品移出关注列表，下次 flush 时从数据库删除
+        for name in expired:
+            del self._items[name]
+            self._dirty.discard(name)
+            self._expired.add(name)
+        self._last_decay = now
+        self._rebalance(now)
+
+    # ---- 调度循环 ----
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='refresh')
+        self._thread = threading.Thread(target=self._run, name='refresh-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        self.flush()
+
+    def _next_ready(self):
+        """取出下一个到期的物品，没有则返回需要等待的秒数"""
+        now = time.time()
+        while self._urgent and len(self._in_flight) < self.workers * 2:
+            name, version = next(iter(self._urgent.items()))
+            del self._urgent[name]
+            item = self._items.get(name)
+            # 加入队列后被移除或已经按计划派发过的物品跳过
+            if item is not None and item.version == version and name not in self._in_flight:
+                return item, 0.0
+        while self._heap:
+            due, version, name = self._heap[0]
+            item = self._items.get(name)
+            if item is None or item.version != version:
+                heapq.heappop(self._heap)  # 已删除或已重新排期的旧条目
+                continue
+            if due > now:
+                return None, due - now
+            if name in self._in_flight or len(self._in_flight) >= self.workers * 2:
+                # 线程池已满，等待任务完成
+                return None, 0.5
+            heapq.heappop(self._heap)
+            return item, 0.0
+        return None, 5.0
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            with self._lock:
+                if not self._running:
+                    return
+                now = time.time()
+                self._decay_demand(now)
+                item, wait = self._next_ready()
+                if item is None:
+                    self._wakeup.wait(timeout=min(wait, 5.0))
+                    continue
+                # 按原计划时间排下一次，刷新节奏不会因为延迟而漂移
+                lag = now - item.next_due
+                self._push(item, max(item.next_due + self._interval(item), now + self.min_interval / 2))
+                self._in_flight.add(item.name)
+                self.stats['dispatched'] += 1
+                self.stats['dispatch_lag_total'] += lag
+                self.stats['max_dispatch_lag'] = max(self.stats['max_dispatch_lag'], lag)
+
+            self._executor.submit(self._refresh, item)
+
+            # 按预算匀速派发
+            self._budget.acquire()
+
+            if time.time() - last_flush > 60:
+                self.flush()
+                last_flush = time.time()
+
+    def _refresh(self, item):
+        price = None
+        failed = False
+        try:
+            price = self.refresh_fn(item.name)
+        except Exception as e:
+            failed = True
+            logger.error(f"刷新 {item.name} 价格失败: {e}")
+
+        with self._lock:
+            if failed:
+                self.stats['failed'] += 1
+            else:
+                if price:
+                    if item.last_price:
+                        # 波动率：价格变化幅度的指数移动平均
+                        change = abs(price - item.last_price) / item.last_price
+                        item.volatility = 0.8 * item.volatility + 0.2 * change
+                    item.last_price = price
+                item.last_refreshed = time.time()
+                self._dirty.add(item.name)
+                self.stats['refreshed'] += 1
+            self._in_flight.discard(item.name)
+            self._wakeup.notify()
+
+    def flush(self):
+        """把需求、波动率等状态写回数据库"""
+        with self._lock:
+            rows = []
+            for name in self._dirty:
+                item = self._items.get(name)
+                if item:
+                    rows.append((item.demand, item.volatility, item.last_price,
+                                 item.last_refreshed, item.name))
+            self._dirty.clear()
+            expired = [(name,) for name in self._expired]
+            self._expired.clear()
+        if not rows and not expired:
+            return
+        with self.db.transaction() as conn:
+            conn.executemany('''
+                UPDATE watchlist SET demand = ?, volatility = ?, last_price = ?, last_refreshed = ?
+                WHERE name = ?
+            ''', rows)
+            conn.executemany('DELETE FROM watchlist WHERE name = ? AND pinned = 0', expired)
+
+    # ---- 状态 ----
+
+    def status(self):
+        """调度器的积压和延迟情况"""
+        if self._shared is not None:
+            with self.db.connection() as conn:
+                size = conn.execute('SELECT count(*) FROM watchlist').fetchone()[0]
+            # 调度在其他进程中运行，积压和延迟见那个进程的状态
+            return {'running': False, 'forwarding': True, 'watchlist_size': size,
+                    'watchlist_limit': self.max_items, 'backlog': 0, 'fetch_queue': 0,
+                    'forwarded': self._shared.status()['forwarded']}
+        now = time.time()
+        with self._lock:
+            overdue = [now - i.next_due for i in self._items.values()
+                       if i.next_due <= now and i.name not in self._in_flight]
+            dispatched = self.stats['dispatched']
+            return {
+                'running': self._running,
+                'watchlist_size': len(self._items),
+                'watchlist_limit': self.max_items,
+                'backlog': len(overdue),
+                'fetch_queue': len(self._urgent),
+                'requested': self.stats['requested'],
+                'in_flight': len(self._in_flight),
+                'lag_seconds': round(max(overdue), 1) if overdue else 0.0,
+                'avg_dispatch_lag_seconds': round(self.stats['dispatch_lag_total'] / dispatched, 2) if dispatched else 0.0,
+                'max_dispatch_lag_seconds': round(self.stats['max_dispatch_lag'], 1),
+                'refreshed': self.stats['refreshed'],
+                'failed': self.stats['failed'],
+                'refresh_rate_per_second': self.refresh_rate,
+                'interval_scale': round(self._scale, 2),
+                'workers': self.workers,
+                'forwarding': False
+            }
+
+    def watchlist(self, limit=100):
+        """按优先级排序的关注列表（转交给其他进程时读取数据库中最近写回的状态）"""
+        if self._shared is not None:
+            with self.db.connection() as conn:
+                rows = conn.execute('''
+                    SELECT name, demand, volatility, last_price, last_refreshed, pinned FROM watchlist
+                ''').fetchall()
+            items = sorted((WatchItem(row[0], row[1] or 0.0, row[2] or 0.0, row[3], row[4], bool(row[5]))
+                            for row in rows), key=lambda i: -self._weight(i))[:limit]
+            for item in items:
+                item.next_due = item.last_refreshed + self._interval(item) if item.last_refreshed else None
+            return [self._watch_entry(i) for i in items]
+        with self._lock:
+            items = sorted(self._items.values(), key=lambda i: -self._weight(i))[:limit]
+            return [self._watch_entry(i) for i in items]
+
+    def _watch_entry(self, i):
+        return {
+            'name': i.name,
+            'pinned': i.pinned,
+            'demand': round(i.demand, 2),
+            'volatility': round(i.volatility, 4),
+            'refresh_interval_seconds': round(self._interval(i)),
+            'last_refreshed': i.last_refreshed,
+            'next_due': i.next_due
+        }
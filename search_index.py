@@ -0,0 +1,165 @@
+# 物品名称搜索索引（三元组倒排索引，只依赖标准库）
+import bisect
+import heapq
+import re
+import threading
+from collections import Counter
+
+_SEPARATORS = re.compile(r'[\s|()\[\]™★,\-]+')
+
+
+def normalize(text):
+    """统一大小写并去掉分隔符，返回词列表"""
+    return [token for token in _SEPARATORS.split(text.lower()) if token]
+
+
+def _index_tokens(tokens):
+    """名称的词再加上相邻两个词拼接成的词，不输入分隔符的 ak47、m4a1s、hyperbeast 也能匹配"""
+    return tokens + [a + b for a, b in zip(tokens, tokens[1:])]
+
+
+def _token_grams(token, complete=True):
+    # 词首补两个空格，一两个字母的前缀也能命中；未输入完的词不加词尾
+    padded = '  ' + token + (' ' if complete else '')
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _grams(tokens, last_complete=True):
+    grams = set()
+    for i, token in enumerate(tokens):
+        grams |= _token_grams(token, last_complete or i < len(tokens) - 1)
+    return grams
+
+
+def _edit_distance(a, b, limit, prefix=False):
+    """Levenshtein 距离，超过 limit 时提前返回 limit + 1
+
+    prefix=True 时计算 a 与 b 的任意前缀之间的最小距离（用于还在输入的词）
+    """
+    if not prefix and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous) if prefix else previous[-1]
+
+
+def _token_similarity(query_token, token, is_prefix):
+    """两个词的匹配程度（0~1），允许少量拼写错误"""
+    if token == query_token:
+        return 1.0
+    if is_prefix and token.startswith(query_token):
+        return 0.95
+    limit = 1 if len(query_token) <= 5 else 2
+    # 还在输入的词只和名称中词的前缀比较
+    target = token[:len(query_token) + limit] if is_prefix else token
+    distance = _edit_distance(query_token, target, limit, is_prefix)
+    return 0.85 - 0.15 * distance if distance <= limit else 0.0
+
+
+class SearchIndex:
+    """物品名称搜索索引
+
+    每个名称拆成词（连同相邻两个词的拼接）后按三元组建立倒排表，查询时先用三元组重合数挑出候选，
+    再按 词前缀/拼写纠错 匹配和三元组相似度打分。支持随时增量添加名称。
+    """
+    def __init__(self, candidates=200):
+        self.candidates = candidates
+        self._names = []
+        self._ids = {}
+        self._tokens = []
+        self._gram_counts = []
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def add(self, names):
+        """添加名称（已存在的忽略），返回新增数量"""
+        added = 0
+        with self._lock:
+            for name in names:
+                if not name or name in self._ids:
+                    continue
+                tokens = normalize(name)
+                if not tokens:
+                    continue
+                tokens = _index_tokens(tokens)
+                doc_id = len(self._names)
+                grams = _grams(tokens)
+                for gram in grams:
+                    self._postings.setdefault(gram, []).append(doc_id)
+                # 先写好词和三元组数量，最后登记名称，并发查询不会看到不完整的条目
+                self._tokens.append(tokens)
+                self._gram_counts.append(len(grams))
+                self._names.append(name)
+                self._ids[name] = doc_id
+                added += 1
+        return added
+
+    def load_file(self, path):
+        """从每行一个名称的目录文件加载"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return self.add(line.strip() for line in f)
+
+    def search(self, query, limit=10, min_score=50):
+        """返回 [(名称, 分数0~100), ...]，按分数从高到低排列"""
+        tokens = normalize(query)
+        if not tokens:
+            return []
+        # 查询末尾没有空格时，最后一个词视为还在输入的前缀
+        last_complete = query[-1:].isspace()
+        grams = _grams(tokens, last_complete)
+
+        size = len(self._names)
+        counts = Counter()
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if not postings:
+                continue
+            if postings[-1] >= size:
+                # 忽略正在添加、还没登记完成的名称
+                postings = postings[:bisect.bisect_left(postings, size)]
+            counts.update(postings)
+        if not counts:
+            return []
+
+        # 名称中的词大量重复（磨损程度、武器名），同一次查询内缓存词的匹配结果
+        memos = [{} for _ in tokens]
+        prefix_flags = [not last_complete and i == len(tokens) - 1 for i in range(len(tokens))]
+
+        scored = []
+        for doc_id, shared in counts.most_common(self.candidates):
+            name_tokens = self._tokens[doc_id]
+            token_score = 0.0
+            for query_token, memo, is_prefix in zip(tokens, memos, prefix_flags):
+                best = 0.0
+                for token in name_tokens:
+                    similarity = memo.get(token)
+                    if similarity is None:
+                        similarity = memo[token] = _token_similarity(query_token, token, is_prefix)
+                    if similarity > best:
+                        best = similarity
+                token_score += best
+            token_score /= len(tokens)
+            dice = 2 * shared / (len(grams) + self._gram_counts[doc_id])
+            score = round(100 * (0.75 * token_score + 0.25 * dice), 1)
+            if score >= min_score:
+                # 分数相同时名称短的排前面
+                scored.append((score, -len(self._names[doc_id]), doc_id))
+
+        return [(self._names[doc_id], score) for score, _, doc_id in heapq.nlargest(limit, scored)]
+
+    def suggest(self, query, limit=10):
+        """只返回名称列表"""
+        return [name for name, _ in self.search(query, limit)]
+
@@ -0,0 +1,195 @@
+# 多进程部署时进程之间共享的状态（只依赖标准库）
+#
+# 后台任务（刷新调度、保留策略、目录同步）和价格提醒只在拿到文件锁的后台进程中运行，
+# 其他工作进程通过数据库和它交换数据，不需要额外的服务：
+# - 每个进程写入价格时在同一事务中追加到 price_feed 表，各进程每秒读取其他进程写入的价格，
+#   交给实时推送、搬砖价格簿、分析缓存和搜索索引（后台进程还交给价格提醒）
+# - 其他进程（例如后台进程的目录同步）新加入 items 表的物品加入本进程的搜索索引
+# - 工作进程收到的查询需求、优先抓取和关注列表修改写入 scheduler_requests 表，由后台进程的调度器执行
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 调度请求的动作
+DEMAND = 'demand'
+REFRESH = 'refresh'
+ADD = 'add'
+REMOVE = 'remove'
+
+
+class SharedState:
+    """通过数据库在进程之间传递新价格、新物品和调度请求
+
+    publish 作为写入管道的事务钩子；start() 启动的线程每隔 interval 秒读取其他进程写入的价格和物品，
+    交给 add_listener / add_item_listener 登记的回调。后台进程传入调度器，同时执行其他进程转交的调度请求。
+    超过 retention 秒的价格和请求由任一进程定期删除。
+    """
+    def __init__(self, db, interval=1.0, retention=600, batch_size=5000):
+        self.db = db
+        self.interval = interval
+        self.retention = retention
+        self.batch_size = batch_size
+        self.scheduler = None
+        self._listeners = []
+        self._item_listeners = []
+        self._feed_cursor = None
+        self._item_cursor = None
+        self._last_prune = 0.0
+        self._outbox = []    # 等待写入的调度请求 (动作, 名称, 时间)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'published': 0, 'received': 0, 'items': 0, 'forwarded': 0, 'applied': 0}
+
+    def add_listener(self, callback):
+        """登记其他进程写入的价格的回调，参数与写入管道的回调相同（物品ID为 None）"""
+        self._listeners.append(callback)
+
+    def add_item_listener(self, callback):
+        """登记其他进程新加入物品目录的回调，参数为物品名称列表"""
+        self._item_listeners.append(callback)
+
+    # ---- 价格 ----
+
+    def publish(self, conn, rows):
+        """写入管道的事务钩子：和价格一起提交，写入顺序即读取顺序"""
+        if not rows:
+            return
+        pid, now = os.getpid(), time.time()
+        conn.executemany('''
+            INSERT INTO price_feed (pid, item_name, ts, source, price, volume, written_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(pid, name, ts, source, price, volume, now) for name, _, ts, source, price, volume in rows])
+        self.stats['published'] += len(rows)
+
+    def _poll_prices(self):
+        with self.db.connection() as conn:
+            rows = conn.execute('''
+                SELECT seq, pid, item_name, ts, source, price, volume FROM price_feed
+                WHERE seq > ? ORDER BY seq LIMIT ?
+            ''', (self._feed_cursor, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+        self._feed_cursor = rows[-1][0]
+        # 本进程写入的价格已经由写入管道直接交给回调
+        pid = os.getpid()
+        rows = [(name, None, ts, source, price, volume)
+                for _, writer, name, ts, source, price, volume in rows if writer != pid]
+        if rows:
+            self.stats['received'] += len(rows)
+            self._notify(self._listeners, rows)
+        return len(rows)
+
+    def _poll_items(self):
+        with self.db.connection() as conn:
+            rows = conn.execute('SELECT id, name FROM items WHERE id > ? ORDER BY id LIMIT ?',
+                                (self._item_cursor, self.batch_size)).fetchall()
+        if rows:
+            self._item_cursor = rows[-1][0]
+            self.stats['items'] += len(rows)
+            self._notify(self._item_listeners, [row[1] for row in rows])
+        return len(rows)
+
+    def _notify(self, callbacks, payload):
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"共享状态回调失败: {e}")
+
+    # ---- 调度请求 ----
+
+    def forward(self, action, names):
+        """工作进程把调度请求转交给后台进程；先放在内存中，由读取线程批量写入，不占用请求线程"""
+        now = time.time()
+        with self._lock:
+            self._outbox.extend((action, name, now) for name in names)
+
+    def flush(self):
+        """写入等待转交的调度请求"""
+        with self._lock:
+            outbox, self._outbox = self._outbox, []
+        if not outbox:
+            return 0
+        with self.db.connection(metrics.DB_WRITE) as conn:
+            conn.executemany('INSERT INTO scheduler_requests (action, name, created_at) VALUES (?, ?, ?)', outbox)
+        self.stats['forwarded'] += len(outbox)
+        return len(outbox)
+
+    def _apply_requests(self):
+        with self.db.connection() as conn:
+            rows = conn.execute('SELECT id, action, name FROM scheduler_requests ORDER BY id LIMIT ?',
+                                (self.batch_size,)).fetchall()
+        if not rows:
+            return 0
+        for _, action, name in rows:
+            try:
+                if action == DEMAND:
+                    self.scheduler.record_request(name, verified=True)
+                elif action == REFRESH:
+                    self.scheduler.request_refresh(name, verified=True)
+                elif action == ADD:
+                    self.scheduler.add_items([name])
+                elif action == REMOVE:
+                    self.scheduler.remove_items([name])
+            except Exception as e:
+                logger.error(f"执行转交的调度请求 {action} {name} 失败: {e}")
+        with self.db.connection(metrics.DB_WRITE) as conn:
+            conn.execute('DELETE FROM scheduler_requests WHERE id <= ?', (rows[-1][0],))
+        self.stats['applied'] += len(rows)
+        return len(rows)
+
+    # ---- 后台线程 ----
+
+    def prune(self, now=None):
+        """删除超过 retention 秒的价格和没有被执行的请求（没有后台进程时）"""
+        cutoff = (now or time.time()) - self.retention
+        with self.db.connection(metrics.DB_WRITE) as conn:
+            conn.execute('DELETE FROM price_feed WHERE written_at < ?', (cutoff,))
+            conn.execute('DELETE FROM scheduler_requests WHERE created_at < ?', (cutoff,))
+
+    def start(self, scheduler=None):
+        """从当前位置开始读取（不回放启动前的数据）；后台进程传入调度器"""
+        if self._thread:
+            return
+        self.scheduler = scheduler
+        with self.db.connection() as conn:
+            self._feed_cursor = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM price_feed').fetchone()[0]
+            self._item_cursor = conn.execute('SELECT COALESCE(MAX(id), 0) FROM items').fetchone()[0]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='shared-state', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def poll(self):
+        """写入本进程转交的调度请求，读取一次其他进程的价格、物品和调度请求，返回处理的条数"""
+        self.flush()
+        handled = self._poll_prices() + self._poll_items()
+        if self.scheduler is not None:
+            handled += self._apply_requests()
+        if time.monotonic() - self._last_prune > 60:
+            self._last_prune = time.monotonic()
+            self.prune()
+        return handled
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"读取共享状态失败: {e}")
+
+    def status(self):
+        return dict(self.stats, pid=os.getpid(), background=self.scheduler is not None,
+                    running=self._thread is not None, pending=len(self._outbox))
@@ -4,52 +4,73 @@ CS:GO皮肤价格查询器 - 简化版本
 使用Python内置库创建的HTTP服务器
 """
 
+import argparse
+import collections
 import http.server
-import socketserver
 import json
+import queue
+import selectors
+import socket
 import urllib.parse
 import urllib.request
-import sqlite3
 import os
 import threading
 import time
-from datetime import datetime, timedelta
 
-# 初始化数据库
+from db import db_pool
+from pricing import PriceRecord
+from storage import SQLiteStorage, history_response
+from search_index import SearchIndex
+import http_cache
+import metrics
+from asset_cache import AssetCache
+from alerts import AlertEngine, default_sinks
+
+# Steam市场地址，压测时可以指向本地的 fake_market.py
+STEAM_URL = os.environ.get('CSGO_STEAM_URL', 'https://steamcommunity.com')
+
+# 价格存储（与 app.py 共用同一套写入和查询逻辑）
+storage = SQLiteStorage(db_pool)
+
+# 常见物品（用于搜索建议）
+CSGO_ITEMS = [
+    "AK-47 | Redline", "AK-47 | Vulcan", "AK-47 | Asiimov",
+    "M4A4 | Asiimov", "M4A4 | Howl", "AWP | Dragon Lore",
+    "AWP | Asiimov", "Glock-18 | Water Elemental"
+]
+
+# 物品搜索索引
+search_index = SearchIndex()
+
+# 价格提醒（规则由 app.py 的接口或 alerts.py 命令行管理，这里只在写入价格时检查）
+alert_engine = AlertEngine(db_pool, default_sinks())
+
+# 静态资源和首页的内存缓存（预压缩，文件修改后自动重新加载）
+assets = AssetCache()
+
+# 初始化数据库（建表和结构升级都由 migrations 负责），并加载搜索索引和价格提醒规则
 def init_db():
-    conn = sqlite3.connect('csgo_prices.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            display_name TEXT NOT NULL,
-            icon_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            item_id INTEGER,
-            price REAL NOT NULL,
-            source TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (item_id) REFERENCES items (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    storage.init()
+    search_index.add(CSGO_ITEMS)
+    search_index.add(storage.item_names())
+    alert_engine.load()
+
+def load_assets():
+    """加载静态资源；首页中的静态文件地址替换为带内容哈希的地址"""
+    assets.add_directory('static', prefix='static/')
+    assets.add_file('index.html', 'templates/index.html', transform=assets.render_static_urls)
 
 class SteamAPI:
     @staticmethod
     def get_item_price(item_name):
         """获取Steam市场价格（演示版本）"""
+        with metrics.span(metrics.CRAWLER):
+            return SteamAPI._get_item_price(item_name)
+    
+    @staticmethod
+    def _get_item_price(item_name):
         # 首先尝试真实API
-        url = "https://steamcommunity.com/market/priceoverview/"
+        url = f"{STEAM_URL}/market/priceoverview/"
         params = {
             'appid': 730,
             'currency': 1,
@@ -70,12 +91,10 @@ class SteamAPI:
                 if response.getcode() == 200:
                     data = json.loads(response.read().decode())
                     if data.get('success'):
-                        return {
-                            'lowest_price': data.get('lowest_price', 'N/A'),
-                            'median_price': data.get('median_price', 'N/A'),
-                            'volume': data.get('volume', 'N/A'),
-                            'source': 'Steam Market'
-                        }
+                        record = PriceRecord.from_strings('Steam Market', data.get('lowest_price'),
+                                                          data.get('median_price'), data.get('volume'))
+                        if record:
+                            return record
         except Exception as e:
             print(f"Steam API连接失败，使用演示数据: {e}")
         
@@ -88,97 +107,96 @@ class SteamAPI:
         import random
         import hashlib
         
-        # 基于物品名称生成一致的随机价格
+        # 基于物品名称生成一致的随机价格；用独立的随机数生成器，工作线程之间互不影响
         seed = int(hashlib.md5(item_name.encode()).hexdigest()[:8], 16)
-        random.seed(seed)
+        rng = random.Random(seed)
         
         # 根据物品名称设置价格范围
         if 'Dragon Lore' in item_name:
-            base_price = random.uniform(2000, 5000)
+            base_price = rng.uniform(2000, 5000)
         elif 'Howl' in item_name:
-            base_price = random.uniform(1500, 3000)
+            base_price = rng.uniform(1500, 3000)
         elif 'Fire Serpent' in item_name:
-            base_price = random.uniform(800, 1500)
+            base_price = rng.uniform(800, 1500)
         elif 'AK-47' in item_name:
-            base_price = random.uniform(20, 300)
+            base_price = rng.uniform(20, 300)
         elif 'AWP' in item_name:
-            base_price = random.uniform(50, 500)
+            base_price = rng.uniform(50, 500)
         elif 'M4A4' in item_name:
-            base_price = random.uniform(15, 200)
+            base_price = rng.uniform(15, 200)
         else:
-            base_price = random.uniform(5, 100)
+            base_price = rng.uniform(5, 100)
         
-        lowest = base_price * 0.9
-        median = base_price * 1.1
-        volume = random.randint(50, 500)
+        lowest = int(base_price * 90)
+        median = int(base_price * 110)
+        volume = rng.randint(50, 500)
         
-        return {
-            'lowest_price': f'${lowest:.2f}',
-            'median_price': f'${median:.2f}',
-            'volume': str(volume),
-            'source': 'Demo Data (Steam API限制时的演示)'
-        }
+        return PriceRecord('Demo Data (Steam API限制时的演示)', 'USD',
+                           lowest=lowest, median=median, volume=volume)
 
-def save_item_price(item_name, price_data, source="steam"):
-    """保存价格到数据库"""
-    conn = sqlite3.connect('csgo_prices.db')
-    cursor = conn.cursor()
-    
-    # 插入或获取物品
-    cursor.execute('INSERT OR IGNORE INTO items (name, display_name) VALUES (?, ?)', 
-                   (item_name, item_name))
-    
-    cursor.execute('SELECT id FROM items WHERE name = ?', (item_name,))
-    result = cursor.fetchone()
-    if result:
-        item_id = result[0]
-        
-        # 保存价格数据
-        if price_data and price_data.get('median_price'):
-            price_str = price_data['median_price'].replace('$', '').replace(',', '')
-            try:
-                price = float(price_str)
-                cursor.execute('INSERT INTO prices (item_id, price, source) VALUES (?, ?, ?)',
-                              (item_id, price, source))
-            except ValueError:
-                pass
-    
-    conn.commit()
-    conn.close()
+def save_item_price(item_name, record, source="steam"):
+    """保存价格到数据库（价格换算成基准货币）"""
+    price = record.reference_base() if record else None
+    if price is not None:
+        rows = storage.save_prices([(item_name, int(time.time()), source, price / 100, record.volume)])
+        search_index.add([item_name])
+        alert_engine.evaluate(rows)
 
 def get_price_history(item_name):
-    """获取价格历史"""
-    conn = sqlite3.connect('csgo_prices.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT p.price, p.timestamp, p.source
-        FROM prices p
-        JOIN items i ON p.item_id = i.id
-        WHERE i.name = ?
-        ORDER BY p.timestamp DESC
-        LIMIT 50
-    ''', (item_name,))
-    
-    history = []
-    for row in cursor.fetchall():
-        history.append({
-            'price': row[0],
-            'timestamp': row[1],
-            'source': row[2]
-        })
-    
-    conn.close()
-    return history
+    """获取价格历史（与 app.py 返回的字段一致）"""
+    return history_response(storage.get_history(item_name, limit=50))
 
 class CSGOPriceHandler(http.server.SimpleHTTPRequestHandler):
     """自定义HTTP请求处理器"""
     
+    # HTTP/1.1 默认保持连接，所有响应都必须带 Content-Length
+    protocol_version = 'HTTP/1.1'
+    # 读取一个请求的超时时间（秒）；请求之间的空闲等待由服务器的 selector 负责，不占用工作线程
+    timeout = 5
+    # 响应头和响应体分两次写出，关闭 Nagle 算法避免保持连接时每个请求多等40ms
+    disable_nagle_algorithm = True
+    
+    def handle(self):
+        """处理一个请求以及已经收到的流水线请求，不在这里阻塞等待下一个请求"""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.request_buffered():
+            self.handle_one_request()
+    
+    def request_buffered(self):
+        """缓冲区或 socket 中是否已经有下一个请求的数据（不阻塞）"""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
     def do_GET(self):
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
         query_params = urllib.parse.parse_qs(parsed_path.query)
         
+        self.status_code = 500
+        ctx = metrics.registry.begin_request(self.endpoint_name(path), 'GET')
+        try:
+            self.route(path, query_params)
+        finally:
+            metrics.registry.end_request(ctx, self.status_code)
+    
+    @staticmethod
+    def endpoint_name(path):
+        """指标中使用的路由名称，物品名等路径参数不计入"""
+        if path in ('/', '/api/search', '/metrics', '/metrics/slow'):
+            return path
+        for prefix, name in (('/api/price/', '/api/price/<item_name>'), ('/api/chart/', '/api/chart/<item_name>'),
+                             ('/static/', '/static/<path>')):
+            if path.startswith(prefix):
+                return name
+        return 'unmatched'
+    
+    def route(self, path, query_params):
         if path == '/':
             self.serve_index()
         elif path.startswith('/api/price/'):
@@ -193,21 +211,26 @@ class CSGOPriceHandler(http.server.SimpleHTTPRequestHandler):
             item_name = urllib.parse.unquote(item_name)
             self.handle_chart_request(item_name)
         elif path.startswith('/static/'):
-            self.serve_static_file(path)
+            self.serve_static_file(path, query_params)
+        elif path == '/metrics':
+            self.send_body(metrics.registry.render().encode('utf-8'), metrics.CONTENT_TYPE, cache_control='no-store')
+        elif path == '/metrics/slow':
+            self.send_json_response({'enabled': metrics.registry.profiler is not None,
+                                     'requests': metrics.registry.slow_requests()})
         else:
             self.send_error(404)
     
+    def send_response(self, code, message=None):
+        # 记录状态码供请求耗时指标使用
+        self.status_code = code
+        super().send_response(code, message)
+    
     def serve_index(self):
         """提供主页"""
-        try:
-            with open('templates/index.html', 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(content.encode('utf-8'))
-        except FileNotFoundError:
+        asset = assets.get('index.html')
+        if asset:
+            self.send_asset(asset, http_cache.REVALIDATE_CACHE_CONTROL)
+        else:
             # 如果模板文件不存在，提供简单的HTML页面
             html_content = """
 <!DOCTYPE html>
@@ -280,52 +303,69 @@ class CSGOPriceHandler(http.server.SimpleHTTPRequestHandler):
     </script>
 </body>
 </html>"""
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_content.encode('utf-8'))
+            self.send_body(html_content.encode('utf-8'), 'text/html; charset=utf-8')
     
-    def serve_static_file(self, path):
-        """提供静态文件"""
+    def serve_static_file(self, path, query_params):
+        """提供静态文件（只提供启动时加载的 static 目录中的文件）"""
+        asset = assets.get(path[1:])  # 移除开头的 '/'
+        if not asset:
+            self.send_error(404)
+            return
+        
+        # 带版本号的地址内容不会变化，可以永久缓存
+        versioned = 'v' in query_params
+        self.send_asset(asset, http_cache.STATIC_CACHE_CONTROL if versioned else http_cache.REVALIDATE_CACHE_CONTROL)
+    
+    def send_asset(self, asset, cache_control):
+        """发送缓存的资源：处理条件请求，选择预压缩版本，大文件用 sendfile 零拷贝发送"""
+        # 大文件先打开并确认与缓存的 ETag 一致（文件修改过时先重新加载），再决定 ETag 和 Content-Length
+        asset, f = assets.open(asset)
+        if asset is None:
+            self.send_error(404)
+            return
         try:
-            file_path = path[1:]  # 移除开头的 '/'
-            if os.path.exists(file_path):
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                
-                # 根据文件扩展名设置Content-Type
-                if path.endswith('.css'):
-                    content_type = 'text/css'
-                elif path.endswith('.js'):
-                    content_type = 'text/javascript'
-                else:
-                    content_type = 'text/plain'
-                
-                self.send_response(200)
-                self.send_header('Content-Type', content_type)
+            encoding, body, etag = asset.select(self.headers.get('Accept-Encoding'))
+            if http_cache.etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', cache_control)
                 self.end_headers()
-                self.wfile.write(content)
+                return
+            
+            self.send_response(200)
+            self.send_header('Content-Type', asset.content_type)
+            self.send_header('Content-Length', str(len(body) if f is None else asset.size))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            if asset.variants:
+                self.send_header('Vary', 'Accept-Encoding')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            
+            if f is None:
+                self.wfile.write(body)
             else:
-                self.send_error(404)
-        except Exception as e:
-            print(f"提供静态文件失败: {e}")
-            self.send_error(500)
+                self.connection.sendfile(f)
+        finally:
+            if f:
+                f.close()
     
     def handle_price_request(self, item_name):
         """处理价格查询请求"""
         try:
             # 获取Steam价格
-            price_data = SteamAPI.get_item_price(item_name)
+            record = SteamAPI.get_item_price(item_name)
             
-            if price_data:
+            if record:
                 # 保存到数据库
-                save_item_price(item_name, price_data)
+                save_item_price(item_name, record)
                 
                 # 获取历史数据
                 history = get_price_history(item_name)
                 
                 response_data = {
-                    'current_price': price_data,
+                    'current_price': record.to_dict(),
                     'history': history,
                     'item_name': item_name
                 }
@@ -341,17 +381,11 @@ class CSGOPriceHandler(http.server.SimpleHTTPRequestHandler):
     def handle_search_request(self, query):
         """处理搜索请求"""
         try:
-            # 简单的模糊搜索
-            csgo_items = [
-                "AK-47 | Redline", "AK-47 | Vulcan", "AK-47 | Asiimov",
-                "M4A4 | Asiimov", "M4A4 | Howl", "AWP | Dragon Lore",
-                "AWP | Asiimov", "Glock-18 | Water Elemental"
-            ]
-            
-            suggestions = [item for item in csgo_items if query.lower() in item.lower()]
+            # 在本地索引中模糊搜索
+            suggestions = search_index.suggest(query, limit=10)
             
             response_data = {
-                'suggestions': suggestions[:10],
+                'suggestions': suggestions,
                 'steam_results': []
             }
             
@@ -378,29 +412,178 @@ class CSGOPriceHandler(http.server.SimpleHTTPRequestHandler):
             self.send_json_response({'error': 'Chart data failed'}, 500)
     
     def send_json_response(self, data, status_code=200):
-        """发送JSON响应"""
-        json_data = json.dumps(data, ensure_ascii=False, indent=2)
+        """发送JSON响应（紧凑格式）"""
+        self.send_body(http_cache.dumps(data), 'application/json; charset=utf-8', status_code,
+                       extra_headers=[('Access-Control-Allow-Origin', '*')])
+    
+    def send_body(self, body, content_type, status_code=200, cache_control=http_cache.REVALIDATE_CACHE_CONTROL,
+                  extra_headers=()):
+        """发送响应；成功的响应处理 ETag 条件请求并按 Accept-Encoding 压缩"""
+        headers = list(extra_headers)
+        if status_code == 200:
+            status_code, cache_headers, body = http_cache.prepare(body, content_type, self.headers, cache_control)
+            headers.extend(cache_headers)
         
         self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
-        self.send_header('Access-Control-Allow-Origin', '*')
+        if status_code != 304:
+            headers.append(('Content-Type', content_type))
+            headers.append(('Content-Length', str(len(body))))
+        for name, value in headers:
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json_data.encode('utf-8'))
+        if body:
+            self.wfile.write(body)
+
+class ThreadPoolHTTPServer(http.server.HTTPServer):
+    """线程池HTTP服务器
+
+    主线程只负责 accept，连接放进有界队列由固定数量的工作线程处理；
+    队列满时直接返回 503，不会无限堆积请求。
+
+    工作线程每次只处理连接上的一个请求，保持连接的 socket 随后交给空闲连接线程，
+    用 selector 等到下一个请求到达时再放回队列，空闲的长连接不占用工作线程。
+    空闲超过 keepalive_timeout 秒，或空闲连接超过 max_idle 个时，关闭最早的空闲连接。
+    """
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, workers=16, queue_size=128,
+                 keepalive_timeout=5, max_idle=1024):
+        super().__init__(server_address, handler_class)
+        self.keepalive_timeout = keepalive_timeout
+        self.max_idle = max_idle
+        self.connections = queue.Queue(maxsize=queue_size)
+        self._parked = collections.deque()   # 工作线程交回的连接，由空闲连接线程登记
+        self._idle = {}                      # socket -> (地址, 关闭时间)，按放入顺序排列
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._waker = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._closing = threading.Event()
+        self._idle_thread = threading.Thread(target=self._idle_loop, name='http-idle', daemon=True)
+        self._idle_thread.start()
+        self.workers = [threading.Thread(target=self._worker, name=f'http-worker-{i}', daemon=True)
+                        for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def process_request(self, request, client_address):
+        try:
+            self.connections.put_nowait((request, client_address))
+        except queue.Full:
+            try:
+                request.sendall(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n'
+                                b'Retry-After: 1\r\nConnection: close\r\n\r\n')
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _worker(self):
+        while True:
+            item = self.connections.get()
+            if item is None:
+                return
+            request, client_address = item
+            keep_alive = False
+            try:
+                keep_alive = not self.finish_request(request, client_address).close_connection
+            except Exception:
+                self.handle_error(request, client_address)
+            if keep_alive and not self._closing.is_set():
+                self._parked.append((request, client_address))
+                self._wake()
+            else:
+                self.shutdown_request(request)
+
+    def _wake(self):
+        try:
+            self._waker.send(b'\0')
+        except OSError:
+            pass
+
+    def _idle_loop(self):
+        while not self._closing.is_set():
+            timeout = None
+            if self._idle:
+                timeout = max(0, next(iter(self._idle.values()))[1] - time.monotonic())
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wakeup:
+                    try:
+                        while self._wakeup.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                # 下一个请求到达（或对方关闭），交回工作线程
+                request = key.fileobj
+                self._selector.unregister(request)
+                client_address, _ = self._idle.pop(request)
+                self.process_request(request, client_address)
+
+            deadline = time.monotonic() + self.keepalive_timeout
+            while self._parked:
+                request, client_address = self._parked.popleft()
+                self._selector.register(request, selectors.EVENT_READ)
+                self._idle[request] = (client_address, deadline)
+
+            now = time.monotonic()
+            while self._idle:
+                request, (_, expires) = next(iter(self._idle.items()))
+                if expires > now and len(self._idle) <= self.max_idle:
+                    break
+                self._close_idle(request)
+
+        for request in list(self._idle):
+            self._close_idle(request)
+        while self._parked:
+            self.shutdown_request(self._parked.popleft()[0])
+
+    def _close_idle(self, request):
+        self._selector.unregister(request)
+        del self._idle[request]
+        self.shutdown_request(request)
+
+    def idle_connections(self):
+        return len(self._idle)
+
+    def server_close(self):
+        super().server_close()
+        self._closing.set()
+        self._wake()
+        self._idle_thread.join(timeout=5)
+        for _ in self.workers:
+            self.connections.put(None)
+        for worker in self.workers:
+            worker.join(timeout=CSGOPriceHandler.timeout + 1)
+        self._selector.close()
+        self._wakeup.close()
+        self._waker.close()
+
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='CS:GO皮肤价格查询器（零依赖版本）')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=16, help='工作线程数')
+    parser.add_argument('--queue-size', type=int, default=128, help='等待处理的连接数上限，超出时返回503')
+    parser.add_argument('--keepalive-timeout', type=float, default=5, help='空闲连接保持的秒数（空闲连接不占用工作线程）')
+    args = parser.parse_args()
+    
     print("🎮 CS:GO皮肤价格查询器启动中...")
     
     # 初始化数据库
     init_db()
     print("✅ 数据库初始化完成")
     
-    # 设置HTTP服务器
-    PORT = 8000
-    Handler = CSGOPriceHandler
+    load_assets()
+    print(f"✅ 静态资源加载完成: {assets.stats()}")
     
-    with socketserver.TCPServer(("", PORT), Handler) as httpd:
-        print(f"🌐 服务器运行在 http://localhost:{PORT}")
+    # 设置HTTP服务器
+    with ThreadPoolHTTPServer(("", args.port), CSGOPriceHandler, args.workers, args.queue_size,
+                              keepalive_timeout=args.keepalive_timeout) as httpd:
+        print(f"🌐 服务器运行在 http://localhost:{args.port} ({args.workers} 个工作线程)")
         print("💡 提示：使用 Ctrl+C 停止服务器")
         
         try:
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+爬虫响应快照与回放
+record 模式把上游原始响应压缩后写入带索引的本地归档，replay 模式按录制顺序
+确定性地返回这些响应，用于离线全速压测解析、聚合和入库流程。
+没有上游请求的演示数据源（Buff、BitSkins）在这两种模式下按 (数据源, 物品, 第几次请求) 播种，
+回放时生成与录制时相同的价格
+
+使用方法：
+    CSGO_CRAWLER_MODE=record python3 app.py          # 录制
+    CSGO_CRAWLER_MODE=replay python3 app.py          # 回放
+    python3 snapshot.py stats                        # 查看归档内容
+    python3 snapshot.py bench --iterations 5         # 回放基准测试
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+import zlib
+
+ARCHIVE_PATH = os.environ.get('CSGO_SNAPSHOT_PATH', 'crawler_snapshots.db')
+
+
+class SnapshotMissError(Exception):
+    """回放时归档里没有对应的响应"""
+    pass
+
+
+class ReplayResponse:
+    """回放的响应，接口与 requests.Response 中爬虫用到的部分一致"""
+    def __init__(self, url, status_code, content, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def request_key(url, params):
+    """同一个路径和参数组合对应同一个键（与参数顺序和主机地址无关）"""
+    path = urllib.parse.urlparse(url).path
+    query = urllib.parse.urlencode(sorted((params or {}).items()))
+    return hashlib.sha1(f"{path}?{query}".encode('utf-8')).hexdigest()
+
+
+class ResponseArchive:
+    """上游响应归档
+
+    每条响应按 (key, seq) 建索引，响应体用 zlib 压缩。回放时每个键维护
+    一个游标，按录制顺序依次返回，用完后停在最后一条。
+    """
+    def __init__(self, path=ARCHIVE_PATH, mode='replay'):
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                params TEXT NOT NULL,
+                label TEXT,
+                status INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                latency REAL,
+                recorded_at REAL NOT NULL,
+                PRIMARY KEY (key, seq)
+            ) WITHOUT ROWID
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_label ON responses (label)')
+        self._conn.commit()
+        self._next_seq = {}
+        self._cursors = {}
+        self._cache = {}
+        self._demo_seq = {}
+
+    def record(self, url, params, response, latency=None):
+        """保存一条上游响应"""
+        key = request_key(url, params)
+        params = params or {}
+        # 只给价格查询打上物品名称，搜索请求不计入
+        label = params.get('market_hash_name') or params.get('name')
+        with self._lock:
+            seq = self._next_seq.get(key)
+            if seq is None:
+                row = self._conn.execute('SELECT MAX(seq) FROM responses WHERE key = ?', (key,)).fetchone()
+                seq = (row[0] + 1) if row[0] is not None else 0
+            self._next_seq[key] = seq + 1
+            self._conn.execute('''
+                INSERT INTO responses (key, seq, url, params, label, status, body, latency, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, seq, url, json.dumps(params, ensure_ascii=False, sort_keys=True), label,
+                  response.status_code, zlib.compress(response.content, 6), latency, time.time()))
+            self._conn.commit()
+
+    def _load(self, key):
+        rows = self._conn.execute(
+            'SELECT url, status, body FROM responses WHERE key = ? ORDER BY seq', (key,)).fetchall()
+        # 解压后缓存在内存中，回放时不再有磁盘和解压开销
+        return [ReplayResponse(url, status, zlib.decompress(body)) for url, status, body in rows]
+
+    def replay(self, url, params):
+        """按录制顺序返回下一条响应"""
+        key = request_key(url, params)
+        with self._lock:
+            responses = self._cache.get(key)
+            if responses is None:
+                responses = self._cache[key] = self._load(key)
+            if not responses:
+                raise SnapshotMissError(f"归档中没有该请求的响应: {url} {params}")
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            return responses[min(index, len(responses) - 1)]
+
+    def next_demo_seq(self, source, item_name):
+        """演示数据源对这个物品的第几次请求，用作随机数种子的一部分"""
+        key = (source, item_name)
+        with self._lock:
+            seq = self._demo_seq.get(key, 0)
+            self._demo_seq[key] = seq + 1
+            return seq
+
+    def rewind(self):
+        """重置回放游标，使下一轮回放与上一轮完全一致"""
+        with self._lock:
+            self._cursors.clear()
+            self._demo_seq.clear()
+
+    def labels(self):
+        """归档中出现过的物品名称"""
+        rows = self._conn.execute('''
+            SELECT DISTINCT label FROM responses WHERE label IS NOT NULL ORDER BY label
+        ''').fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        row = self._conn.execute('''
+            SELECT COUNT(*), COUNT(DISTINCT key), SUM(LENGTH(body)), AVG(latency)
+            FROM responses
+        ''').fetchone()
+        return {
+            'path': self.path,
+            'responses': row[0],
+            'distinct_requests': row[1],
+            'compressed_bytes': row[2] or 0,
+            'avg_recorded_latency_ms': round(row[3] * 1000, 1) if row[3] else None,
+            'items': len(self.labels())
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def archive_from_env():
+    """根据 CSGO_CRAWLER_MODE 创建归档，未开启时返回 None"""
+    mode = os.environ.get('CSGO_CRAWLER_MODE', '').lower()
+    if mode in ('record', 'replay'):
+        return ResponseArchive(ARCHIVE_PATH, mode)
+    return None
+
+
+def bench(iterations=3, items=None):
+    """回放归档，测量 解析 -> 聚合 -> 入库 流程的吞吐量"""
+    os.environ.setdefault('CSGO_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    import app
+    from crawlers import multi_crawler
+
+    archive = ResponseArchive(ARCHIVE_PATH, 'replay')
+    multi_crawler.set_archive(archive)
+    app.init_db()
+
+    items = items or archive.labels()
+    if not items:
+        print("❌ 归档为空，请先用 CSGO_CRAWLER_MODE=record 录制")
+        return
+
+    timings = {'fetch_parse': 0.0, 'store': 0.0}
+    start = time.perf_counter()
+    for _ in range(iterations):
+        archive.rewind()
+        for item in items:
+            t0 = time.perf_counter()
+            market_data = multi_crawler.get_best_price(item)
+            t1 = time.perf_counter()
+            if market_data:
+                app.price_writer.submit(item, market_data['all_sources'])
+            timings['store'] += time.perf_counter() - t1
+            timings['fetch_parse'] += t1 - t0
+    t2 = time.perf_counter()
+    app.price_writer.flush()
+    timings['store'] += time.perf_counter() - t2
+    elapsed = time.perf_counter() - start
+
+    total = iterations * len(items)
+    print(f"📦 回放 {len(items)} 个物品 × {iterations} 轮, 共 {total} 次")
+    print(f"⏱️  总耗时 {elapsed:.3f}s, {total / elapsed:.1f} 物品/秒")
+    for phase, seconds in timings.items():
+        print(f"   {phase:<12} {seconds:.3f}s ({seconds / total * 1000:.2f} ms/物品)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫响应快照工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help='查看归档统计')
+    bench_parser = sub.add_parser('bench', help='回放归档做基准测试')
+    bench_parser.add_argument('--iterations', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        print(json.dumps(ResponseArchive(ARCHIVE_PATH).stats(), indent=2, ensure_ascii=False))
+    elif args.command == 'bench':
+        bench(args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# 启动耗时统计（只依赖标准库）
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 按需导入的重量级依赖，报告里列出启动结束时已经被导入的那些
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'matplotlib', 'plotly')
+
+
+class StartupTimer:
+    """记录进程启动各阶段的耗时：mark() 记录距上一个标记的时间，phase() 记录一段代码的时间"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []
+        self.finished = None
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases.append((name, now - begin))
+            self._last = now
+
+    def finish(self):
+        """标记启动完成，只记录第一次（预派生的工作进程沿用父进程的启动耗时）"""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def report(self):
+        end = self.finished or time.perf_counter()
+        report = {
+            'total_seconds': round(end - self.started, 4),
+            'phases': [{'name': name, 'seconds': round(seconds, 4)} for name, seconds in self.phases],
+            'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+            'modules': len(sys.modules)
+        }
+        if resource is not None:
+            # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+            scale = 1 if sys.platform == 'darwin' else 1024
+            report['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+        return report
+
+    def print_report(self):
+        report = self.report()
+        print(f"⏱️ 启动耗时 {report['total_seconds']:.2f}s，已加载 {report['modules']} 个模块，"
+              f"内存峰值 {report.get('max_rss_mb', '?')} MB")
+        for phase in report['phases']:
+            print(f"   - {phase['name']}: {phase['seconds'] * 1000:.0f} ms")
+        if report['heavy_modules']:
+            print(f"   已导入重量级依赖: {', '.join(report['heavy_modules'])}")
+
+
+# 进程级的计时器，第一次导入本模块时开始计时
+startup_timer = StartupTimer()
@@ -4,6 +4,9 @@ class CSGOPriceTracker {
     constructor() {
         this.currentChart = null;
         this.searchTimeout = null;
+        this.priceStream = null;
+        this.lastPriceTs = 0;
+        this.storedQuote = false;
         this.init();
     }
 
@@ -112,6 +115,7 @@ class CSGOPriceTracker {
             const response = await axios.get(`/api/price/${encodeURIComponent(query)}`);
             this.displayResults(response.data);
             await this.loadPriceChart(query);
+            this.subscribePrices(response.data.item_name);
         } catch (error) {
             console.error('搜索失败:', error);
             if (error.response && error.response.status === 404) {
@@ -134,14 +138,22 @@ class CSGOPriceTracker {
         
         // 更新价格信息
         const currentPrice = data.current_price;
+        // cached 模式只返回数据库中的美元价格，之后由实时推送更新
+        this.storedQuote = data.mode === 'cached';
         if (currentPrice) {
-            document.getElementById('lowestPrice').textContent = currentPrice.lowest_price || '-';
+            document.getElementById('lowestPrice').textContent = currentPrice.lowest_price ||
+                (currentPrice.price != null ? `$${currentPrice.price.toFixed(2)}` : '-');
             document.getElementById('medianPrice').textContent = currentPrice.median_price || '-';
             document.getElementById('volume').textContent = currentPrice.volume || '-';
+        } else {
+            ['lowestPrice', 'medianPrice', 'volume'].forEach(id => {
+                document.getElementById(id).textContent = '-';
+            });
         }
 
         // 更新历史价格表格
         this.updateHistoryTable(data.history);
+        this.lastPriceTs = data.history && data.history.length > 0 ? data.history[0].ts : 0;
         
         // 隐藏建议
         document.getElementById('suggestions').style.display = 'none';
@@ -153,15 +165,7 @@ class CSGOPriceTracker {
 
         if (history && history.length > 0) {
             history.slice(0, 20).forEach(record => {
-                const row = document.createElement('tr');
-                row.innerHTML = `
-                    <td>${new Date(record.timestamp).toLocaleString('zh-CN')}</td>
-                    <td class="fw-bold">$${record.price.toFixed(2)}</td>
-                    <td>
-                        <span class="badge bg-primary">${record.source}</span>
-                    </td>
-                `;
-                tbody.appendChild(row);
+                tbody.appendChild(this.createHistoryRow(record));
             });
         } else {
             const row = document.createElement('tr');
@@ -170,6 +174,68 @@ class CSGOPriceTracker {
         }
     }
 
+    createHistoryRow(record) {
+        const row = document.createElement('tr');
+        row.innerHTML = `
+            <td>${new Date(record.ts * 1000).toLocaleString('zh-CN')}</td>
+            <td class="fw-bold">$${record.price.toFixed(2)}</td>
+            <td>
+                <span class="badge bg-primary">${record.source}</span>
+            </td>
+        `;
+        return row;
+    }
+
+    subscribePrices(itemName) {
+        // 订阅实时价格：后台刷新写入新价格时由服务器推送，不需要重复请求价格接口
+        if (this.priceStream) {
+            this.priceStream.close();
+        }
+        if (!window.EventSource) {
+            return;
+        }
+        this.priceStream = new EventSource(`/api/stream?item=${encodeURIComponent(itemName)}`);
+        this.priceStream.addEventListener('price', (e) => {
+            const update = JSON.parse(e.data);
+            if (update.item_name === itemName) {
+                this.applyPriceUpdate(update);
+            }
+        });
+    }
+
+    applyPriceUpdate(update) {
+        // 连接时补发的价格可能已经显示过
+        if (update.ts <= this.lastPriceTs) {
+            return;
+        }
+        this.lastPriceTs = update.ts;
+
+        // 新价格插入历史表格顶部
+        const tbody = document.getElementById('historyTable');
+        if (!tbody.querySelector('tr td.fw-bold')) {
+            tbody.innerHTML = '';
+        }
+        const prices = Object.entries(update.sources).map(([source, record]) => ({...record, source}));
+        if (this.storedQuote) {
+            const best = Math.min(...prices.map(record => record.price));
+            document.getElementById('lowestPrice').textContent = `$${best.toFixed(2)}`;
+        }
+        prices.forEach(record => {
+            tbody.insertBefore(this.createHistoryRow(record), tbody.firstChild);
+        });
+        while (tbody.children.length > 20) {
+            tbody.removeChild(tbody.lastChild);
+        }
+
+        // 各数据源的平均价追加到图表末尾
+        if (this.currentChart) {
+            const average = prices.reduce((sum, record) => sum + record.price, 0) / prices.length;
+            this.currentChart.data.labels.push(new Date(update.ts * 1000).toLocaleDateString('zh-CN'));
+            this.currentChart.data.datasets[0].data.push(Math.round(average * 100) / 100);
+            this.currentChart.update('none');
+        }
+    }
+
     async loadPriceChart(itemName) {
         try {
             const response = await axios.get(`/api/chart/${encodeURIComponent(itemName)}`);
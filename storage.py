@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+价格存储后端
+SQLiteStorage 是在线读写使用的主存储；ArchiveStorage 把历史价格按月分区写成
+Parquet / Arrow IPC 列式文件，用于对几个月的历史做向量化分析。
+
+价格行统一为 (item_name, ts, source, price, volume)，price 为基准货币（美元）。
+两个后端的 save_prices 签名和返回值相同，可以互相替换交给 write_pipeline.PriceWriter。
+
+使用方法：
+    python3 storage.py export                    # 把 SQLite 中的原始价格导出到归档
+    python3 storage.py export --days 7           # 只导出最近7天
+    python3 storage.py compact                   # 合并每个分区的小文件并去重
+"""
+
+import argparse
+import glob
+import itertools
+import logging
+import os
+import time
+
+import metrics
+import rollups
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PATH = os.environ.get('CSGO_ARCHIVE_PATH', 'price_archive')
+
+COLUMNS = ['item_name', 'ts', 'source', 'price', 'volume']
+
+
+class PriceStorage:
+    """存储后端接口"""
+
+    def init(self):
+        """创建或升级存储结构"""
+        pass
+
+    def save_prices(self, rows, hooks=()):
+        """写入价格行，已存在的 (物品, 时间, 数据源) 保留先写入的价格
+
+        hooks(conn, rows) 在写入提交前执行，任何一个失败时整批不写入；没有数据库连接的后端传入 None。
+        返回实际写入的行 [(item_name, item_id, ts, source, price, volume), ...]，没有物品ID的后端 item_id 为 None
+        """
+        raise NotImplementedError
+
+    def get_history(self, item_name, limit=100):
+        """最近的价格，按时间倒序，每条为 {'price', 'ts', 'source'}"""
+        raise NotImplementedError
+
+    def scan(self, item_names=None, since=None, until=None):
+        """按物品和时间范围读取价格，返回 COLUMNS 列的 pandas.DataFrame"""
+        raise NotImplementedError
+
+
+class SQLiteStorage(PriceStorage):
+    """SQLite 主存储，写入价格时在同一事务中维护 OHLC 聚合"""
+
+    def __init__(self, db):
+        self.db = db
+        self._item_ids = {}
+
+    def init(self):
+        self.db.migrate()
+
+    def _resolve_item_ids(self, conn, names):
+        """批量获取物品ID，未缓存的物品一次性插入和查询"""
+        missing = [name for name in names if name not in self._item_ids]
+        if missing:
+            conn.executemany('INSERT OR IGNORE INTO items (name, display_name) VALUES (?, ?)',
+                             [(name, name) for name in missing])
+            # 分批查询，避免超过 SQLite 的参数数量限制
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for row in conn.execute(f'SELECT id, name FROM items WHERE name IN ({placeholders})', chunk):
+                    self._item_ids[row[1]] = row[0]
+        return self._item_ids
+
+    def save_prices(self, rows, hooks=()):
+        """在一个事务中写入价格和聚合，hooks(conn, rows) 在同一事务中执行
+
+        已存在的 (物品, 时间, 数据源) 保留先写入的价格，重复的行不写入，也不计入聚合。
+        返回实际写入的行 [(item_name, item_id, ts, source, price, volume), ...]
+        """
+        try:
+            with self.db.transaction() as conn:
+                item_ids = self._resolve_item_ids(conn, {row[0] for row in rows})
+                inserted = []
+                for name, ts, source, price, volume in rows:
+                    row = (name, item_ids[name], ts, source, price, volume)
+                    if conn.execute('INSERT OR IGNORE INTO prices (item_id, ts, source, price, volume) VALUES (?, ?, ?, ?, ?)',
+                                    row[1:]).rowcount:
+                        inserted.append(row)
+                rows = inserted
+                rollups.apply(conn, rows)
+                for hook in hooks:
+                    hook(conn, rows)
+        except Exception:
+            # 事务回滚后，本批新插入的物品ID可能已失效
+            self._item_ids.clear()
+            raise
+        return rows
+
+    def get_history(self, item_name, limit=100):
+        with self.db.connection() as conn:
+            rows = conn.execute('''
+                SELECT price, ts, source FROM prices
+                WHERE item_id = (SELECT id FROM items WHERE name = ?)
+                ORDER BY ts DESC
+                LIMIT ?
+            ''', (item_name, limit)).fetchall()
+        return [{'price': row[0], 'ts': row[1], 'source': row[2]} for row in rows]
+
+    def item_names(self):
+        with self.db.connection() as conn:
+            return [row[0] for row in conn.execute('SELECT name FROM items')]
+
+    def upsert_items(self, items):
+        """写入物品目录 [{'name', 'display_name', 'icon_url'}, ...]，已有物品更新显示名称和图标"""
+        with self.db.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO items (name, display_name, icon_url) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    display_name = excluded.display_name,
+                    icon_url = COALESCE(excluded.icon_url, icon_url)
+            ''', [(item['name'], item.get('display_name') or item['name'], item.get('icon_url'))
+                  for item in items if item.get('name')])
+
+    def get_items(self, names):
+        """按名称查询物品目录信息，保持传入的顺序，不存在的物品只返回名称"""
+        if not names:
+            return []
+        with self.db.connection() as conn:
+            rows = {row['name']: row for row in conn.execute(
+                f"SELECT name, display_name, icon_url FROM items WHERE name IN ({','.join('?' * len(names))})", names)}
+        return [{'name': name,
+                 'display_name': rows[name]['display_name'] if name in rows else name,
+                 'icon_url': rows[name]['icon_url'] if name in rows else None}
+                for name in names]
+
+    def get_sync_state(self, name):
+        """同步任务的进度 {'cursor', 'completed_at'}，没有记录时返回 None"""
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT cursor, completed_at FROM sync_state WHERE name = ?', (name,)).fetchone()
+        return {'cursor': row[0], 'completed_at': row[1]} if row else None
+
+    def save_sync_state(self, name, cursor, completed_at=None):
+        """保存同步进度；completed_at 为空时保留上次完成的时间"""
+        with self.db.connection(metrics.DB_WRITE) as conn:
+            conn.execute('''
+                INSERT INTO sync_state (name, cursor, completed_at, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    cursor = excluded.cursor,
+                    completed_at = COALESCE(excluded.completed_at, completed_at),
+                    updated_at = excluded.updated_at
+            ''', (name, cursor, completed_at, time.time()))
+
+    def get_chart(self, item_name, resolution, since, source=None):
+        with self.db.connection() as conn:
+            return rollups.query_chart(conn, item_name, resolution, since, source)
+
+    def _rows_query(self, item_names, since, until):
+        conditions, params = ['p.ts >= ?', 'p.ts < ?'], [since or 0, until or 2 ** 62]
+        if item_names is not None:
+            conditions.append(f"i.name IN ({','.join('?' * len(item_names))})")
+            params.extend(item_names)
+        return f'''
+            SELECT i.name AS item_name, p.ts, p.source, p.price, p.volume
+            FROM prices p JOIN items i ON i.id = p.item_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY p.item_id, p.ts
+        ''', params
+
+    def iter_rows(self, item_names=None, since=None, until=None):
+        """按 (item_id, ts) 顺序逐行读取原始价格"""
+        sql, params = self._rows_query(item_names, since, until)
+        with self.db.connection() as conn:
+            yield from conn.execute(sql, params)
+
+    def latest_prices(self, item_names, since):
+        """各物品在 since 之后每个数据源的最新价格
+
+        返回 {物品: {数据源: {'price', 'ts', 'volume'}}}，没有新价格的物品不在结果中
+        """
+        latest = {}
+        with self.db.connection() as conn:
+            # 分批查询，避免超过 SQLite 的参数数量限制
+            for i in range(0, len(item_names), 500):
+                sql, params = self._rows_query(item_names[i:i + 500], since, None)
+                # 按时间顺序读取，后面的记录覆盖前面的
+                for name, ts, source, price, volume in conn.execute(sql, params):
+                    latest.setdefault(name, {})[source] = {'price': price, 'ts': ts, 'volume': volume}
+        return latest
+
+    def scan(self, item_names=None, since=None, until=None):
+        import pandas as pd
+        sql, params = self._rows_query(item_names, since, until)
+        with self.db.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+
+class ArchiveStorage(PriceStorage):
+    """按月分区的列式归档
+
+    目录结构为 <path>/month=YYYY-MM/part-*.parquet（或 .arrow），每次写入追加新文件，
+    compact() 把一个分区合并成一个文件。scan() 只读取时间范围覆盖的分区；
+    Arrow IPC 格式的文件用内存映射读取。需要 pandas 和 pyarrow。
+    """
+    FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+    def __init__(self, path=ARCHIVE_PATH, format='parquet'):
+        if format not in self.FORMATS:
+            raise ValueError(f"不支持的归档格式: {format}")
+        self.path = path
+        self.format = format
+        self._counter = itertools.count()
+
+    def init(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def _partition(self, month):
+        return os.path.join(self.path, f'month={month}')
+
+    def _write(self, df, path):
+        if self.format == 'parquet':
+            df.to_parquet(path, index=False, compression='zstd')
+        else:
+            df.to_feather(path, compression='uncompressed')
+
+    def _read(self, path, item_names=None):
+        import pandas as pd
+        if self.format == 'parquet':
+            filters = [('item_name', 'in', list(item_names))] if item_names is not None else None
+            return pd.read_parquet(path, filters=filters)
+        import pyarrow.feather as feather
+        df = feather.read_table(path, memory_map=True).to_pandas()
+        return df[df['item_name'].isin(item_names)] if item_names is not None else df
+
+    def save_prices(self, rows, hooks=()):
+        """每个月份追加一个文件；同一批内重复的行只写入一次，与已有文件的重复由 compact() 去掉"""
+        import pandas as pd
+        seen = set()
+        rows = [row for row in rows if row[:3] not in seen and not seen.add(row[:3])]
+        if not rows:
+            return []
+        written = [(name, None, ts, source, price, volume) for name, ts, source, price, volume in rows]
+        for hook in hooks:
+            hook(None, written)
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df['volume'] = df['volume'].astype('Int64')
+        months = pd.to_datetime(df['ts'], unit='s', utc=True).dt.strftime('%Y-%m')
+        for month, part in df.groupby(months):
+            directory = self._partition(month)
+            os.makedirs(directory, exist_ok=True)
+            name = f'part-{int(time.time() * 1000)}-{os.getpid()}-{next(self._counter)}{self.FORMATS[self.format]}'
+            self._write(part.sort_values(['item_name', 'ts']), os.path.join(directory, name))
+        return written
+
+    def months(self):
+        return sorted(os.path.basename(path)[len('month='):]
+                      for path in glob.glob(os.path.join(self.path, 'month=*')))
+
+    def _files(self, since=None, until=None):
+        first = time.strftime('%Y-%m', time.gmtime(since)) if since else None
+        last = time.strftime('%Y-%m', time.gmtime(until)) if until else None
+        for month in self.months():
+            if (first and month < first) or (last and month > last):
+                continue
+            yield from self._files_in(month)
+
+    def _files_in(self, month):
+        return sorted(glob.glob(os.path.join(self._partition(month), '*' + self.FORMATS[self.format])))
+
+    def scan(self, item_names=None, since=None, until=None):
+        import pandas as pd
+        frames = [self._read(path, item_names) for path in self._files(since, until)]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        df = pd.concat(frames, ignore_index=True)
+        if since:
+            df = df[df['ts'] >= since]
+        if until:
+            df = df[df['ts'] < until]
+        return df.reset_index(drop=True)
+
+    def get_history(self, item_name, limit=100):
+        df = self.scan([item_name]).sort_values('ts', ascending=False).head(limit)
+        return [{'price': row.price, 'ts': int(row.ts), 'source': row.source}
+                for row in df.itertuples(index=False)]
+
+    def compact(self):
+        """把每个分区合并成一个文件，并去掉重复的 (item_name, ts, source)，与 SQLite 一样保留先写入的行"""
+        import pandas as pd
+        for month in self.months():
+            files = self._files_in(month)
+            if len(files) <= 1:
+                continue
+            df = pd.concat([self._read(path) for path in files], ignore_index=True)
+            df = df.drop_duplicates(['item_name', 'ts', 'source'], keep='first').sort_values(['item_name', 'ts'])
+            target = os.path.join(self._partition(month), f'compacted-{int(time.time() * 1000)}{self.FORMATS[self.format]}')
+            self._write(df, target + '.tmp')
+            os.replace(target + '.tmp', target)
+            for path in files:
+                os.remove(path)
+            logger.info(f"归档分区 {month}: {len(files)} 个文件合并为1个, {len(df)} 行")
+
+
+def history_response(history):
+    """接口返回的历史价格：get_history 的每条记录再加上 ISO 格式的 timestamp，两个服务器共用"""
+    for record in history:
+        record['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(record['ts']))
+    return history
+
+
+def export(source, archive, since=None, until=None, batch_size=100000):
+    """把主存储中的原始价格分批导出到归档，返回导出的行数"""
+    total = 0
+    rows = source.iter_rows(since=since, until=until)
+    while True:
+        batch = [tuple(row) for row in itertools.islice(rows, batch_size)]
+        if not batch:
+            return total
+        total += len(archive.save_prices(batch))
+
+
+def main():
+    from db import db_pool
+
+    parser = argparse.ArgumentParser(description='价格归档工具')
+    parser.add_argument('--path', default=ARCHIVE_PATH, help='归档目录')
+    parser.add_argument('--format', default='parquet', choices=list(ArchiveStorage.FORMATS))
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help='导出 SQLite 中的原始价格')
+    export_parser.add_argument('--days', type=int, help='只导出最近N天')
+    sub.add_parser('compact', help='合并分区中的小文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    archive = ArchiveStorage(args.path, args.format)
+    archive.init()
+    if args.command == 'export':
+        source = SQLiteStorage(db_pool)
+        source.init()
+        since = int(time.time()) - args.days * 86400 if args.days else None
+        start = time.perf_counter()
+        count = export(source, archive, since=since)
+        print(f"📦 导出 {count} 条价格到 {args.path}，用时 {time.perf_counter() - start:.2f}s")
+    elif args.command == 'compact':
+        archive.compact()
+
+
+if __name__ == '__main__':
+    main()
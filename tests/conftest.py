@@ -0,0 +1,35 @@
+# 测试公共配置：模块都在仓库根目录下
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic / time.time 替身"""
+
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def db_pool(tmp_path):
+    """临时数据库上的连接池，已执行全部迁移"""
+    from db import ConnectionPool
+    pool = ConnectionPool(str(tmp_path / 'test.db'))
+    pool.migrate()
+    yield pool
+    pool.close_all()
@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+from alerts import AlertEngine, MemorySink, parse_window
+
+ITEM = 'AK-47 | Redline (Field-Tested)'
+
+
+@pytest.fixture
+def sink():
+    return MemorySink()
+
+
+@pytest.fixture
+def engine(db_pool, sink):
+    engine = AlertEngine(db_pool, sinks=[sink])
+    engine.load()
+    return engine
+
+
+def rows(ts, *prices, item=ITEM):
+    """(数据源, 价格) 列表转换成写入管道的行"""
+    return [(item, 1, ts, source, price, 1) for source, price in prices]
+
+
+def test_parse_window():
+    assert parse_window('30m') == 1800
+    assert parse_window('24h') == 86400
+    assert parse_window(600) == 600
+    assert parse_window('') is None
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'item_name': '', 'kind': 'above', 'threshold': 1},
+    {'item_name': ITEM, 'kind': 'between', 'threshold': 1},
+    {'item_name': ITEM, 'kind': 'above', 'threshold': -1},
+    {'item_name': ITEM, 'kind': 'above', 'threshold': 'x'},
+    {'item_name': ITEM, 'kind': 'change', 'threshold': 10},
+    {'item_name': ITEM, 'kind': 'change', 'threshold': 10, 'window': '-5m'},
+    {'item_name': ITEM, 'kind': 'change', 'threshold': 10, 'window': 0},
+])
+def test_invalid_rules(engine, kwargs):
+    with pytest.raises(ValueError):
+        engine.add_rule(**kwargs)
+
+
+def test_threshold_fires_once_until_rearmed(engine, sink):
+    engine.add_rule(ITEM, 'below', 30, cooldown=0)
+    now = int(time.time())
+    assert engine.evaluate(rows(now, ('steam', 35.0))) == []
+    assert len(engine.evaluate(rows(now + 1, ('steam', 29.0)))) == 1
+    # 仍然低于阈值，不重复提醒
+    assert engine.evaluate(rows(now + 2, ('steam', 28.0))) == []
+    engine.evaluate(rows(now + 3, ('steam', 31.0)))
+    assert len(engine.evaluate(rows(now + 4, ('steam', 25.0)))) == 1
+    assert [event['price'] for event in sink.recent()] == [25.0, 29.0]
+
+
+def test_cooldown(engine):
+    engine.add_rule(ITEM, 'above', 100, cooldown=3600)
+    now = int(time.time())
+    assert len(engine.evaluate(rows(now, ('steam', 120.0)))) == 1
+    engine.evaluate(rows(now + 10, ('steam', 90.0)))
+    assert engine.evaluate(rows(now + 20, ('steam', 130.0))) == []
+    assert len(engine.evaluate(rows(now + 4000, ('steam', 90.0)) + rows(now + 4001, ('steam', 130.0)))) == 0
+    engine.evaluate(rows(now + 4002, ('steam', 90.0)))
+    assert len(engine.evaluate(rows(now + 4003, ('steam', 130.0)))) == 1
+
+
+def test_any_source_uses_lowest_latest_price(engine):
+    engine.add_rule(ITEM, 'below', 30)
+    now = int(time.time())
+    assert engine.evaluate(rows(now, ('steam', 35.0), ('buff', 32.0))) == []
+    events = engine.evaluate(rows(now + 1, ('buff', 29.5)))
+    assert [(event['source'], event['price']) for event in events] == [('buff', 29.5)]
+
+
+def test_any_source_ignores_sources_that_stopped_reporting(engine):
+    engine.add_rule(ITEM, 'below', 30, cooldown=0)
+    now = int(time.time())
+    assert len(engine.evaluate(rows(now, ('steam', 35.0), ('buff', 25.0)))) == 1
+    # buff 超过 max_age 没有更新，不再用它的旧价格判断，规则重新生效
+    assert engine.evaluate(rows(now + engine.max_age + 1, ('steam', 34.0))) == []
+    assert engine.rules(ITEM)[0]['triggered'] is False
+    assert engine.evaluate(rows(now + engine.max_age + 2, ('steam', 33.0))) == []
+
+
+def test_source_specific_rule_ignores_other_sources(engine):
+    engine.add_rule(ITEM, 'below', 30, source='steam')
+    now = int(time.time())
+    assert engine.evaluate(rows(now, ('buff', 10.0))) == []
+    assert len(engine.evaluate(rows(now + 1, ('steam', 20.0)))) == 1
+
+
+def test_change_within_window(engine):
+    engine.add_rule(ITEM, 'change', 10, window='1h', cooldown=0)
+    now = int(time.time())
+    assert engine.evaluate(rows(now, ('steam', 100.0))) == []
+    assert engine.evaluate(rows(now + 600, ('steam', 105.0))) == []
+    events = engine.evaluate(rows(now + 1200, ('steam', 111.0)))
+    assert events[0]['reference_price'] == 100.0 and events[0]['change_pct'] == 11.0
+    # 窗口外的价格不再作为起点
+    engine.evaluate(rows(now + 1300, ('steam', 111.0)))
+    assert engine.evaluate(rows(now + 4000, ('steam', 112.0))) == []
+
+
+def test_state_persists_and_rules_reload_across_engines(db_pool, engine):
+    rule = engine.add_rule(ITEM, 'below', 30)
+    now = int(time.time())
+    engine.evaluate(rows(now, ('steam', 20.0)))
+
+    other = AlertEngine(db_pool, sinks=[], reload_interval=0)
+    other.load()
+    assert other.rules(ITEM)[0]['triggered'] is True
+    # 触发状态已保存，另一个进程不会再提醒一次
+    assert other.evaluate(rows(now + 1, ('steam', 19.0))) == []
+
+    engine.reload_interval = 0
+    other.remove_rule(rule['id'])
+    assert engine.rules() == []
+    assert engine.evaluate(rows(now + 2, ('steam', 31.0)) + rows(now + 3, ('steam', 10.0))) == []
+
+
+def test_own_change_does_not_hide_changes_from_other_processes(db_pool, engine):
+    other = AlertEngine(db_pool, sinks=[])
+    other.load()
+    other.add_rule(ITEM, 'above', 100)
+    # 本进程添加规则时发现其他进程也改过，重新加载全部规则
+    engine.add_rule(ITEM, 'below', 30)
+    assert sorted(rule['kind'] for rule in engine.rules(ITEM)) == ['above', 'below']
@@ -0,0 +1,29 @@
+import pytest
+
+from analytics import compute
+
+pd = pytest.importorskip('pandas')
+
+TS = 1700000000
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['item_name', 'ts', 'source', 'price', 'volume'])
+
+
+def test_arbitrage_never_sells_on_the_buy_platform():
+    # buff 扣手续费后仍是到手最多的平台，但买入也在 buff，卖出平台只能是 steam
+    result = compute(frame([('AK', TS, 'buff', 10.0, 1), ('AK', TS, 'steam', 11.0, 1)]))['AK']['arbitrage']
+    assert result['buy_source'] == 'buff' and result['sell_source'] == 'steam'
+    assert result['sell_price'] == 11.0
+    assert result['sell_net'] == pytest.approx(9.35)
+    assert result['gap'] == pytest.approx(-0.65)
+
+
+def test_arbitrage_picks_best_net_among_other_platforms():
+    result = compute(frame([('AK', TS, 'buff', 10.0, 1), ('AK', TS, 'steam', 13.0, 1),
+                            ('AK', TS, 'csmoney', 12.0, 1)]))['AK']['arbitrage']
+    assert (result['buy_source'], result['sell_source']) == ('buff', 'csmoney')
+    assert result['gap'] == pytest.approx(12.0 * 0.93 - 10.0)
+    # 只有一个平台有价格时没有搬砖结果
+    assert compute(frame([('AWP', TS, 'steam', 5.0, 1)]))['AWP']['arbitrage'] is None
@@ -0,0 +1,69 @@
+import pytest
+
+from arbitrage import ArbitrageScanner
+
+NOW = 1_700_000_000
+FEES = {'steam': 0.15, 'buff': 0.0, 'csmoney': 0.0}
+
+
+@pytest.fixture
+def scanner():
+    return ArbitrageScanner(storage=None, sell_fees=FEES, max_age=3600, compact_threshold=10)
+
+
+def rows(name, ts, **prices):
+    return [(name, None, ts, source, price, 1) for source, price in prices.items()]
+
+
+def test_gap_after_fees(scanner):
+    scanner.update(rows('AK', NOW, buff=10.0, steam=20.0), now=NOW)
+    [opportunity] = scanner.top(now=NOW)
+    assert (opportunity['buy_source'], opportunity['sell_source']) == ('buff', 'steam')
+    assert opportunity['sell_net'] == 17.0 and opportunity['gap_pct'] == 0.7
+    # 扣费后没有利润的物品不算机会
+    scanner.update(rows('AWP', NOW, buff=10.0, steam=11.0), now=NOW)
+    assert [o['item_name'] for o in scanner.top(now=NOW)] == ['AK']
+
+
+def test_top_is_ordered_and_filtered(scanner):
+    scanner.update(rows('A', NOW, buff=10.0, csmoney=12.0) + rows('B', NOW, buff=1.0, csmoney=2.0)
+                   + rows('C', NOW, buff=100.0, csmoney=130.0), now=NOW)
+    assert [o['item_name'] for o in scanner.top(now=NOW)] == ['B', 'C', 'A']
+    assert [o['item_name'] for o in scanner.top(limit=1, now=NOW)] == ['B']
+    assert [o['item_name'] for o in scanner.top(min_price=5, now=NOW)] == ['C', 'A']
+    assert [o['item_name'] for o in scanner.top(min_gap_pct=0.25, now=NOW)] == ['B', 'C']
+    # 查询不会丢失仍然有效的条目
+    assert len(scanner.top(now=NOW)) == 3
+
+
+def test_stale_quotes_expire(scanner):
+    scanner.update(rows('AK', NOW, buff=10.0, csmoney=30.0), now=NOW)
+    # buff 更新，csmoney 的价格已经过期，不能再和新价格组成机会
+    scanner.update(rows('AK', NOW + 4000, buff=10.0), now=NOW + 4000)
+    assert scanner.top(now=NOW + 4000) == []
+    assert set(scanner.get('AK', now=NOW + 4000)['sources']) == {'buff'}
+    assert scanner.status()['expired_quotes'] == 1
+
+
+def test_expired_opportunity_is_repriced_with_fresh_quotes(scanner):
+    scanner.update(rows('AK', NOW, steam=5.0), now=NOW)
+    scanner.update(rows('AK', NOW + 3000, buff=10.0, csmoney=12.0), now=NOW + 3000)
+    assert scanner.top(now=NOW + 3000)[0]['buy_source'] == 'steam'
+    # steam 的价格过期后，用剩下两个数据源重新计算
+    [opportunity] = scanner.top(now=NOW + 3700)
+    assert (opportunity['buy_source'], opportunity['sell_source']) == ('buff', 'csmoney')
+    # 全部价格过期后物品从价格簿中移除
+    assert scanner.top(now=NOW + 9000) == []
+    assert scanner.get('AK', now=NOW + 9000) is None
+    assert scanner.status()['items'] == 0
+
+
+def test_superseded_entries_are_compacted(scanner):
+    for i in range(50):
+        scanner.update(rows('AK', NOW + i, buff=10.0, csmoney=20.0 + i), now=NOW + i)
+    status = scanner.status()
+    assert status['compactions'] >= 1
+    assert status['heap_size'] <= scanner.compact_threshold + 2
+    assert status['stale_entries'] == status['heap_size'] - status['opportunities']
+    assert scanner.top(now=NOW + 50)[0]['sell_price'] == 69.0
+    assert scanner.status()['stale_entries'] == 0
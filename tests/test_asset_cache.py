@@ -0,0 +1,85 @@
+import http.client
+import os
+import threading
+
+import pytest
+
+import simple_server
+from asset_cache import AssetCache
+
+
+def write(path, data, mtime_ns):
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    write(tmp_path / 'big.bin', b'a' * 8192, 10 ** 18)
+    write(tmp_path / 'app.js', b'console.log(1);\n' * 200, 10 ** 18)
+    cache = AssetCache(check_interval=3600, sendfile_threshold=4000)
+    cache.add_directory(str(tmp_path), prefix='static/')
+    return cache
+
+
+def test_small_files_are_cached_and_compressed(cache):
+    asset = cache.get('static/app.js')
+    assert asset.body is not None and 'gzip' in asset.variants
+    encoding, body, etag = asset.select('gzip')
+    assert encoding == 'gzip' and etag != asset.etag
+
+
+def test_open_reloads_changed_large_file(cache, tmp_path):
+    asset = cache.get('static/big.bin')
+    assert asset.body is None
+    # 检查间隔内被修改（大小不变），打开时发现不一致并重新加载
+    write(tmp_path / 'big.bin', b'b' * 8192, 2 * 10 ** 18)
+    current, f = cache.open(asset)
+    with f:
+        assert f.read() == b'b' * 8192
+    assert current.etag != asset.etag
+    assert cache.get('static/big.bin') is current
+
+
+def test_open_handles_shrunk_and_deleted_files(cache, tmp_path):
+    asset = cache.get('static/big.bin')
+    write(tmp_path / 'big.bin', b'small', 2 * 10 ** 18)
+    current, f = cache.open(asset)
+    assert f is None and current.body == b'small'
+    os.remove(tmp_path / 'big.bin')
+    assert cache.open(asset) == (None, None)
+
+
+@pytest.fixture
+def server(cache, monkeypatch):
+    monkeypatch.setattr(simple_server, 'assets', cache)
+    monkeypatch.setattr(simple_server.CSGOPriceHandler, 'log_message', lambda *args: None)
+    httpd = simple_server.ThreadPoolHTTPServer(('127.0.0.1', 0), simple_server.CSGOPriceHandler, workers=2)
+    threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fetch(server, path, headers=None):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=2)
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, body
+
+
+def test_sendfile_etag_matches_served_bytes(server, tmp_path):
+    response, body = fetch(server, '/static/big.bin')
+    old_etag = response.getheader('ETag')
+    assert response.status == 200 and body == b'a' * 8192
+
+    response, _ = fetch(server, '/static/big.bin', {'If-None-Match': old_etag})
+    assert response.status == 304
+
+    write(tmp_path / 'big.bin', b'c' * 5000, 3 * 10 ** 18)
+    response, body = fetch(server, '/static/big.bin', {'If-None-Match': old_etag})
+    assert response.status == 200 and body == b'c' * 5000
+    assert response.getheader('ETag') != old_etag
+    assert response.getheader('Content-Length') == '5000'
@@ -0,0 +1,78 @@
+import pytest
+
+from catalog_sync import CatalogueSync
+from search_index import SearchIndex
+from storage import SQLiteStorage
+
+CATALOGUE = [f'Item {i:03d}' for i in range(25)]
+
+
+class FakeCrawler:
+    """按名称分页返回目录，fail_at 指定的起始位置返回失败"""
+
+    def __init__(self, fail_at=()):
+        self.fail_at = set(fail_at)
+        self.starts = []
+
+    def search_page(self, query, start, count, sort_column=None, sort_dir=None):
+        self.starts.append(start)
+        if start in self.fail_at:
+            return None
+        return [{'name': name, 'display_name': name.upper()} for name in CATALOGUE[start:start + count]], len(CATALOGUE)
+
+
+@pytest.fixture
+def storage(db_pool):
+    return SQLiteStorage(db_pool)
+
+
+def test_cursor_survives_restart(storage):
+    crawler = FakeCrawler(fail_at={20})
+    first = CatalogueSync(crawler, storage, page_size=10)
+    result = first.run()
+    assert result['error'] and result['cursor'] == 20 and not first.completed()
+
+    # 新进程从保存的进度继续，不重新拉取前两页
+    crawler = FakeCrawler()
+    index = SearchIndex()
+    second = CatalogueSync(crawler, storage, index, page_size=10)
+    result = second.run()
+    assert crawler.starts == [20]
+    assert result['complete'] and result['cursor'] == 0
+    assert second.completed()
+    assert len(storage.item_names()) == len(CATALOGUE)
+    assert storage.get_sync_state(CatalogueSync.STATE_NAME)['cursor'] == 0
+
+
+def test_completion_seen_by_other_processes(storage):
+    reader = CatalogueSync(FakeCrawler(), storage)
+    assert not reader.completed()
+    CatalogueSync(FakeCrawler(), storage, page_size=100).run()
+    reader._next_check = 0
+    assert reader.completed()
+
+
+def test_search_falls_back_to_steam_until_catalogue_complete(monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'search_index', SearchIndex())
+    monkeypatch.setattr(app.storage, 'upsert_items', lambda items: None)
+    monkeypatch.setattr(app.storage, 'get_items', lambda names: [{'name': name} for name in names])
+    calls = []
+
+    def steam_search(query):
+        calls.append(query)
+        return [{'name': 'AWP | Gungnir (Factory New)', 'display_name': 'AWP | Gungnir (Factory New)'}]
+
+    monkeypatch.setattr(app, 'search_all_markets', steam_search)
+    monkeypatch.setattr(app.catalogue_sync, 'completed', lambda: False)
+    client = app.app.test_client()
+
+    data = client.get('/api/search?q=gungnir').get_json()
+    assert data['suggestions'] == ['AWP | Gungnir (Factory New)'] and calls == ['gungnir']
+    # 搜到的物品已加入本地索引，之后直接命中本地
+    assert client.get('/api/search?q=gungnir').get_json()['suggestions'] == ['AWP | Gungnir (Factory New)']
+    assert calls == ['gungnir']
+
+    monkeypatch.setattr(app.catalogue_sync, 'completed', lambda: True)
+    assert client.get('/api/search?q=dragon').get_json()['suggestions'] == []
+    assert calls == ['gungnir']
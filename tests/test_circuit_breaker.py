@@ -0,0 +1,79 @@
+from circuit_breaker import CircuitBreaker
+
+
+def make_breaker(monkeypatch, clock, **kwargs):
+    monkeypatch.setattr('circuit_breaker.time.monotonic', clock)
+    options = dict(window_seconds=60, min_requests=4, error_threshold=0.5, open_seconds=30)
+    options.update(kwargs)
+    return CircuitBreaker('steam', **options)
+
+
+def test_stays_closed_below_min_requests(monkeypatch, clock):
+    breaker = make_breaker(monkeypatch, clock)
+    for _ in range(3):
+        breaker.record_failure(0.1, 'boom')
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_opens_on_error_rate_then_half_opens_after_cooldown(monkeypatch, clock):
+    breaker = make_breaker(monkeypatch, clock)
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    breaker.record_failure(0.1, 'timeout')
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.is_available()
+    assert not breaker.allow_request()
+    assert breaker.snapshot()['last_error'] == 'timeout'
+
+    clock.advance(30)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 半开状态只放行一个探测请求
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    assert not breaker.is_available()
+
+
+def test_probe_success_closes_and_clears_history(monkeypatch, clock):
+    breaker = make_breaker(monkeypatch, clock)
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.record_success(0.2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    snapshot = breaker.snapshot()
+    assert snapshot['requests'] == 1
+    assert snapshot['failures'] == 0
+    assert snapshot['times_opened'] == 1
+
+
+def test_probe_failure_reopens(monkeypatch, clock):
+    breaker = make_breaker(monkeypatch, clock)
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()['times_opened'] == 2
+    assert breaker.snapshot()['retry_in_seconds'] == 30
+
+
+def test_slow_calls_open_the_breaker(monkeypatch, clock):
+    breaker = make_breaker(monkeypatch, clock, slow_call_seconds=2.0, slow_call_threshold=0.75)
+    for _ in range(3):
+        breaker.record_success(3.0)
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_old_calls_leave_the_window(monkeypatch, clock):
+    breaker = make_breaker(monkeypatch, clock)
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    clock.advance(61)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()['requests'] == 1
@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+import crawlers
+from rate_limiter import RateLimitedError, TokenBucket
+
+
+def test_foreground_request_gives_up_quickly_without_tokens():
+    crawler = crawlers.PriceCrawler()
+    crawler.rate_limiter = TokenBucket(rate=0.3, capacity=5)
+    crawler.rate_limiter._tokens = 0
+    start = time.monotonic()
+    with pytest.raises(RateLimitedError):
+        crawler._get('http://127.0.0.1:9/never', {})
+    assert time.monotonic() - start < crawlers.FOREGROUND_ACQUIRE_TIMEOUT + 0.5
+
+
+def test_background_requests_leave_the_reserve(monkeypatch):
+    crawler = crawlers.PriceCrawler()
+    crawler.rate_limiter = TokenBucket(rate=0.3, capacity=5)
+    crawler.timeout = 0
+    monkeypatch.setattr(crawler.rate_limiter, '_tokens', 2.5)
+    with crawlers.background_requests():
+        with pytest.raises(RateLimitedError):
+            crawler._get('http://127.0.0.1:9/never', {})
+    # 预留的额度没有被后台任务拿走
+    assert crawler.rate_limiter.snapshot()['available'] >= 2.5
+
+
+def test_background_flag_reaches_crawler_threads():
+    seen = {}
+
+    class Recorder:
+        def __init__(self, name):
+            self.name = name
+
+        def get_item_price(self, item_name):
+            seen[self.name] = crawlers._background.get()
+            return None
+
+    multi = crawlers.MultiSourceCrawler(max_workers=2)
+    multi.crawlers = {name: Recorder(name) for name in multi.crawlers}
+    multi.get_all_prices('AK-47 | Redline')
+    assert seen and not any(seen.values())
+    with crawlers.background_requests():
+        multi.get_all_prices('AK-47 | Redline')
+    assert seen and all(seen.values())
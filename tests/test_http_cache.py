@@ -0,0 +1,86 @@
+import gzip
+
+import pytest
+
+import http_cache
+
+BODY = b'{"items":[' + b','.join(b'"AK-47 | Redline"' for _ in range(200)) + b']}'
+
+
+def test_choose_encoding_respects_quality(monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    assert http_cache.choose_encoding('gzip, deflate') == 'gzip'
+    assert http_cache.choose_encoding('gzip;q=0') is None
+    assert http_cache.choose_encoding('*') == 'gzip'
+    assert http_cache.choose_encoding('*, gzip;q=0') is None
+    assert http_cache.choose_encoding(None) is None
+
+
+def test_etag_matches_weak_and_lists():
+    etag = http_cache.make_etag(BODY)
+    assert http_cache.etag_matches(etag, etag)
+    assert http_cache.etag_matches(f'"other", W/{etag}', etag)
+    assert http_cache.etag_matches('*', etag)
+    assert not http_cache.etag_matches('"other"', etag)
+    assert not http_cache.etag_matches(None, etag)
+
+
+def test_prepare_compresses_and_revalidates(monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    status, headers, body = http_cache.prepare(BODY, 'application/json', {'Accept-Encoding': 'gzip'})
+    headers = dict(headers)
+    assert status == 200 and headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == BODY
+    # 压缩和未压缩的表示使用不同的 ETag
+    plain_status, plain_headers, plain_body = http_cache.prepare(BODY, 'application/json', {})
+    assert plain_body == BODY and dict(plain_headers)['ETag'] != headers['ETag']
+
+    status, _, body = http_cache.prepare(BODY, 'application/json',
+                                         {'Accept-Encoding': 'gzip', 'If-None-Match': headers['ETag']})
+    assert (status, body) == (304, b'')
+    # 内容变化后旧的 ETag 不再命中
+    status, _, _ = http_cache.prepare(BODY + b' ', 'application/json',
+                                      {'Accept-Encoding': 'gzip', 'If-None-Match': headers['ETag']})
+    assert status == 200
+
+
+def test_small_or_binary_bodies_are_not_compressed():
+    assert 'Content-Encoding' not in dict(http_cache.prepare(b'{}', 'application/json', {'Accept-Encoding': 'gzip'})[1])
+    assert 'Content-Encoding' not in dict(http_cache.prepare(BODY, 'image/png', {'Accept-Encoding': 'gzip'})[1])
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    flask = pytest.importorskip('flask')
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    (tmp_path / 'app.js').write_text('console.log(1);\n' * 200)
+    app = flask.Flask(__name__, static_folder=str(tmp_path), static_url_path='/static')
+    http_cache.init_app(app)
+
+    @app.route('/data')
+    def data():
+        return flask.jsonify({'items': ['AK-47 | Redline'] * 200})
+
+    @app.route('/page')
+    def page():
+        return flask.render_template_string("{{ url_for('static', filename='app.js') }}")
+
+    return app.test_client()
+
+
+def test_flask_api_304(client):
+    first = client.get('/data', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200 and first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['Cache-Control'] == http_cache.REVALIDATE_CACHE_CONTROL
+    second = client.get('/data', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304 and second.data == b''
+    assert 'Content-Type' not in second.headers
+
+
+def test_flask_versioned_static_is_immutable(client):
+    url = client.get('/page').get_data(as_text=True)
+    assert '?v=' in url
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == http_cache.STATIC_CACHE_CONTROL
+    assert client.get('/static/app.js').headers['Cache-Control'] == http_cache.REVALIDATE_CACHE_CONTROL
@@ -0,0 +1,133 @@
+import os
+import time
+
+import pytest
+
+import metrics
+from metrics import Histogram, MetricsRegistry, SlowRequestProfiler
+
+
+def sample(text, line_prefix):
+    """取出以 line_prefix 开头的指标行的值"""
+    values = [line.rsplit(' ', 1)[1] for line in text.splitlines() if line.startswith(line_prefix)]
+    assert len(values) == 1, line_prefix
+    return float(values[0])
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert list(histogram.samples()) == [('0.1', 2), ('1.0', 3), ('+Inf', 4)]
+    assert histogram.sum == pytest.approx(3.65) and histogram.count == 4
+
+
+def test_render_escapes_labels_and_includes_gauges():
+    registry = MetricsRegistry()
+    ctx = registry.begin_request('/api/price/<path:item_name>', 'GET')
+    with registry.span(metrics.DB_READ):
+        pass
+    registry.end_request(ctx, 200)
+    registry.end_request(ctx, 200)    # 重复结束忽略
+    weird = registry.begin_request('a"b\\c\nd', 'GET')
+    registry.end_request(weird, 404)
+    registry.gauge('csgo_test_gauge', '测试', lambda: 2.5)
+    registry.gauge('csgo_broken_gauge', '读取失败时跳过', lambda: 1 / 0)
+
+    text = registry.render()
+    prefix = 'csgo_http_request_duration_seconds_count{endpoint="/api/price/<path:item_name>",method="GET",status="200"}'
+    assert sample(text, prefix) == 1
+    assert 'endpoint="a\\"b\\\\c\\nd"' in text
+    assert sample(text, 'csgo_phase_duration_seconds_count{phase="db_read"}') == 1
+    assert sample(text, 'csgo_http_requests_in_flight') == 0
+    assert sample(text, 'csgo_test_gauge') == 2.5
+    assert 'csgo_broken_gauge' not in text
+    assert ctx.phases[metrics.DB_READ] >= 0
+
+
+@pytest.fixture
+def flask_app(monkeypatch):
+    flask = pytest.importorskip('flask')
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    monkeypatch.setattr(metrics, 'span', registry.span)
+    app = flask.Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/items/<name>')
+    def item(name):
+        return flask.jsonify({'name': name})
+
+    @app.route('/stream')
+    def stream():
+        def generate():
+            yield b'first\n'
+            time.sleep(0.3)
+            yield b'second\n'
+        return flask.Response(generate())
+
+    @app.route('/fail')
+    def fail():
+        raise RuntimeError('boom')
+
+    return app
+
+
+def test_metrics_endpoint_reports_routes_and_json_encoding(flask_app):
+    client = flask_app.test_client()
+    client.get('/items/a')
+    client.get('/items/b')
+    client.get('/missing')
+    response = client.get('/metrics')
+    assert response.content_type == metrics.CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    # 用路由模板作为标签，路径参数不产生新的时间序列
+    assert sample(text, 'csgo_http_request_duration_seconds_count{endpoint="/items/<name>",method="GET",status="200"}') == 2
+    assert sample(text, 'csgo_http_request_duration_seconds_count{endpoint="unmatched",method="GET",status="404"}') == 1
+    assert sample(text, 'csgo_phase_duration_seconds_count{phase="json_encode"}') == 2
+
+
+def test_streamed_response_measured_until_headers_are_sent(flask_app):
+    client = flask_app.test_client()
+    response = client.get('/stream', buffered=False)
+    text = metrics.registry.render()
+    # 响应头发出时已经计时结束，之后生成响应体的时间不计入
+    prefix = 'csgo_http_request_duration_seconds_'
+    labels = '{endpoint="/stream",method="GET",status="200"}'
+    assert sample(text, prefix + 'count' + labels) == 1
+    assert sample(text, prefix + 'sum' + labels) < 0.2
+    assert response.get_data() == b'first\nsecond\n'
+
+
+def test_failed_request_counted_as_500(flask_app):
+    flask_app.config['PROPAGATE_EXCEPTIONS'] = False
+    assert flask_app.test_client().get('/fail').status_code == 500
+    text = metrics.registry.render()
+    assert sample(text, 'csgo_http_request_duration_seconds_count{endpoint="/fail",method="GET",status="500"}') == 1
+    assert sample(text, 'csgo_http_requests_in_flight') == 0
+
+
+def test_slow_requests_are_sampled_and_dumped(tmp_path):
+    profiler = SlowRequestProfiler(threshold=0.05, interval=0.002, directory=str(tmp_path))
+    registry = MetricsRegistry(profiler)
+
+    def slow_view():
+        time.sleep(0.1)
+
+    ctx = registry.begin_request('/slow', 'GET')
+    with registry.span(metrics.CRAWLER):
+        slow_view()
+    registry.end_request(ctx, 200)
+    fast = registry.begin_request('/fast', 'GET')
+    registry.end_request(fast, 200)
+
+    [summary] = registry.slow_requests()
+    assert summary['endpoint'] == '/slow' and summary['samples'] > 0
+    assert summary['phases'][metrics.CRAWLER] >= 0.1
+    assert sample(registry.render(), 'csgo_slow_requests_total') == 1
+    with open(summary['file'], encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith('# GET /slow 200')
+    assert any('slow_view' in line for line in lines if not line.startswith('#'))
+    assert os.listdir(tmp_path) == [os.path.basename(summary['file'])]
+    assert MetricsRegistry().slow_requests() == []
@@ -0,0 +1,77 @@
+import sqlite3
+
+from migrations import MIGRATIONS, migrate, schema_version
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'fresh.db'))
+    assert migrate(conn) == len(MIGRATIONS)
+    # 再次执行不做任何事
+    assert migrate(conn) == len(MIGRATIONS)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'items', 'prices', 'watchlist', 'alerts'} <= tables
+
+
+def test_legacy_prices_are_converted_to_clustered_rows(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'legacy.db'))
+    # 早期 init_db 创建的表和数据，没有 user_version
+    MIGRATIONS[0](conn.cursor())
+    conn.execute("INSERT INTO items (name, display_name) VALUES ('AK', 'AK')")
+    conn.executemany('INSERT INTO prices (item_id, price, source, timestamp) VALUES (1, ?, ?, ?)', [
+        (10.0, 'steam', '2023-11-14 22:13:20'),
+        (11.0, 'steam', '2023-11-14 22:13:20'),    # 同一秒同一数据源，只保留最后一条
+        (9.0, 'buff', '2023-11-14 23:13:20'),
+    ])
+    conn.commit()
+    assert schema_version(conn) == 0
+
+    migrate(conn)
+    rows = conn.execute('SELECT item_id, ts, source, price, volume FROM prices ORDER BY ts, source').fetchall()
+    assert rows == [(1, 1700000000, 'steam', 11.0, None), (1, 1700003600, 'buff', 9.0, None)]
+    # 回填的小时聚合与原始价格一致
+    hourly = conn.execute('SELECT COUNT(*) FROM price_rollups_hourly').fetchone()[0]
+    assert hourly == 2
+
+
+def test_failed_migration_rolls_back(tmp_path, monkeypatch):
+    import migrations
+
+    def broken(cursor):
+        cursor.execute('CREATE TABLE half_done (x)')
+        raise RuntimeError('boom')
+
+    conn = sqlite3.connect(str(tmp_path / 'broken.db'))
+    monkeypatch.setattr(migrations, 'MIGRATIONS', MIGRATIONS[:1] + [broken])
+    try:
+        migrate(conn)
+    except RuntimeError:
+        pass
+    assert schema_version(conn) == 1
+    assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone()
+
+
+def _migrate_in_process(path, barrier):
+    import logging
+    logging.disable(logging.INFO)
+    conn = sqlite3.connect(path, timeout=60)
+    barrier.wait()
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
+
+
+def test_concurrent_processes_migrate_once(tmp_path):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    path = str(tmp_path / 'concurrent.db')
+    workers = 4
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, ProcessPoolExecutor(workers, mp_context=context) as pool:
+        barrier = manager.Barrier(workers)
+        results = list(pool.map(_migrate_in_process, [path] * workers, [barrier] * workers))
+    assert results == [len(MIGRATIONS)] * workers
+    conn = sqlite3.connect(path)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(prices)')}
+    assert {'ts', 'volume'} <= columns and 'timestamp' not in columns
@@ -0,0 +1,180 @@
+import json
+import time
+
+import pytest
+
+from alerts import AlertEngine
+from pubsub import PriceBroker
+from storage import SQLiteStorage
+from write_pipeline import PriceWriter
+
+ITEM = 'AK-47 | Redline'
+
+
+class Record:
+    def __init__(self, cents, volume=1):
+        self.cents = cents
+        self.volume = volume
+
+    def reference_base(self):
+        return self.cents
+
+
+class FakeScheduler:
+    """记录查询和优先抓取请求，不访问数据库"""
+
+    def __init__(self):
+        self.requests = []
+        self.refreshes = []
+
+    def record_request(self, name):
+        self.requests.append(name)
+
+    def request_refresh(self, name):
+        self.refreshes.append(name)
+        return True
+
+
+@pytest.fixture
+def price_service(db_pool, monkeypatch):
+    """价格服务模块，存储、写入管道和调度器换成临时数据库上的实例"""
+    import app
+    storage = SQLiteStorage(db_pool)
+    monkeypatch.setattr(app, 'storage', storage)
+    monkeypatch.setattr(app, 'price_writer', PriceWriter(storage))
+    monkeypatch.setattr(app, 'refresh_scheduler', FakeScheduler())
+    monkeypatch.setattr(app, 'alert_engine', AlertEngine(db_pool, sinks=[]))
+    monkeypatch.setattr(app, 'price_broker', PriceBroker())
+    return app
+
+
+@pytest.fixture
+def client(price_service):
+    return price_service.app.test_client()
+
+
+def ndjson(response):
+    return {row['item_name']: row for row in map(json.loads, response.get_data(as_text=True).splitlines())}
+
+
+def test_bulk_prices_report_write_errors_per_item(price_service, client, monkeypatch):
+    def get_all_prices(name):
+        if name == 'crawler error':
+            raise RuntimeError('timeout')
+        return {'steam': Record(1000)}
+
+    def submit(name, records, ts=None):
+        if name == 'write error':
+            raise RuntimeError('disk full')
+        return len(records)
+
+    monkeypatch.setattr(price_service.multi_crawler, 'get_all_prices', get_all_prices)
+    monkeypatch.setattr(price_service.price_writer, 'submit', submit)
+    response = client.post('/api/prices', json={'items': [ITEM, 'crawler error', 'write error']})
+    rows = ndjson(response)
+    assert rows[ITEM]['status'] == 'ok' and rows[ITEM]['best_price']['price'] == 10.0
+    assert rows['crawler error'] == {'item_name': 'crawler error', 'status': 'error', 'error': 'timeout'}
+    assert rows['write error'] == {'item_name': 'write error', 'status': 'error', 'error': 'disk full'}
+
+
+def test_bulk_prices_survive_unexpected_failures(price_service, client, monkeypatch):
+    def fetch_item_prices(name):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(price_service, 'fetch_item_prices', fetch_item_prices)
+    price_service.storage.save_prices([(ITEM, int(time.time()), 'steam', 5.0, 1)])
+    rows = ndjson(client.post('/api/prices', json={'items': [ITEM, 'M4A4 | Howl']}))
+    assert rows[ITEM]['cached']
+    assert rows['M4A4 | Howl'] == {'item_name': 'M4A4 | Howl', 'status': 'error', 'error': 'boom'}
+
+
+def test_alert_with_negative_window_is_rejected(client):
+    response = client.post('/api/alerts', json={'item': ITEM, 'kind': 'change', 'threshold': 10, 'window': '-5m'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'window must be positive'
+    assert client.post('/api/alerts', json={'item': ITEM, 'kind': 'change', 'threshold': 10,
+                                            'window': '5m'}).get_json()['window'] == 300
+
+
+def test_stream_sends_latest_then_published_prices(price_service, client):
+    now = int(time.time())
+    price_service.storage.save_prices([(ITEM, now, 'steam', 10.0, 2)])
+    response = client.get('/api/stream', query_string={'item': [ITEM, 'AWP']})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert price_service.refresh_scheduler.requests == [ITEM, 'AWP']
+
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 5000\n\n'
+    latest = next(chunks).decode('utf-8')
+    assert latest.startswith(f'id: {now}\nevent: price\n')
+    assert json.loads(latest.split('data: ', 1)[1])['sources']['steam']['price'] == 10.0
+
+    price_service.price_broker.publish([('AWP', 2, now + 5, 'buff', 20.0, 1)])
+    pushed = next(chunks).decode('utf-8')
+    assert pushed.startswith(f'id: {now + 5}\nevent: price\n') and '"AWP"' in pushed
+
+    # 断开连接后取消订阅
+    response.close()
+    assert price_service.price_broker.status()['subscribers'] == 0
+
+
+def test_stream_resumes_after_last_event_id(price_service, client):
+    now = int(time.time())
+    price_service.storage.save_prices([(ITEM, now - 10, 'steam', 10.0, 2)])
+    response = client.get('/api/stream', query_string={'item': ITEM}, headers={'Last-Event-ID': str(now - 10)})
+    chunks = iter(response.response)
+    next(chunks)
+    # 已经收到过的价格不再补发，直接等待新消息
+    price_service.price_broker.publish([(ITEM, 1, now, 'buff', 9.0, 1)])
+    assert next(chunks).startswith(f'id: {now}\n'.encode('utf-8'))
+    response.close()
+
+
+def test_stream_validates_items(price_service, client):
+    assert client.get('/api/stream').status_code == 400
+    assert client.get('/api/stream', query_string={'item': [str(i) for i in range(51)]}).status_code == 400
+    price_service.price_broker.max_subscribers = 0
+    assert client.get('/api/stream', query_string={'item': ITEM}).status_code == 503
+
+
+def test_cached_price_hit(price_service, client):
+    now = int(time.time())
+    price_service.storage.save_prices([(ITEM, now - 60, 'steam', 12.0, 1), (ITEM, now - 30, 'buff', 10.0, 1)])
+    response = client.get(f'/api/price/{ITEM}', query_string={'mode': 'cached'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['mode'] == 'cached' and not data['stale'] and not data['refresh_pending']
+    assert data['current_price'] == {'source': 'buff', 'price': 10.0, 'ts': now - 30}
+    assert set(data['all_sources']) == {'steam', 'buff'} and 30 <= data['age'] <= 35
+    assert price_service.refresh_scheduler.requests == [ITEM]
+    assert price_service.refresh_scheduler.refreshes == []
+
+
+def test_cached_price_stale_requests_refresh(price_service, client):
+    now = int(time.time())
+    price_service.storage.save_prices([(ITEM, now - 600, 'steam', 12.0, 1)])
+    data = client.get(f'/api/price/{ITEM}', query_string={'mode': 'cached', 'max_age': 300}).get_json()
+    assert data['stale'] and data['refresh_pending']
+    assert data['current_price']['price'] == 12.0
+    assert price_service.refresh_scheduler.refreshes == [ITEM]
+    # 放宽 max_age 后同一价格不算过期
+    assert not client.get(f'/api/price/{ITEM}', query_string={'mode': 'cached', 'max_age': 3600}).get_json()['stale']
+
+
+def test_cached_price_missing_item(price_service, client, monkeypatch):
+    assert client.get('/api/price/No Such Item', query_string={'mode': 'cached'}).status_code == 404
+    assert price_service.refresh_scheduler.requests == []
+    # 已知但还没有价格的物品返回 202 并等待抓取
+    monkeypatch.setattr(price_service, 'search_index', {ITEM})
+    response = client.get(f'/api/price/{ITEM}', query_string={'mode': 'cached'})
+    assert response.status_code == 202
+    assert response.get_json()['refresh_pending'] and response.get_json()['current_price'] is None
+
+
+@pytest.mark.parametrize('max_age', ['abc', '1.5', '-1'])
+def test_cached_price_rejects_invalid_max_age(client, max_age):
+    response = client.get(f'/api/price/{ITEM}', query_string={'mode': 'cached', 'max_age': max_age})
+    assert response.status_code == 400
+    assert 'max_age' in response.get_json()['error']
+    assert client.get(f'/api/price/{ITEM}', query_string={'mode': 'other'}).status_code == 400
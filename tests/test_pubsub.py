@@ -0,0 +1,82 @@
+import json
+
+from pubsub import PriceBroker, Subscription, price_events, sse_frame
+
+ITEM = 'AK-47 | Redline'
+
+
+def rows(*prices, item=ITEM):
+    """(时间, 数据源, 价格) 转换成写入管道的行"""
+    return [(item, 1, ts, source, price, 3) for ts, source, price in prices]
+
+
+def parse(frame):
+    """把一条 SSE 消息拆成字段"""
+    fields = dict(line.split(': ', 1) for line in frame.decode('utf-8').strip().split('\n'))
+    fields['data'] = json.loads(fields['data'])
+    return fields
+
+
+def test_sse_frame_format():
+    frame = sse_frame('price', {'item_name': 'AK', 'price': 1.5}, 1700000000)
+    assert frame.endswith(b'\n\n')
+    assert frame.startswith(b'id: 1700000000\nevent: price\ndata: ')
+    assert parse(frame)['data'] == {'item_name': 'AK', 'price': 1.5}
+    assert sse_frame('ping', {}).startswith(b'event: ping\n')
+
+
+def test_price_events_merge_sources_per_item():
+    events = price_events(rows((100, 'steam', 10.0), (105, 'buff', 9.0)) + rows((101, 'steam', 5.0), item='AWP'))
+    assert events[ITEM] == {'item_name': ITEM, 'ts': 105, 'sources': {
+        'steam': {'price': 10.0, 'ts': 100, 'volume': 3}, 'buff': {'price': 9.0, 'ts': 105, 'volume': 3}}}
+    assert set(events) == {ITEM, 'AWP'}
+
+
+def test_publish_reaches_only_subscribers_of_the_item():
+    broker = PriceBroker()
+    ak, awp = broker.subscribe([ITEM]), broker.subscribe(['AWP'])
+    broker.publish(rows((100, 'steam', 10.0)))
+    frame = ak.queue.get_nowait()
+    assert parse(frame)['id'] == '100' and parse(frame)['data']['sources']['steam']['price'] == 10.0
+    assert awp.queue.empty()
+    assert broker.status() == {'published': 1, 'delivered': 1, 'dropped_subscribers': 0, 'subscribers': 2, 'items': 2}
+
+
+def test_unsubscribe_ends_events_and_frees_topics():
+    broker = PriceBroker()
+    subscription = broker.subscribe([ITEM])
+    broker.publish(rows((100, 'steam', 10.0)))
+    events = subscription.events(keepalive=0.01)
+    assert next(events).startswith(b'id: 100')
+    assert next(events) == b': keepalive\n\n'
+    broker.unsubscribe(subscription)
+    broker.unsubscribe(subscription)    # 重复取消忽略
+    assert list(events) == []
+    assert broker.status()['subscribers'] == 0 and broker.status()['items'] == 0
+    broker.publish(rows((101, 'steam', 11.0)))
+    assert broker.status()['published'] == 1
+
+
+def test_subscriber_limit():
+    broker = PriceBroker(max_subscribers=1)
+    assert broker.subscribe([ITEM]) is not None
+    assert broker.subscribe([ITEM]) is None
+
+
+def test_slow_subscriber_is_dropped_without_affecting_others():
+    broker = PriceBroker(queue_size=2)
+    slow, fast = broker.subscribe([ITEM]), broker.subscribe([ITEM])
+    for ts in (100, 101):
+        broker.publish(rows((ts, 'steam', 10.0)))
+        fast.queue.get_nowait()
+    broker.publish(rows((102, 'steam', 10.0)))
+    assert slow.closed and not fast.closed
+    assert list(slow.events()) == []
+    assert parse(fast.queue.get_nowait())['id'] == '102'
+    assert broker.status()['dropped_subscribers'] == 1 and broker.status()['subscribers'] == 1
+
+
+def test_full_queue_rejects_push():
+    subscription = Subscription([ITEM], queue_size=1)
+    assert subscription.push(b'a')
+    assert not subscription.push(b'b')
@@ -0,0 +1,54 @@
+import pytest
+
+from rate_limiter import TokenBucket
+
+
+@pytest.fixture
+def bucket_clock(monkeypatch, clock):
+    monkeypatch.setattr('rate_limiter.time.monotonic', clock)
+    # acquire() 等待时推进假时钟，不真正睡眠
+    monkeypatch.setattr('rate_limiter.time.sleep', clock.advance)
+    return clock
+
+
+def test_burst_then_refill(bucket_clock):
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    assert all(bucket.try_acquire() for _ in range(3))
+    assert not bucket.try_acquire()
+    assert bucket.wait_time() == pytest.approx(1.0)
+    bucket_clock.advance(2.5)
+    assert bucket.snapshot()['available'] == 2.5
+
+
+def test_refill_is_capped_at_capacity(bucket_clock):
+    bucket = TokenBucket(rate=2.0, capacity=4)
+    bucket_clock.advance(100)
+    assert bucket.snapshot()['available'] == 4
+
+
+def test_acquire_waits_and_times_out(bucket_clock):
+    bucket = TokenBucket(rate=0.5, capacity=1)
+    assert bucket.acquire()
+    start = bucket_clock.now
+    assert bucket.acquire(timeout=5)
+    assert bucket_clock.now - start == pytest.approx(2.0)
+    # 下一个令牌要等2秒，超时1秒直接失败
+    assert not bucket.acquire(timeout=1)
+
+
+def test_reserve_keeps_tokens_for_foreground(bucket_clock):
+    bucket = TokenBucket(rate=0.3, capacity=5)
+    # 后台任务要求至少留下2个令牌
+    taken = 0
+    while bucket.try_acquire(reserve=2):
+        taken += 1
+    assert taken == 3
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.wait_time(reserve=2) == pytest.approx(3 / 0.3)
+
+
+def test_reserve_larger_than_capacity_is_capped(bucket_clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    assert bucket.acquire(timeout=0, reserve=10)
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+import rollups
+from db import ConnectionPool
+from retention import DAY, RetentionPolicy
+from storage import SQLiteStorage
+
+NOW = 100 * DAY + 12345
+
+
+def rows_in(db_pool, table, column='ts'):
+    with db_pool.connection() as conn:
+        return [row[0] for row in conn.execute(f'SELECT {column} FROM {table} ORDER BY {column}')]
+
+
+def test_cutoff_aligned_to_midnight(db_pool):
+    policy = RetentionPolicy(db_pool, raw_days=30, hourly_days=180)
+    assert policy._cutoff(30, NOW) == 70 * DAY
+    with pytest.raises(ValueError):
+        RetentionPolicy(db_pool, raw_days=30, hourly_days=7)
+
+
+def test_run_backfills_before_deleting(db_pool):
+    storage = SQLiteStorage(db_pool)
+    storage.save_prices([('AK', ts, 'steam', float(ts % 50), 1) for ts in range(68 * DAY, 72 * DAY, 3000)])
+    hourly_table = rollups.RESOLUTIONS['hour'][0]
+    with db_pool.connection() as conn:
+        before = [tuple(row) for row in conn.execute(f'SELECT * FROM {hourly_table} ORDER BY bucket')]
+        # 模拟增量聚合漏掉的桶，删除前的回填会补上
+        conn.execute(f'DELETE FROM {hourly_table} WHERE bucket < ?', (69 * DAY,))
+
+    result = RetentionPolicy(db_pool, raw_days=30, hourly_days=180, items_per_batch=1).run(now=NOW)
+
+    assert result['raw_cutoff'] == 70 * DAY
+    assert result['items'] == 1
+    assert min(rows_in(db_pool, 'prices')) >= 70 * DAY
+    assert result['raw_deleted'] == len([ts for ts in range(68 * DAY, 70 * DAY, 3000)])
+    with db_pool.connection() as conn:
+        assert [tuple(row) for row in conn.execute(f'SELECT * FROM {hourly_table} ORDER BY bucket')] == before
+
+
+def test_run_deletes_old_hourly_rollups(db_pool):
+    storage = SQLiteStorage(db_pool)
+    storage.save_prices([('AK', 5 * DAY, 'steam', 1.0, 1), ('AK', 95 * DAY, 'steam', 2.0, 1)])
+    result = RetentionPolicy(db_pool, raw_days=3, hourly_days=10).run(now=NOW)
+    assert result['hourly_deleted'] == 1
+    assert rows_in(db_pool, rollups.RESOLUTIONS['hour'][0], 'bucket') == [95 * DAY]
+    # 天级聚合永久保留
+    assert rows_in(db_pool, rollups.RESOLUTIONS['day'][0], 'bucket') == [5 * DAY, 95 * DAY]
+
+
+def test_fresh_database_uses_incremental_vacuum(db_pool):
+    with db_pool.connection() as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+
+def test_run_never_converts_existing_database(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    sqlite3.connect(path).execute('CREATE TABLE legacy (x)').connection.close()
+    pool = ConnectionPool(path)
+    pool.migrate()
+    policy = RetentionPolicy(pool)
+    statements = []
+    with pool.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 0
+
+    policy.run(now=NOW)
+    assert not [sql for sql in statements if sql.upper().startswith('VACUUM') or '= INCREMENTAL' in sql.upper()]
+    with pool.connection() as conn:
+        conn.set_trace_callback(None)
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 0
+
+    # 只有显式执行 vacuum 命令才会转换
+    assert policy.convert_to_incremental_vacuum() is not None
+    assert policy.convert_to_incremental_vacuum() is None
+    with pool.connection() as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    pool.close_all()
+
+
+def test_run_reclaims_free_pages(db_pool):
+    storage = SQLiteStorage(db_pool)
+    storage.save_prices([('AK', ts, 'steam', 1.0, 1) for ts in range(0, 10 * DAY, 60)])
+    result = RetentionPolicy(db_pool, raw_days=1, hourly_days=1).run(now=NOW)
+    assert result['pages_freed'] > 0
+    with db_pool.connection() as conn:
+        assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
@@ -0,0 +1,65 @@
+import pytest
+
+import rollups
+from storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(db_pool):
+    return SQLiteStorage(db_pool)
+
+
+def bucket(db_pool, resolution='hour', source='steam'):
+    table, _ = rollups.RESOLUTIONS[resolution]
+    with db_pool.connection() as conn:
+        row = conn.execute(f'SELECT open, high, low, close, sum, count FROM {table} WHERE source = ?',
+                           (source,)).fetchone()
+        return tuple(row) if row else None
+
+
+def test_incremental_ohlc(storage, db_pool):
+    storage.save_prices([('AK', 3605, 'steam', 30.0, 1), ('AK', 3601, 'steam', 20.0, 1)])
+    storage.save_prices([('AK', 3700, 'steam', 10.0, 1), ('AK', 3650, 'steam', 40.0, 1)])
+    # open 为最早的价格，close 为最晚的价格，与写入顺序无关
+    assert bucket(db_pool) == (20.0, 40.0, 10.0, 10.0, 100.0, 4)
+
+
+def test_duplicate_raw_rows_are_not_counted_twice(storage, db_pool):
+    rows = [('AK', 1000, 'steam', 20.0, 1), ('AK', 1001, 'steam', 40.0, 1)]
+    assert len(storage.save_prices(rows)) == 2
+    assert storage.save_prices(rows) == []
+    # 同一批里的重复行也只写入一次
+    assert len(storage.save_prices([('AK', 1002, 'steam', 5.0, 1), ('AK', 1002, 'steam', 6.0, 1)])) == 1
+    assert bucket(db_pool) == (20.0, 40.0, 5.0, 5.0, 65.0, 3)
+    assert bucket(db_pool, 'day') == (20.0, 40.0, 5.0, 5.0, 65.0, 3)
+
+
+def test_backfill_matches_incremental(storage, db_pool):
+    storage.save_prices([('AK', ts, source, float(ts % 97), ts % 7 or None)
+                         for ts in range(0, 3 * 86400, 1234) for source in ('steam', 'buff')])
+    table, _ = rollups.RESOLUTIONS['hour']
+    with db_pool.connection() as conn:
+        incremental = [tuple(row) for row in conn.execute(f'SELECT * FROM {table} ORDER BY item_id, bucket, source')]
+    with db_pool.transaction() as conn:
+        conn.execute(f'DELETE FROM {table}')
+        rollups.backfill(conn, 'hour')
+    with db_pool.connection() as conn:
+        assert [tuple(row) for row in conn.execute(f'SELECT * FROM {table} ORDER BY item_id, bucket, source')] == incremental
+
+
+def test_pick_resolution():
+    assert rollups.pick_resolution(86400) == 'raw'
+    assert rollups.pick_resolution(30 * 86400) == 'hour'
+    assert rollups.pick_resolution(365 * 86400) == 'day'
+    assert rollups.pick_resolution(365 * 86400, 'hour') == 'hour'
+    with pytest.raises(ValueError):
+        rollups.pick_resolution(86400, 'minute')
+
+
+def test_chart_rejects_invalid_range_and_resolution():
+    import app
+    client = app.app.test_client()
+    assert client.get('/api/chart/AK?range=2d').status_code == 400
+    response = client.get('/api/chart/AK?resolution=minute')
+    assert response.status_code == 400
+    assert 'resolution' in response.get_json()['error']
@@ -0,0 +1,65 @@
+import pytest
+
+from scheduler import RefreshScheduler
+
+
+@pytest.fixture
+def scheduler(db_pool):
+    known = {'AK-47 | Redline', 'AWP | Asiimov', 'M4A4 | Howl'}
+    return RefreshScheduler(lambda name: None, db_pool, known=known.__contains__, max_items=3)
+
+
+def watchlist_rows(db_pool):
+    with db_pool.connection() as conn:
+        return {row[0]: row[1] for row in conn.execute('SELECT name, pinned FROM watchlist')}
+
+
+def test_add_items_rejects_non_strings(scheduler):
+    with pytest.raises(ValueError):
+        scheduler.add_items(['AK-47 | Redline', 42])
+    assert scheduler.status()['watchlist_size'] == 0
+
+
+def test_record_request_only_adds_known_items(scheduler, db_pool):
+    scheduler.record_request('AK-47 | Redline')
+    scheduler.record_request('AK-47 | Redlnie')
+    assert not scheduler.request_refresh('no such item')
+    assert watchlist_rows(db_pool) == {'AK-47 | Redline': 0}
+    assert scheduler.watchlist()[0]['demand'] == 1.0
+
+
+def test_watchlist_is_capped(scheduler):
+    assert scheduler.add_items(['a', 'b']) == ['a', 'b']
+    scheduler.record_request('AK-47 | Redline')
+    scheduler.record_request('AWP | Asiimov')
+    assert scheduler.status()['watchlist_size'] == 3
+    assert scheduler.add_items(['c']) == []
+
+
+def test_auto_added_items_expire_when_demand_decays(scheduler, db_pool):
+    scheduler.add_items(['M4A4 | Howl'])
+    scheduler.record_request('AK-47 | Redline')
+    scheduler.record_request('M4A4 | Howl')
+    # 5个半衰期后需求降到 1/32，低于移出阈值
+    now = scheduler._last_decay + 5 * scheduler.demand_half_life
+    with scheduler._lock:
+        scheduler._decay_demand(now)
+    scheduler.flush()
+    assert [item['name'] for item in scheduler.watchlist()] == ['M4A4 | Howl']
+    assert watchlist_rows(db_pool) == {'M4A4 | Howl': 1}
+
+
+def test_manual_add_pins_auto_added_item(scheduler, db_pool):
+    scheduler.record_request('AK-47 | Redline')
+    assert scheduler.add_items(['AK-47 | Redline']) == []
+    assert watchlist_rows(db_pool) == {'AK-47 | Redline': 1}
+    assert scheduler.watchlist()[0]['pinned']
+
+
+def test_load_restores_pinned_flag(scheduler, db_pool):
+    scheduler.add_items(['M4A4 | Howl'])
+    scheduler.record_request('AWP | Asiimov')
+    reloaded = RefreshScheduler(lambda name: None, db_pool)
+    reloaded.load()
+    assert {item['name']: item['pinned'] for item in reloaded.watchlist()} == {
+        'M4A4 | Howl': True, 'AWP | Asiimov': False}
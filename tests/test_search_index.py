@@ -0,0 +1,52 @@
+import pytest
+
+from search_index import SearchIndex, normalize
+
+NAMES = [
+    'AK-47 | Redline (Field-Tested)', 'AK-47 | Vulcan (Minimal Wear)', 'AWP | Asiimov (Field-Tested)',
+    'M4A1-S | Hyper Beast (Field-Tested)', 'M4A4 | Howl (Factory New)', 'Glock-18 | Fade (Factory New)',
+]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add(NAMES)
+    return index
+
+
+def test_normalize_splits_on_separators():
+    assert normalize('StatTrak™ AK-47 | Redline (Field-Tested)') == ['stattrak', 'ak', '47', 'redline', 'field', 'tested']
+
+
+@pytest.mark.parametrize('query', ['ak47', 'ak-47', 'ak 47', 'AK47 '])
+def test_weapon_names_match_without_separator(index, query):
+    assert set(index.suggest(query)) == {'AK-47 | Redline (Field-Tested)', 'AK-47 | Vulcan (Minimal Wear)'}
+
+
+def test_concatenated_tokens(index):
+    assert index.suggest('m4a1s')[0] == 'M4A1-S | Hyper Beast (Field-Tested)'
+    assert index.suggest('hyperbeast') == ['M4A1-S | Hyper Beast (Field-Tested)']
+    assert index.suggest('glock18')[0] == 'Glock-18 | Fade (Factory New)'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('ak47 redlne', 'AK-47 | Redline (Field-Tested)'),
+    ('awp asimov', 'AWP | Asiimov (Field-Tested)'),
+    ('m4a1s hyperbaest', 'M4A1-S | Hyper Beast (Field-Tested)'),
+    ('akk47 vulc', 'AK-47 | Vulcan (Minimal Wear)'),
+])
+def test_typos(index, query, expected):
+    assert index.suggest(query)[0] == expected
+
+
+def test_prefix_of_last_token(index):
+    assert index.suggest('ak47 red') == ['AK-47 | Redline (Field-Tested)']
+    assert index.suggest('ak4')[:2] == index.suggest('ak-47')[:2]
+
+
+def test_incremental_add_and_unrelated_query(index):
+    assert index.suggest('dragon lore') == []
+    assert index.add(['AWP | Dragon Lore', 'AWP | Dragon Lore']) == 1
+    assert index.suggest('dragon lore') == ['AWP | Dragon Lore']
+    assert 'AWP | Dragon Lore' in index and len(index) == len(NAMES) + 1
@@ -0,0 +1,100 @@
+import contextlib
+
+import pytest
+
+import shared_state
+from scheduler import RefreshScheduler
+from shared_state import SharedState
+from storage import SQLiteStorage
+
+ITEM = 'AK-47 | Redline'
+
+
+@contextlib.contextmanager
+def other_process(pid=1):
+    """with 块中执行的写入记为另一个进程的写入"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(shared_state.os, 'getpid', lambda: pid)
+        yield
+
+
+def make_scheduler(db_pool):
+    known = {ITEM, 'AWP | Asiimov'}
+    return RefreshScheduler(lambda name: None, db_pool, known=known.__contains__)
+
+
+def test_prices_from_other_processes_reach_listeners(db_pool):
+    storage = SQLiteStorage(db_pool)
+    reader, writer = SharedState(db_pool), SharedState(db_pool)
+    received = []
+    reader.add_listener(received.extend)
+    storage.save_prices([(ITEM, 100, 'steam', 1.0, 1)], [writer.publish])
+    # 启动前写入的价格不回放
+    reader.start()
+    reader.stop()
+
+    storage.save_prices([(ITEM, 200, 'steam', 2.0, 3)], [writer.publish])
+    assert reader.poll() == 0    # 本进程写入的价格已经由写入管道直接交给回调
+    with other_process():
+        storage.save_prices([(ITEM, 300, 'buff', 3.0, 5)], [writer.publish])
+    assert reader.poll() == 1
+    assert received == [(ITEM, None, 300, 'buff', 3.0, 5)]
+    assert reader.poll() == 0
+
+
+def test_new_items_reach_item_listeners(db_pool):
+    storage = SQLiteStorage(db_pool)
+    storage.upsert_items([{'name': 'old'}])
+    shared = SharedState(db_pool)
+    names = []
+    shared.add_item_listener(names.extend)
+    shared.start()
+    shared.stop()
+    storage.upsert_items([{'name': 'new'}])
+    shared.poll()
+    assert names == ['new']
+
+
+def test_follower_forwards_requests_to_background_process(db_pool):
+    follower_state, leader_state = SharedState(db_pool), SharedState(db_pool)
+    follower, leader = make_scheduler(db_pool), make_scheduler(db_pool)
+    follower.forward_to(follower_state)
+    leader_state.scheduler = leader
+
+    follower.record_request(ITEM)
+    follower.record_request('unknown item')
+    assert follower.request_refresh('AWP | Asiimov')
+    assert not follower.request_refresh('unknown item')
+    assert follower.add_items(['M4A4 | Howl', ' M4A4 | Howl ']) == ['M4A4 | Howl']
+    # 请求写入数据库之前后台进程还看不到
+    assert leader_state.poll() == 0 and not leader.watchlist()
+
+    assert follower_state.flush() == 3
+    assert leader_state.poll() == 3
+    status = leader.status()
+    assert status['watchlist_size'] == 3 and status['requested'] == 1
+    assert {item['name']: item['pinned'] for item in follower.watchlist()} == {
+        ITEM: False, 'AWP | Asiimov': False, 'M4A4 | Howl': True}
+
+    leader.flush()
+    assert follower.watchlist()[0]['demand'] == 1.0
+    assert follower.remove_items(['M4A4 | Howl', 'missing']) == ['M4A4 | Howl']
+    follower_state.flush()
+    leader_state.poll()
+    assert leader.status()['watchlist_size'] == 2
+    assert follower.status() == {'running': False, 'forwarding': True, 'watchlist_size': 2,
+                                 'watchlist_limit': 5000, 'backlog': 0, 'fetch_queue': 0, 'forwarded': 5}
+    with pytest.raises(ValueError):
+        follower.add_items([42])
+
+
+def test_prune_drops_old_rows(db_pool):
+    shared = SharedState(db_pool, retention=60)
+    with db_pool.transaction() as conn:
+        shared.publish(conn, [(ITEM, 1, 100, 'steam', 1.0, 1)])
+    shared.forward(shared_state.DEMAND, [ITEM])
+    shared.flush()
+    shared.prune(now=10 ** 10)
+    with db_pool.connection() as conn:
+        assert conn.execute('SELECT count(*) FROM price_feed').fetchone()[0] == 0
+        assert conn.execute('SELECT count(*) FROM scheduler_requests').fetchone()[0] == 0
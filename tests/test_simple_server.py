@@ -0,0 +1,79 @@
+import http.client
+import socket
+import threading
+import time
+
+import pytest
+
+import simple_server
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(simple_server.CSGOPriceHandler, 'log_message', lambda *args: None)
+    httpd = simple_server.ThreadPoolHTTPServer(('127.0.0.1', 0), simple_server.CSGOPriceHandler,
+                                               workers=2, queue_size=4, keepalive_timeout=0.5)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(conn, path='/metrics'):
+    conn.request('GET', path)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_idle_keepalive_connections_do_not_hold_workers(server):
+    port = server.server_address[1]
+    # 空闲的长连接比工作线程多，新连接仍然能被处理
+    idle = [http.client.HTTPConnection('127.0.0.1', port, timeout=2) for _ in range(6)]
+    for conn in idle:
+        assert get(conn) == 200
+    wait_for(lambda: server.idle_connections() == len(idle))
+
+    fresh = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+    assert get(fresh) == 200
+    # 空闲连接上的下一个请求照常处理
+    assert get(idle[0]) == 200
+    for conn in idle + [fresh]:
+        conn.close()
+
+
+def test_idle_connections_expire(server):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=2)
+    assert get(conn) == 200
+    wait_for(lambda: server.idle_connections() == 1)
+    wait_for(lambda: server.idle_connections() == 0)
+    conn.close()
+
+
+def test_pipelined_requests_on_one_connection(server):
+    with socket.create_connection(server.server_address, timeout=2) as sock:
+        sock.sendall(b'GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n' * 2)
+        data = b''
+        while data.count(b'HTTP/1.1 200') < 2:
+            chunk = sock.recv(65536)
+            assert chunk
+            data += chunk
+
+
+def test_demo_price_does_not_touch_global_random():
+    import random
+    random.seed(42)
+    expected = random.random()
+    random.seed(42)
+    first = simple_server.SteamAPI.get_demo_price('AK-47 | Redline')
+    assert random.random() == expected
+    second = simple_server.SteamAPI.get_demo_price('AK-47 | Redline')
+    assert (second.lowest, second.median, second.volume) == (first.lowest, first.median, first.volume)
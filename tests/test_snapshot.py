@@ -0,0 +1,48 @@
+import crawlers
+from snapshot import ResponseArchive, request_key
+
+
+class FakeResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+def test_request_key_ignores_host_and_param_order():
+    assert request_key('https://a.example/x', {'b': 1, 'a': 2}) == request_key('http://b/x', {'a': 2, 'b': 1})
+
+
+def test_replay_returns_responses_in_recorded_order(tmp_path):
+    path = str(tmp_path / 'snap.db')
+    recorder = ResponseArchive(path, 'record')
+    recorder.record('http://s/p', {'name': 'AK'}, FakeResponse(200, b'first'))
+    recorder.record('http://s/p', {'name': 'AK'}, FakeResponse(200, b'second'))
+    recorder.close()
+
+    archive = ResponseArchive(path, 'replay')
+    assert [archive.replay('http://s/p', {'name': 'AK'}).content for _ in range(3)] == [b'first', b'second', b'second']
+    archive.rewind()
+    assert archive.replay('http://s/p', {'name': 'AK'}).content == b'first'
+    assert archive.labels() == ['AK']
+
+
+def demo_prices(archive, items):
+    result = []
+    for crawler in (crawlers.BuffMarketCrawler(), crawlers.BitSkinsAPI()):
+        crawler.archive = archive
+        for item in items:
+            record = crawler.get_item_price(item)
+            result.append((record.lowest, record.volume))
+    return result
+
+
+def test_demo_sources_replay_what_was_recorded(tmp_path):
+    items = ['AK-47 | Redline', 'AWP | Asiimov', 'AK-47 | Redline']
+    recorded = demo_prices(ResponseArchive(str(tmp_path / 'snap.db'), 'record'), items)
+
+    archive = ResponseArchive(str(tmp_path / 'snap.db'), 'replay')
+    assert demo_prices(archive, items) == recorded
+    archive.rewind()
+    assert demo_prices(archive, items) == recorded
+    # 同一物品的第二次请求得到下一条价格，和录制时的序列一致
+    assert recorded[0] != recorded[2]
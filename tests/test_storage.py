@@ -0,0 +1,63 @@
+import pytest
+
+from storage import SQLiteStorage, history_response
+
+
+@pytest.fixture
+def storage(db_pool):
+    return SQLiteStorage(db_pool)
+
+
+def test_history_is_newest_first_with_both_time_fields(storage):
+    storage.save_prices([('AK', 1700000000, 'steam', 10.0, 5), ('AK', 1700000060, 'buff', 9.5, 3)])
+    history = history_response(storage.get_history('AK'))
+    assert [record['ts'] for record in history] == [1700000060, 1700000000]
+    assert history[0] == {'price': 9.5, 'ts': 1700000060, 'source': 'buff', 'timestamp': '2023-11-14T22:14:20Z'}
+
+
+def test_simple_server_history_matches_app_fields(storage, monkeypatch):
+    import simple_server
+    monkeypatch.setattr(simple_server, 'storage', storage)
+    storage.save_prices([('AK', 1700000000, 'steam', 10.0, 5)])
+    assert set(simple_server.get_price_history('AK')[0]) == {'price', 'ts', 'source', 'timestamp'}
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_archive_storage_works_with_price_writer(tmp_path, format):
+    pytest.importorskip('pyarrow')
+    from storage import ArchiveStorage
+    from write_pipeline import PriceWriter
+    archive = ArchiveStorage(str(tmp_path / 'archive'), format)
+    archive.init()
+    writer = PriceWriter(archive)
+    seen = []
+    writer.add_transaction_hook(lambda conn, rows: seen.append(rows))
+    writer._buffer = [('AK', 1700000000, 'steam', 10.0, 5), ('AK', 1700000000, 'steam', 11.0, 5),
+                      ('AK', 1700000060, 'buff', 9.5, None)]
+    assert writer.flush() == 2
+    assert seen == [[('AK', None, 1700000000, 'steam', 10.0, 5), ('AK', None, 1700000060, 'buff', 9.5, None)]]
+    assert [record['price'] for record in archive.get_history('AK')] == [9.5, 10.0]
+
+
+def test_archive_hook_failure_writes_nothing(tmp_path):
+    pytest.importorskip('pyarrow')
+    from storage import ArchiveStorage
+
+    def fail(conn, rows):
+        raise RuntimeError('boom')
+
+    archive = ArchiveStorage(str(tmp_path / 'archive'))
+    with pytest.raises(RuntimeError):
+        archive.save_prices([('AK', 1700000000, 'steam', 10.0, 5)], hooks=[fail])
+    assert archive.months() == []
+
+
+def test_archive_compact_keeps_first_written_like_sqlite(tmp_path, storage):
+    pytest.importorskip('pyarrow')
+    from storage import ArchiveStorage
+    archive = ArchiveStorage(str(tmp_path / 'archive'))
+    for backend in (storage, archive):
+        backend.save_prices([('AK', 1700000000, 'steam', 10.0, 5)])
+        backend.save_prices([('AK', 1700000000, 'steam', 12.0, 5)])
+    archive.compact()
+    assert archive.get_history('AK') == storage.get_history('AK') == [{'price': 10.0, 'ts': 1700000000, 'source': 'steam'}]
@@ -0,0 +1,14 @@
+import fcntl
+
+import pytest
+
+import unified_app
+
+
+def test_init_lock_is_exclusive_until_released(tmp_path):
+    path = str(tmp_path / 'init.lock')
+    with unified_app.init_lock(path):
+        with open(path) as other, pytest.raises(BlockingIOError):
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with open(path) as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from write_pipeline import PriceWriter
+
+
+class Record:
+    """只提供写入管道用到的参考价（分）和成交量"""
+
+    def __init__(self, cents, volume=1):
+        self.cents = cents
+        self.volume = volume
+
+    def reference_base(self):
+        return self.cents
+
+
+class FlakyStorage:
+    """包含 poison 物品的批次总是写入失败，fail_next 次数内所有写入都失败"""
+
+    def __init__(self):
+        self.saved = []
+        self.fail_next = 0
+
+    def save_prices(self, rows, hooks=()):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise RuntimeError('database is locked')
+        if any(row[0] == 'poison' for row in rows):
+            raise ValueError('bad row')
+        written = [(name, None, ts, source, price, volume) for name, ts, source, price, volume in rows]
+        self.saved.extend(written)
+        return written
+
+
+@pytest.fixture
+def storage():
+    return FlakyStorage()
+
+
+def names(rows):
+    return [row[0] for row in rows]
+
+
+def test_failed_batch_is_dropped_after_max_retries(storage):
+    writer = PriceWriter(storage, max_retries=3)
+    writer.submit('poison', {'steam': Record(100)}, ts=1)
+    with pytest.raises(ValueError):
+        writer.flush()
+    assert writer.pending() == 1
+
+    # 之后的批次单独写入，不受失败批次影响
+    writer.submit('AK', {'steam': Record(100)}, ts=2)
+    assert writer.flush() == 1
+    assert names(storage.saved) == ['AK']
+    writer.flush()
+    status = writer.status()
+    assert status['pending'] == 0 and status['dropped_rows'] == 1 and status['failed_batches'] == 3
+
+
+def test_failed_batch_is_retried_before_new_rows(storage):
+    writer = PriceWriter(storage)
+    seen = []
+    writer.add_listener(lambda rows: seen.append(names(rows)))
+    writer.submit('AK', {'steam': Record(100)}, ts=1)
+    storage.fail_next = 1
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    writer.submit('AWP', {'steam': Record(200)}, ts=2)
+    assert writer.flush() == 2
+    assert seen == [['AK'], ['AWP']]
+    assert writer.status()['dropped_rows'] == 0
+
+
+def test_submit_never_raises_write_errors(storage):
+    writer = PriceWriter(storage, max_batch=1)
+    # 没有后台线程时同步写入，失败只记录
+    assert writer.submit('poison', {'steam': Record(100)}, ts=1) == 1
+    assert writer.pending() == 1
+
+
+def test_full_buffer_is_flushed_by_writer_thread(storage):
+    writer = PriceWriter(storage, max_batch=2, max_delay=60)
+    writer.start()
+    try:
+        writer.submit('poison', {'steam': Record(100)}, ts=1)
+        writer.submit('AK', {'steam': Record(100), 'buff': Record(90)}, ts=2)
+        deadline = time.monotonic() + 5
+        while writer.status()['failed_batches'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        writer.stop()
+    assert writer.status()['failed_batches'] >= 1
+    assert storage.saved == []
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+合并部署入口
+价格服务（app.py）和中国象棋服务（xiangqi_server.py）作为蓝图挂在同一个 Flask 应用上：
+价格接口在 /api/...，象棋页面和接口在 /xiangqi/...。两者共用 CORS、压缩和 ETag 中间件，
+同一进程内共用数据库连接池、爬虫线程池、搜索索引和各类缓存；象棋 AI 的搜索放进共享的进程池，
+不和价格请求争抢 GIL。
+
+gunicorn 部署时每个工作进程各自创建应用，数据库迁移在初始化文件锁（CSGO_INIT_LOCK）内依次执行，
+只有第一个进程真正升级结构；预派生部署只在父进程中迁移一次。
+多进程部署时每个进程都启动写入管道；后台刷新、保留策略、目录同步和价格提醒只在拿到文件锁
+（CSGO_BACKGROUND_LOCK，默认在数据库文件旁边）的那个进程中运行，不会重复抓取。
+进程之间通过数据库共享状态（shared_state）：每个进程写入的价格约 1 秒内推送给其他进程的实时推送订阅者、
+搬砖价格簿和提醒检查，其他进程收到的查询需求、优先抓取和关注列表修改转交给后台进程执行。
+只有提醒事件（/api/alerts/events）和调度器状态（/api/scheduler/status）是各进程自己的，
+完整的数据在后台进程中（/health 的 background_jobs 为 true 的那个），其余接口在任一进程中结果相同。
+
+使用方法：
+    python3 unified_app.py --port 5000
+    gunicorn -w 4 -k gthread --threads 16 -b 0.0.0.0:5000 'unified_app:create_app()'
+    python3 prefork.py --workers 4 --port 5000     # 父进程加载一次，子进程写时复制共享
+"""
+
+# 最先导入，从这里开始统计启动耗时
+from startup import startup_timer
+
+import argparse
+import contextlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import Flask, jsonify
+
+import middleware
+from db import DB_PATH
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+BACKGROUND_LOCK = os.environ.get('CSGO_BACKGROUND_LOCK', DB_PATH + '.background.lock')
+# gunicorn 的工作进程各自创建应用，用这个文件锁让迁移和加载依次执行
+INIT_LOCK = os.environ.get('CSGO_INIT_LOCK', DB_PATH + '.init.lock')
+
+# 象棋 AI 进程池的大小，0 表示在请求线程中直接计算
+AI_WORKERS = int(os.environ.get('XIANGQI_AI_WORKERS', '2'))
+
+_lock_file = None
+
+
+def acquire_background_lock(path=BACKGROUND_LOCK):
+    """非阻塞地获取后台任务的文件锁，进程退出时自动释放；不支持 fcntl 的平台总是返回 True"""
+    global _lock_file
+    if fcntl is None:
+        return True
+    lock_file = open(path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    # 保持文件打开，锁一直持有到进程退出
+    _lock_file = lock_file
+    return True
+
+
+@contextlib.contextmanager
+def init_lock(path=INIT_LOCK):
+    """阻塞地获取初始化的文件锁，退出 with 块时释放；不支持 fcntl 的平台直接执行"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def build_app():
+    """创建合并后的应用并注册路由，不初始化数据库，也不启动线程和进程"""
+    import app as price_service
+    import xiangqi_server
+
+    app = Flask(__name__)
+    middleware.init_app(app)
+    app.register_blueprint(price_service.price_api)
+    app.register_blueprint(xiangqi_server.xiangqi_api, url_prefix='/xiangqi')
+    app.config['BACKGROUND_JOBS'] = False
+
+    @app.route('/health')
+    def health_check():
+        return jsonify({
+            'status': 'healthy',
+            'services': ['price', 'xiangqi'],
+            'pid': os.getpid(),
+            'background_jobs': app.config['BACKGROUND_JOBS']
+        })
+
+    startup_timer.mark('build app')
+    return app
+
+
+def init_services():
+    """迁移数据库，加载搜索索引、提醒规则和搬砖价格簿（预派生部署时只在父进程中执行一次）"""
+    import app as price_service
+    price_service.init_db()
+
+
+def start_services(app, background=True, shared=True):
+    """启动象棋 AI 进程池和写入管道，拿到文件锁的进程还启动后台任务（每个服务进程各执行一次）
+
+    shared 为真时（多进程部署）启动进程之间的状态共享；单进程运行时不需要
+    """
+    import app as price_service
+    import xiangqi_server
+
+    if AI_WORKERS > 0 and xiangqi_server.ai_executor is None:
+        # spawn 启动的子进程不继承本进程的后台线程和数据库连接
+        xiangqi_server.ai_executor = ProcessPoolExecutor(max_workers=AI_WORKERS,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+
+    app.config['BACKGROUND_JOBS'] = background and acquire_background_lock()
+    if shared:
+        price_service.start_shared(app.config['BACKGROUND_JOBS'])
+    if app.config['BACKGROUND_JOBS']:
+        price_service.start_scheduler()
+    else:
+        price_service.start_writer()
+    startup_timer.finish()
+
+
+def create_app(background=True, shared=True):
+    """创建合并后的应用，并初始化数据库和后台任务（默认按 gunicorn 多进程部署共享状态）
+
+    gunicorn 的每个工作进程都会调用一次：第一个拿到初始化锁的进程执行迁移，
+    其他进程等它完成后看到最新的版本，只加载搜索索引等内存数据
+    """
+    app = build_app()
+    with init_lock():
+        init_services()
+    start_services(app, background, shared)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在一个进程中运行价格服务和象棋服务')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--no-background', action='store_true', help='不运行后台刷新、保留策略和目录同步')
+    args = parser.parse_args()
+
+    app = create_app(background=not args.no_background, shared=False)
+    startup_timer.print_report()
+    print(f"🌐 价格服务: http://localhost:{args.port}/")
+    print(f"🎮 象棋服务: http://localhost:{args.port}/xiangqi/")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
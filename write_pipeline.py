@@ -0,0 +1,177 @@
+# 价格批量写入管道
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PriceWriter:
+    """批量价格写入器
+
+    爬虫结果先放进内存缓冲区，攒够 max_batch 条或距上次写入超过 max_delay 秒后，
+    交给存储后端一次写入（storage.PriceStorage 的任一实现，SQLiteStorage 在一个事务里写入并缓存物品ID）。
+
+    写入的每一行为 (item_name, item_id, ts, source, price, volume)，没有物品ID的后端 item_id 为 None。
+
+    写入失败的批次单独保留，之后每次写入时先重试，连续失败 max_retries 次后丢弃并记录日志，
+    一批坏数据不会堵住之后的写入。缓冲区满时交给后台线程写入，submit 不会抛出写入错误。
+    """
+    def __init__(self, storage, max_batch=500, max_delay=2.0, max_retries=3):
+        self.storage = storage
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+
+        self._buffer = []  # (item_name, ts, source, price, volume)
+        self._failed = []  # [批次, 失败次数]
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._listeners = []
+        self._transaction_hooks = []
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.stats = {'rows': 0, 'batches': 0, 'flush_seconds': 0.0, 'failed_batches': 0, 'dropped_rows': 0}
+
+    def add_listener(self, callback):
+        """注册提交后的回调，参数为本批写入的行"""
+        self._listeners.append(callback)
+
+    def add_transaction_hook(self, hook):
+        """注册在写入事务内执行的钩子 hook(conn, rows)，失败时整批回滚"""
+        self._transaction_hooks.append(hook)
+
+    def submit(self, item_name, records, ts=None):
+        """把一个物品各数据源的价格放入缓冲区（价格换算成基准货币）"""
+        ts = ts or int(time.time())
+        rows = []
+        for source, record in records.items():
+            price = record.reference_base() if record else None
+            if price is not None:
+                rows.append((item_name, ts, source, price / 100, record.volume))
+
+        with self._buffer_lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.max_batch
+        if full:
+            if self._thread:
+                self._wakeup.set()
+            else:
+                # 没有后台线程（脚本中使用）时直接写入，失败的批次留到下次重试
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+        return len(rows)
+
+    def write(self, item_name, records):
+        """立即写入（用于需要马上读到结果的请求路径），顺带写出缓冲区中的其他数据"""
+        self.submit(item_name, records)
+        self.flush()
+
+    def flush(self):
+        """先重试之前失败的批次，再把缓冲区写入数据库，返回写入的行数
+
+        重试失败只记录日志；缓冲区这一批写入失败时抛出异常（这一批留待下次重试）
+        """
+        written = []
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+
+            for entry in list(self._failed):
+                try:
+                    written.append(self._save(entry[0]))
+                    self._failed.remove(entry)
+                except Exception as e:
+                    entry[1] += 1
+                    self._give_up(entry, e)
+
+            error = None
+            if batch:
+                try:
+                    written.append(self._save(batch))
+                except Exception as e:
+                    entry = [batch, 1]
+                    self._failed.append(entry)
+                    self._give_up(entry, e)
+                    error = e
+
+        for rows in written:
+            for callback in self._listeners:
+                try:
+                    callback(rows)
+                except Exception as e:
+                    logger.error(f"价格写入回调失败: {e}")
+        if error is not None:
+            raise error
+        return sum(len(rows) for rows in written)
+
+    def _save(self, batch):
+        start = time.perf_counter()
+        rows = self.storage.save_prices(batch, self._transaction_hooks)
+        self.stats['rows'] += len(rows)
+        self.stats['batches'] += 1
+        self.stats['flush_seconds'] += time.perf_counter() - start
+        return rows
+
+    def _give_up(self, entry, error):
+        """记录一次写入失败，失败次数达到上限时丢弃这一批"""
+        batch, attempts = entry
+        self.stats['failed_batches'] += 1
+        if attempts < self.max_retries:
+            logger.error(f"批量写入价格失败（第 {attempts} 次，稍后重试）: {error}")
+            return
+        self._failed.remove(entry)
+        self.stats['dropped_rows'] += len(batch)
+        logger.error(f"批量写入价格连续失败 {attempts} 次，丢弃 {len(batch)} 行: {error}")
+
+    def pending(self):
+        with self._buffer_lock:
+            return len(self._buffer) + sum(len(entry[0]) for entry in self._failed)
+
+    def start(self):
+        """启动按时间阈值刷新的后台线程"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='price-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(min(self.max_delay / 2, 1.0))
+            self._wakeup.clear()
+            if self._stop.is_set():
+                return
+            with self._buffer_lock:
+                full = len(self._buffer) >= self.max_batch
+            if full or (self.pending() and time.monotonic() - self._last_flush >= self.max_delay):
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+
+    def status(self):
+        batches = self.stats['batches']
+        return {
+            'pending': self.pending(),
+            'rows_written': self.stats['rows'],
+            'batches': batches,
+            'avg_batch_size': round(self.stats['rows'] / batches, 1) if batches else 0.0,
+            'avg_flush_ms': round(self.stats['flush_seconds'] / batches * 1000, 2) if batches else 0.0,
+            'retrying_batches': len(self._failed),
+            'failed_batches': self.stats['failed_batches'],
+            'dropped_rows': self.stats['dropped_rows']
+        }
@@ -4,15 +4,16 @@
 提供Web界面和AI计算支持
 """
 
-from flask import Flask, render_template, jsonify, request, send_from_directory
-from flask_cors import CORS
+from flask import Blueprint, Flask, render_template, jsonify, request, send_from_directory
 import os
 import json
 import random
 import copy
 
-app = Flask(__name__)
-CORS(app)
+import middleware
+
+# 象棋服务的路由：单独运行时挂在本模块的 app 上，合并部署时由 unified_app 挂载到 /xiangqi
+xiangqi_api = Blueprint('xiangqi', __name__, static_folder='static')
 
 class XiangqiAI:
     """象棋AI类"""
@@ -382,17 +383,42 @@ class XiangqiAI:
 # 创建AI实例
 xiangqi_ai = XiangqiAI()
 
-@app.route('/')
+# AI 搜索是纯计算，合并部署时由 unified_app 设置为进程池，不占用处理价格请求的线程的 GIL
+ai_executor = None
+
+def run_ai(function, *args):
+    """执行 AI 计算，设置了 ai_executor 时在进程池中执行"""
+    if ai_executor is None:
+        return function(*args)
+    return ai_executor.submit(function, *args).result()
+
+def best_move(board, difficulty):
+    return xiangqi_ai.get_best_move(board, difficulty)
+
+def find_hint(board, is_red_turn):
+    """评估当前玩家的所有移动，返回 (可走的步数, 较好的移动)"""
+    moves = xiangqi_ai.get_all_moves(board, is_red_turn)
+    
+    # 简单评估找出较好的移动
+    best = None
+    best_score = -float('inf') if is_red_turn else float('inf')
+    
+    for move in moves:
+        new_board = xiangqi_ai.make_move(board, move['from'], move['to'])
+        score = xiangqi_ai.evaluate_board(new_board, is_red_turn)
+        
+        if (is_red_turn and score > best_score) or (not is_red_turn and score < best_score):
+            best_score = score
+            best = move
+    
+    return len(moves), best
+
+@xiangqi_api.route('/')
 def index():
     """主页"""
-    return send_from_directory('.', 'xiangqi.html')
-
-@app.route('/static/<path:filename>')
-def static_files(filename):
-    """静态文件服务"""
-    return send_from_directory('static', filename)
+    return send_from_directory(xiangqi_api.root_path, 'xiangqi.html')
 
-@app.route('/api/ai_move', methods=['POST'])
+@xiangqi_api.route('/api/ai_move', methods=['POST'])
 def ai_move():
     """AI移动接口"""
     try:
@@ -401,15 +427,15 @@ def ai_move():
         difficulty = data.get('difficulty', 'medium')
         
         # 获取AI最佳移动
-        best_move = xiangqi_ai.get_best_move(board, difficulty)
+        move = run_ai(best_move, board, difficulty)
         
-        if best_move:
+        if move:
             return jsonify({
                 'success': True,
                 'move': {
-                    'from': best_move['from'],
-                    'to': best_move['to'],
-                    'piece': best_move['piece']
+                    'from': move['from'],
+                    'to': move['to'],
+                    'piece': move['piece']
                 }
             })
         else:
@@ -424,7 +450,7 @@ def ai_move():
             'error': str(e)
         }), 500
 
-@app.route('/api/hint', methods=['POST'])
+@xiangqi_api.route('/api/hint', methods=['POST'])
 def get_hint():
     """获取提示接口"""
     try:
@@ -433,26 +459,14 @@ def get_hint():
         is_red_turn = data.get('is_red_turn', True)
         
         # 获取当前玩家的最佳移动
-        moves = xiangqi_ai.get_all_moves(board, is_red_turn)
+        move_count, best_move = run_ai(find_hint, board, is_red_turn)
         
-        if not moves:
+        if not move_count:
             return jsonify({
                 'success': False,
                 'error': 'No valid moves available'
             })
         
-        # 简单评估找出较好的移动
-        best_move = None
-        best_score = -float('inf') if is_red_turn else float('inf')
-        
-        for move in moves:
-            new_board = xiangqi_ai.make_move(board, move['from'], move['to'])
-            score = xiangqi_ai.evaluate_board(new_board, is_red_turn)
-            
-            if (is_red_turn and score > best_score) or (not is_red_turn and score < best_score):
-                best_score = score
-                best_move = move
-        
         if best_move:
             return jsonify({
                 'success': True,
@@ -474,7 +488,7 @@ def get_hint():
             'error': str(e)
         }), 500
 
-@app.route('/api/evaluate', methods=['POST'])
+@xiangqi_api.route('/api/evaluate', methods=['POST'])
 def evaluate_position():
     """评估局面接口"""
     try:
@@ -497,7 +511,7 @@ def evaluate_position():
             'error': str(e)
         }), 500
 
-@app.route('/health')
+@xiangqi_api.route('/health')
 def health_check():
     """健康检查接口"""
     return jsonify({
@@ -506,6 +520,15 @@ def health_check():
         'version': '1.0.0'
     })
 
+def create_app():
+    """单独运行象棋服务的 Flask 应用"""
+    app = Flask(__name__)
+    middleware.init_app(app)
+    app.register_blueprint(xiangqi_api)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     print("🎮 中国象棋游戏服务器启动中...")
     print("✅ AI引擎初始化完成")